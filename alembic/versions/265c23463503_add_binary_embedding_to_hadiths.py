@@ -0,0 +1,107 @@
+"""add binary float32 embedding columns to hadiths
+
+Revision ID: 265c23463503
+Revises: e7915fb5f7b4
+Create Date: 2026-10-17 10:12:41.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '265c23463503'
+down_revision: Union[str, Sequence[str], None] = 'e7915fb5f7b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Dönüşümde her turda işlenecek satır sayısı
+BATCH_SIZE = 500
+# Eski metin embedding'lerinde model bilgisi yok; boyuttan tahmin edilir
+LEGACY_MODEL_BY_DIM = {
+    1536: 'text-embedding-3-small',
+    3072: 'gemini-embedding-exp-03-07',
+}
+
+
+def _existing_columns(bind) -> set:
+    return {c['name'] for c in sa.inspect(bind).get_columns('hadiths')}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    # Startup'taki create_all yeni tabloda sütunları zaten oluşturmuş olabilir
+    existing = _existing_columns(bind)
+    if 'embedding_vec' not in existing:
+        op.add_column('hadiths', sa.Column('embedding_vec', sa.LargeBinary(), nullable=True))
+    if 'embedding_dim' not in existing:
+        op.add_column('hadiths', sa.Column('embedding_dim', sa.Integer(), nullable=True))
+    if 'embedding_model' not in existing:
+        op.add_column('hadiths', sa.Column('embedding_model', sa.String(), nullable=True))
+
+    # Virgüllü metin embedding'lerini id sırasıyla parça parça binary formata taşı
+    select_batch = sa.text(
+        "SELECT id, embedding FROM hadiths "
+        "WHERE id > :last_id AND embedding_vec IS NULL AND embedding IS NOT NULL AND embedding <> '' "
+        "ORDER BY id LIMIT :limit"
+    )
+    update_row = sa.text(
+        "UPDATE hadiths SET embedding_vec = :vec, embedding_dim = :dim, "
+        "embedding_model = :model, embedding = NULL WHERE id = :id"
+    ).bindparams(sa.bindparam('vec', type_=sa.LargeBinary()))
+    last_id = 0
+    converted = 0
+    while True:
+        rows = bind.execute(select_batch, {'last_id': last_id, 'limit': BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        params = []
+        for hadith_id, emb in rows:
+            last_id = hadith_id
+            try:
+                vec = np.array([x for x in emb.split(',') if x.strip()], dtype='<f4')
+            except ValueError:
+                # Bozuk kayıtlar metin olarak bırakılır; backfill bunları yeniden üretmez
+                continue
+            if vec.size == 0:
+                continue
+            params.append({
+                'id': hadith_id,
+                'vec': vec.tobytes(),
+                'dim': int(vec.size),
+                'model': LEGACY_MODEL_BY_DIM.get(int(vec.size)),
+            })
+        if params:
+            bind.execute(update_row, params)
+            converted += len(params)
+    print(f"[MIGRATION] {converted} hadis embedding'i binary formata dönüştürüldü")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    # Binary embedding'leri tekrar virgüllü metne çevir
+    select_batch = sa.text(
+        "SELECT id, embedding_vec FROM hadiths "
+        "WHERE id > :last_id AND embedding_vec IS NOT NULL "
+        "ORDER BY id LIMIT :limit"
+    )
+    update_row = sa.text("UPDATE hadiths SET embedding = :emb WHERE id = :id")
+    last_id = 0
+    while True:
+        rows = bind.execute(select_batch, {'last_id': last_id, 'limit': BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        params = []
+        for hadith_id, blob in rows:
+            last_id = hadith_id
+            vec = np.frombuffer(bytes(blob), dtype='<f4')
+            params.append({'id': hadith_id, 'emb': ','.join(map(str, vec.tolist()))})
+        bind.execute(update_row, params)
+    op.drop_column('hadiths', 'embedding_model')
+    op.drop_column('hadiths', 'embedding_dim')
+    op.drop_column('hadiths', 'embedding_vec')
@@ -0,0 +1,51 @@
+"""add background_jobs table for resumable embedding backfill
+
+Revision ID: 3c9a1d7e5b20
+Revises: fb4e7be14084
+Create Date: 2026-10-17 13:41:05.214873
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9a1d7e5b20'
+down_revision: Union[str, Sequence[str], None] = 'fb4e7be14084'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Startup'taki create_all tabloyu zaten oluşturmuş olabilir
+    if 'background_jobs' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'background_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('last_id', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=True),
+        sa.Column('processed', sa.Integer(), nullable=False),
+        sa.Column('failed', sa.Integer(), nullable=False),
+        sa.Column('run_processed', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_background_jobs_id'), 'background_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_background_jobs_kind'), 'background_jobs', ['kind'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_background_jobs_kind'), table_name='background_jobs')
+    op.drop_index(op.f('ix_background_jobs_id'), table_name='background_jobs')
+    op.drop_table('background_jobs')
@@ -0,0 +1,52 @@
+"""add per-model hadith_embeddings table and background_jobs.model
+
+Revision ID: 5e7b3f0a9d14
+Revises: 8d2f6a41c9e3
+Create Date: 2026-10-17 15:12:37.661208
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e7b3f0a9d14'
+down_revision: Union[str, Sequence[str], None] = '8d2f6a41c9e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    # Startup'taki create_all tabloyu/sütunu zaten oluşturmuş olabilir
+    if 'model' not in {c['name'] for c in inspector.get_columns('background_jobs')}:
+        op.add_column('background_jobs', sa.Column('model', sa.String(), nullable=True))
+    if 'hadith_embeddings' not in inspector.get_table_names():
+        op.create_table(
+            'hadith_embeddings',
+            sa.Column('hadith_id', sa.Integer(), nullable=False),
+            sa.Column('model', sa.String(), nullable=False),
+            sa.Column('dim', sa.Integer(), nullable=False),
+            sa.Column('embedding_vec', sa.LargeBinary(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+            sa.ForeignKeyConstraint(['hadith_id'], ['hadiths.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('hadith_id', 'model'),
+        )
+        op.create_index('ix_hadith_embeddings_model_hadith', 'hadith_embeddings', ['model', 'hadith_id'], unique=False)
+    # Mevcut (sunulan) embedding'ler de sürüm tablosuna kopyalanır
+    op.execute(
+        "INSERT INTO hadith_embeddings (hadith_id, model, dim, embedding_vec) "
+        "SELECT id, embedding_model, embedding_dim, embedding_vec FROM hadiths "
+        "WHERE embedding_vec IS NOT NULL AND embedding_model IS NOT NULL AND embedding_dim IS NOT NULL "
+        "ON CONFLICT DO NOTHING"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_hadith_embeddings_model_hadith', table_name='hadith_embeddings')
+    op.drop_table('hadith_embeddings')
+    op.drop_column('background_jobs', 'model')
@@ -0,0 +1,39 @@
+"""add content-hash embedding_cache table
+
+Revision ID: 8d2f6a41c9e3
+Revises: 3c9a1d7e5b20
+Create Date: 2026-10-17 14:26:51.093127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2f6a41c9e3'
+down_revision: Union[str, Sequence[str], None] = '3c9a1d7e5b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Startup'taki create_all tabloyu zaten oluşturmuş olabilir
+    if 'embedding_cache' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'embedding_cache',
+        sa.Column('text_hash', sa.String(length=64), nullable=False),
+        sa.Column('model', sa.String(), nullable=False),
+        sa.Column('dim', sa.Integer(), nullable=False),
+        sa.Column('embedding_vec', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('text_hash', 'model', 'dim'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('embedding_cache')
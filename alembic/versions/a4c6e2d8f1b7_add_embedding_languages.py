@@ -0,0 +1,49 @@
+"""add language to hadith_embeddings and background_jobs
+
+Revision ID: a4c6e2d8f1b7
+Revises: 5e7b3f0a9d14
+Create Date: 2026-10-17 16:05:12.417390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c6e2d8f1b7'
+down_revision: Union[str, Sequence[str], None] = '5e7b3f0a9d14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    # Startup'taki create_all sütunları zaten yeni haliyle oluşturmuş olabilir
+    if 'language' not in {c['name'] for c in inspector.get_columns('background_jobs')}:
+        op.add_column('background_jobs', sa.Column('language', sa.String(length=8), server_default='tr', nullable=False))
+    if 'language' in {c['name'] for c in inspector.get_columns('hadith_embeddings')}:
+        return
+    # Mevcut satırlar Türkçe metnin embedding'leridir
+    op.add_column('hadith_embeddings', sa.Column('language', sa.String(length=8), server_default='tr', nullable=False))
+    pk_name = inspector.get_pk_constraint('hadith_embeddings').get('name') or 'hadith_embeddings_pkey'
+    op.drop_constraint(pk_name, 'hadith_embeddings', type_='primary')
+    op.create_primary_key(pk_name, 'hadith_embeddings', ['hadith_id', 'model', 'language'])
+    if 'ix_hadith_embeddings_model_hadith' in {i['name'] for i in inspector.get_indexes('hadith_embeddings')}:
+        op.drop_index('ix_hadith_embeddings_model_hadith', table_name='hadith_embeddings')
+    op.create_index(
+        'ix_hadith_embeddings_model_language_hadith', 'hadith_embeddings', ['model', 'language', 'hadith_id'], unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_hadith_embeddings_model_language_hadith', table_name='hadith_embeddings')
+    op.execute("DELETE FROM hadith_embeddings WHERE language <> 'tr'")
+    op.drop_constraint('hadith_embeddings_pkey', 'hadith_embeddings', type_='primary')
+    op.create_primary_key('hadith_embeddings_pkey', 'hadith_embeddings', ['hadith_id', 'model'])
+    op.drop_column('hadith_embeddings', 'language')
+    op.create_index('ix_hadith_embeddings_model_hadith', 'hadith_embeddings', ['model', 'hadith_id'], unique=False)
+    op.drop_column('background_jobs', 'language')
@@ -0,0 +1,54 @@
+"""add generated tsvector column and GIN index to hadiths
+
+Revision ID: fb4e7be14084
+Revises: 265c23463503
+Create Date: 2026-10-17 11:02:18.530417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fb4e7be14084'
+down_revision: Union[str, Sequence[str], None] = '265c23463503'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# models.HADITH_SEARCH_VECTOR_SQL ile aynı ifade (migration'lar modele bağımlı olmamalı)
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('turkish'::regconfig, coalesce(turkish_text, '')), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(kitap, '') || ' ' || coalesce(bab, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(english_text, '')), 'B') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(source, '')), 'B') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(arabic_text, '')), 'C') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(reference, '')), 'C')"
+)
+INDEX_NAME = 'ix_hadiths_search_vector'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    # tsvector ve generated sütunlar yalnızca PostgreSQL'de var
+    if bind.dialect.name != 'postgresql':
+        return
+    inspector = sa.inspect(bind)
+    # Startup'taki create_all yeni tabloda sütunu ve indeksi zaten oluşturmuş olabilir
+    if 'search_vector' not in {c['name'] for c in inspector.get_columns('hadiths')}:
+        op.execute(
+            f"ALTER TABLE hadiths ADD COLUMN search_vector tsvector "
+            f"GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED"
+        )
+    op.execute(f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON hadiths USING gin (search_vector)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    op.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+    op.execute("ALTER TABLE hadiths DROP COLUMN IF EXISTS search_vector")
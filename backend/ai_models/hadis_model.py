@@ -2,6 +2,21 @@ import logging
 import re
 from typing import Dict, Any
 
+# Hadis ile ilgili anahtar kelimeler
+HADIS_KEYWORDS = (
+    'hadis', 'hadith', 'peygamber', 'rasul', 'sahabe', 'rivayet',
+    'buhari', 'müslim', 'tirmizi', 'ebu davud', 'nesai', 'ibn mace',
+    'sünnet', 'hadis-i şerif', 'rivayette', 'nakledilir'
+)
+
+# Dini terimler
+RELIGIOUS_TERMS = (
+    'namaz', 'oruç', 'zekât', 'hac', 'abdest', 'gusül', 'temizlik',
+    'dua', 'zikir', 'tövbe', 'istiğfar', 'salavat', 'tesbih',
+    'helal', 'haram', 'mekruh', 'müstehab', 'farz', 'vacip',
+    'allah', 'peygamber', 'islam', 'iman', 'ihsan', 'takva'
+)
+
 class HadisAI:
     def __init__(self):
         """
@@ -25,29 +40,14 @@ class HadisAI:
         question_lower = question.lower()
         context_lower = hadith_context.lower()
         
-        # Hadis ile ilgili anahtar kelimeler
-        hadis_keywords = [
-            'hadis', 'hadith', 'peygamber', 'rasul', 'sahabe', 'rivayet',
-            'buhari', 'müslim', 'tirmizi', 'ebu davud', 'nesai', 'ibn mace',
-            'sünnet', 'hadis-i şerif', 'rivayette', 'nakledilir'
-        ]
-        
-        # Dini terimler
-        religious_terms = [
-            'namaz', 'oruç', 'zekât', 'hac', 'abdest', 'gusül', 'temizlik',
-            'dua', 'zikir', 'tövbe', 'istiğfar', 'salavat', 'tesbih',
-            'helal', 'haram', 'mekruh', 'müstehab', 'farz', 'vacip',
-            'allah', 'peygamber', 'islam', 'iman', 'ihsan', 'takva'
-        ]
-        
         confidence = 0.0
         
         # Hadis anahtar kelimesi varsa +0.3
-        if any(keyword in question_lower for keyword in hadis_keywords):
+        if any(keyword in question_lower for keyword in HADIS_KEYWORDS):
             confidence += 0.3
         
         # Dini terim varsa +0.2
-        if any(term in question_lower for term in religious_terms):
+        if any(term in question_lower for term in RELIGIOUS_TERMS):
             confidence += 0.2
         
         # Bağlamda ilgili kelimeler varsa +0.3
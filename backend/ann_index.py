@@ -0,0 +1,183 @@
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Yaklaşık en yakın komşu (ANN) motoru ayarları
+HADITH_ANN_ENGINE = (os.getenv('HADITH_ANN_ENGINE') or 'exact').strip().lower()   # 'exact' | 'ivf'
+HADITH_IVF_NLIST = int(os.getenv('HADITH_IVF_NLIST') or 0)          # 0 → satır sayısına göre otomatik
+HADITH_IVF_NPROBE = int(os.getenv('HADITH_IVF_NPROBE') or 8)        # Aramada taranacak küme sayısı
+HADITH_ANN_MIN_ROWS = int(os.getenv('HADITH_ANN_MIN_ROWS') or 20000)  # Bunun altında tam arama yeterince hızlı
+# k-means eğitiminde küme başına kullanılacak en fazla örnek
+_TRAIN_SAMPLES_PER_LIST = 64
+_KMEANS_ITERATIONS = 10
+
+
+def top_k_positions(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Skor dizisinde en yüksek top_k elemanın indekslerini azalan sırayla döner."""
+    k = min(top_k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.shape[0]:
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(scores.shape[0])
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def default_nlist(rows: int) -> int:
+    # Yaygın kural: ~4*sqrt(N) küme
+    return max(1, int(4 * np.sqrt(max(rows, 1))))
+
+
+class IVFFlatIndex:
+    """IVF-flat ANN indeksi: vektörler k-means kümelerine ayrılır, sorguda en yakın
+    nprobe kümedeki vektörler tam (flat) skorlanır.
+
+    Vektörlerin kendisi tutulmaz; ana matristeki satır pozisyonları saklanır.
+    """
+
+    name = 'ivf'
+
+    def __init__(self, centroids: np.ndarray, lists: List[np.ndarray]):
+        self.centroids = centroids
+        self.lists = lists
+
+    @property
+    def nlist(self) -> int:
+        return int(self.centroids.shape[0])
+
+    @classmethod
+    def from_assignments(cls, centroids: np.ndarray, assign: np.ndarray) -> 'IVFFlatIndex':
+        """Kaydedilmiş (centroids, satır başına küme no) çiftinden indeksi yeniden kurar."""
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=centroids.shape[0])
+        bounds = np.concatenate([[0], np.cumsum(counts)])
+        lists = [order[bounds[c]:bounds[c + 1]].astype(np.int64) for c in range(centroids.shape[0])]
+        return cls(np.asarray(centroids, dtype=np.float32), lists)
+
+    def assignments(self, rows: int) -> np.ndarray:
+        """Her satırın ait olduğu küme numarasını döner (snapshot'a yazmak için)."""
+        assign = np.full(rows, -1, dtype=np.int32)
+        for c, lst in enumerate(self.lists):
+            assign[lst] = c
+        return assign
+
+    @classmethod
+    def train(cls, matrix: np.ndarray, nlist: int = 0, seed: int = 0) -> 'IVFFlatIndex':
+        """Normalize edilmiş matris üzerinde küresel k-means ile kümeleri eğitir."""
+        n = matrix.shape[0]
+        nlist = min(nlist or default_nlist(n), n)
+        rng = np.random.default_rng(seed)
+        sample_size = min(n, nlist * _TRAIN_SAMPLES_PER_LIST)
+        sample = matrix[rng.choice(n, size=sample_size, replace=False)] if sample_size < n else matrix
+        centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+        for _ in range(_KMEANS_ITERATIONS):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            # Boş kalan kümeler rastgele örneklerle yeniden başlatılır
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample.shape[0], size=int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0.0] = 1.0
+            centroids = (sums / norms).astype(np.float32, copy=False)
+        index = cls(centroids, [np.empty(0, dtype=np.int64) for _ in range(nlist)])
+        return index.with_rows(matrix, 0)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def with_rows(self, matrix: np.ndarray, start: int) -> 'IVFFlatIndex':
+        """matrix[start:] satırlarını en yakın kümelere ekleyerek yeni bir indeks döner."""
+        if start >= matrix.shape[0]:
+            return self
+        assign = self._assign(matrix[start:])
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=self.nlist)
+        bounds = np.concatenate([[0], np.cumsum(counts)])
+        lists = list(self.lists)
+        for c in np.nonzero(counts)[0]:
+            added = order[bounds[c]:bounds[c + 1]] + start
+            lists[c] = np.concatenate([lists[c], added.astype(np.int64)])
+        return IVFFlatIndex(self.centroids, lists)
+
+    def without_rows(self, keep: np.ndarray) -> 'IVFFlatIndex':
+        """keep maskesi False olan satırları çıkarır ve kalan pozisyonları yeniden numaralar."""
+        if keep.all():
+            return self
+        new_pos = np.cumsum(keep) - 1
+        lists = [new_pos[lst[keep[lst]]] for lst in self.lists]
+        return IVFFlatIndex(self.centroids, lists)
+
+    def search(self, matrix: np.ndarray, q: np.ndarray, top_k: int, nprobe: Optional[int] = None, scorer=None) -> Tuple[np.ndarray, np.ndarray]:
+        """scorer(q, positions) verilirse adaylar matris yerine onunla skorlanır (ör. nicemli kodlar)."""
+        nprobe = min(max(1, nprobe or HADITH_IVF_NPROBE), self.nlist)
+        probe = top_k_positions(self.centroids @ q, nprobe)
+        candidates = np.concatenate([self.lists[c] for c in probe])
+        if not candidates.shape[0]:
+            return candidates, np.empty(0, dtype=np.float32)
+        scores = scorer(q, candidates) if scorer is not None else matrix[candidates] @ q
+        top = top_k_positions(scores, top_k)
+        return candidates[top], scores[top]
+
+
+def build_ann(matrix: np.ndarray, engine: str = HADITH_ANN_ENGINE, ivf=None) -> Optional[IVFFlatIndex]:
+    """Ayara göre ANN motorunu kurar; 'exact' veya küçük korpuslarda None döner.
+
+    ivf: snapshot'tan gelen (centroids, assign) çifti verilirse eğitim atlanır.
+    """
+    if engine != 'ivf' or matrix.shape[0] < HADITH_ANN_MIN_ROWS:
+        return None
+    if ivf is not None and ivf[1].shape[0] == matrix.shape[0]:
+        return IVFFlatIndex.from_assignments(ivf[0], np.asarray(ivf[1]))
+    started = time.perf_counter()
+    ann = IVFFlatIndex.train(matrix, HADITH_IVF_NLIST)
+    print(f"[ANN] IVF-flat indeksi kuruldu: {matrix.shape[0]} satır, nlist={ann.nlist}, {time.perf_counter() - started:.1f}s")
+    return ann
+
+
+def recall_report(
+    matrix: np.ndarray,
+    ann: IVFFlatIndex,
+    nprobe_values: Sequence[int],
+    top_k: int = 10,
+    sample: int = 200,
+    seed: int = 0,
+) -> Dict:
+    """ANN sonuçlarını tam aramayla karşılaştırıp nprobe başına recall@k ve gecikme raporu üretir.
+
+    Sorgular, indeksteki vektörlere küçük gürültü eklenerek üretilir.
+    """
+    rng = np.random.default_rng(seed)
+    n = matrix.shape[0]
+    picks = rng.choice(n, size=min(sample, n), replace=False)
+    queries = matrix[picks] + rng.normal(scale=0.01, size=(picks.shape[0], matrix.shape[1])).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    started = time.perf_counter()
+    exact = [set(top_k_positions(matrix @ q, top_k).tolist()) for q in queries]
+    exact_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+    rows = []
+    for nprobe in nprobe_values:
+        started = time.perf_counter()
+        found = [ann.search(matrix, q, top_k, nprobe)[0] for q in queries]
+        ann_ms = (time.perf_counter() - started) * 1000 / len(queries)
+        recall = np.mean([len(truth.intersection(f.tolist())) / max(len(truth), 1) for truth, f in zip(exact, found)])
+        rows.append({
+            'nprobe': int(nprobe),
+            'recall_at_k': round(float(recall), 4),
+            'avg_latency_ms': round(ann_ms, 3),
+        })
+    return {
+        'rows': int(n),
+        'nlist': ann.nlist,
+        'top_k': top_k,
+        'queries': int(len(queries)),
+        'exact_avg_latency_ms': round(exact_ms, 3),
+        'results': rows,
+    }
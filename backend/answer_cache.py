@@ -0,0 +1,221 @@
+import itertools
+import os
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from ann_index import top_k_positions
+from embedding_utils import generate_embedding
+from hadith_data_version import bump_hadith_data_version, read_hadith_data_version
+from hadith_index import hadith_index, parse_embedding
+from ttl_cache import LRUTTLCache
+
+# Anlamsal cevap önbelleği: benzer soru (aynı dil ve kaynak filtresi) aynı cevabı alır
+ANSWER_CACHE_ENABLED = (os.getenv('ANSWER_CACHE_ENABLED') or 'true').strip().lower() in {'1', 'true', 'yes'}
+ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE') or 2000)
+ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL') or 6 * 3600)
+# Kosinüs benzerliği bu eşiğin altındaki sorular önbellekten cevaplanmaz
+ANSWER_CACHE_SIMILARITY = float(os.getenv('ANSWER_CACHE_SIMILARITY') or 0.95)
+# Başka worker'daki import'ların (settings'teki veri sürümü) kontrol aralığı (saniye)
+ANSWER_CACHE_VERSION_CHECK_SECONDS = float(os.getenv('ANSWER_CACHE_VERSION_CHECK_SECONDS') or 30)
+
+# Eşiğin üstündeki adaylardan kaç tanesi canlılık için denenir (süresi dolmuş satırlar atlanır)
+_LOOKUP_CANDIDATES = 4
+
+
+class CachedAnswer(NamedTuple):
+    question: str
+    answer: str
+    sources: List[Dict[str, Any]]       # SourceItem alanları (type, name)
+    response_type: str
+    hadith_id: Optional[int]
+    llm_ms: float                       # Cevap üretilirken harcanan LLM süresi (kazanılan süre metriği)
+
+
+class _Partition:
+    """Tek (model, dil, kaynak filtresi) bölümünün yoğun indeksi: normalize soru vektörleri ve giriş id'leri."""
+
+    def __init__(self, dim: int):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.matrix = np.empty((0, dim), dtype=np.float32)
+
+    def add(self, entry_id: int, vec: np.ndarray) -> None:
+        self.ids = np.append(self.ids, entry_id)
+        self.matrix = np.vstack([self.matrix, vec[None, :]])
+
+    def keep(self, live: set) -> None:
+        mask = np.fromiter((int(i) in live for i in self.ids), dtype=bool, count=self.ids.shape[0])
+        self.ids = self.ids[mask]
+        self.matrix = self.matrix[mask]
+
+
+class SemanticAnswerCache:
+    """/api/ask cevaplarının soru embedding'i benzerliğine göre önbelleği.
+
+    Girişler LRUTTLCache'te (LRU + TTL) tutulur; (model, dil, kaynak filtresi) bölümü başına
+    normalize soru vektörleri üzerinde kosinüs araması yapılır. Süresi dolan/atılan girişler
+    aramada atlanır ve indeks büyüdükçe ayıklanır. Hadisler yeniden import edilince önbellek
+    temizlenir; settings'teki veri sürümü sayesinde diğer worker'lar da temizler.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = ANSWER_CACHE_SIZE,
+        ttl: float = ANSWER_CACHE_TTL,
+        threshold: float = ANSWER_CACHE_SIMILARITY,
+        enabled: bool = ANSWER_CACHE_ENABLED,
+    ):
+        self.entries = LRUTTLCache(maxsize, ttl)
+        self.threshold = threshold
+        self.enabled = enabled
+        self._partitions: Dict[Tuple, _Partition] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._data_version: Optional[str] = None
+        self._last_version_check = 0.0
+        self.lookups = 0
+        self.hits = 0
+        self.stores = 0
+        self.invalidations = 0
+        self.saved_llm_ms = 0.0
+        self.hit_similarity_total = 0.0
+
+    @staticmethod
+    def _partition_key(model: Optional[str], language: Optional[str], source_filter: Optional[str]) -> Tuple:
+        return (model, (language or 'tr').lower(), (source_filter or 'all').strip().lower())
+
+    async def _embed(self, question: str) -> Optional[np.ndarray]:
+        vec = parse_embedding(await generate_embedding(question))
+        if vec is None:
+            return None
+        norm = float(np.linalg.norm(vec))
+        return (vec / norm).astype(np.float32) if norm else None
+
+    async def lookup(
+        self, question: str, language: Optional[str], source_filter: Optional[str],
+    ) -> Optional[CachedAnswer]:
+        """Eşik üstü en benzer canlı girişi döner; yoksa None. Sorgu embedding'i aramayla paylaşılır (LRU)."""
+        if not self.enabled:
+            return None
+        await self._check_data_version()
+        vec = await self._embed(question)
+        with self._lock:
+            self.lookups += 1
+        if vec is None:
+            return None
+        key = self._partition_key(hadith_index.model, language, source_filter)
+        with self._lock:
+            part = self._partitions.get(key)
+            if part is None or not part.ids.shape[0] or part.matrix.shape[1] != vec.shape[0]:
+                return None
+            scores = part.matrix @ vec
+            candidates = [(int(part.ids[p]), float(scores[p])) for p in top_k_positions(scores, _LOOKUP_CANDIDATES)]
+        for entry_id, score in candidates:
+            if score < self.threshold:
+                break
+            entry = self.entries.get(entry_id)
+            if entry is None:
+                continue
+            with self._lock:
+                self.hits += 1
+                self.saved_llm_ms += entry.llm_ms
+                self.hit_similarity_total += score
+            return entry
+        return None
+
+    @property
+    def generation(self) -> int:
+        """Temizleme sayacı; cevap üretimi başlamadan okunup store'a verilir."""
+        return self._generation
+
+    async def store(
+        self, question: str, language: Optional[str], source_filter: Optional[str], answer: CachedAnswer,
+        generation: Optional[int] = None,
+    ) -> bool:
+        """Cevabı saklar; generation verildiyse ve o zamandan beri önbellek temizlendiyse saklamaz."""
+        if not self.enabled:
+            return False
+        generation = self._generation if generation is None else generation
+        vec = await self._embed(question)
+        if vec is None:
+            return False
+        key = self._partition_key(hadith_index.model, language, source_filter)
+        with self._lock:
+            # Cevap üretilirken önbellek temizlendiyse (import) eski veriyle üretilmiş cevap saklanmaz
+            if generation != self._generation:
+                return False
+            entry_id = next(self._ids)
+            part = self._partitions.get(key)
+            if part is None or part.matrix.shape[1] != vec.shape[0]:
+                part = self._partitions[key] = _Partition(vec.shape[0])
+            part.add(entry_id, vec)
+            self.entries.set(entry_id, answer)
+            self.stores += 1
+            if sum(p.ids.shape[0] for p in self._partitions.values()) > 2 * max(self.entries.maxsize, 1):
+                self._prune()
+        return True
+
+    def _prune(self) -> None:
+        """Önbellekten atılmış/süresi dolmuş girişlerin vektörlerini indeksten çıkarır."""
+        live = set(self.entries.keys())
+        for key in list(self._partitions):
+            self._partitions[key].keep(live)
+            if not self._partitions[key].ids.shape[0]:
+                del self._partitions[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._partitions.clear()
+            self.entries.clear()
+            self.invalidations += 1
+
+    async def invalidate(self) -> None:
+        """Hadisler değişti: yerel önbelleği temizler ve veri sürümünü artırır (diğer worker'lar ve bellek içi indeksler yenilenir)."""
+        self.clear()
+        try:
+            self._data_version = await bump_hadith_data_version()
+        except Exception as e:
+            print(f"[ANSWERCACHE] Veri sürümü yazılamadı: {e}")
+
+    async def _check_data_version(self) -> None:
+        now = time.monotonic()
+        if now - self._last_version_check < ANSWER_CACHE_VERSION_CHECK_SECONDS:
+            return
+        self._last_version_check = now
+        try:
+            version = await read_hadith_data_version()
+        except Exception as e:
+            print(f"[ANSWERCACHE] Veri sürümü okunamadı: {e}")
+            return
+        if version != self._data_version:
+            if self._data_version is not None:
+                print("[ANSWERCACHE] Hadis verisi değişti; cevap önbelleği temizlendi")
+                self.clear()
+            self._data_version = version
+
+    def stats(self) -> Dict:
+        with self._lock:
+            misses = self.lookups - self.hits
+            return {
+                'enabled': self.enabled,
+                'threshold': self.threshold,
+                'size': len(self.entries),
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'misses': misses,
+                'hit_rate': round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                'avg_hit_similarity': round(self.hit_similarity_total / self.hits, 4) if self.hits else None,
+                'stores': self.stores,
+                'invalidations': self.invalidations,
+                'saved_llm_ms': round(self.saved_llm_ms, 1),
+                'avg_saved_llm_ms': round(self.saved_llm_ms / self.hits, 1) if self.hits else 0.0,
+                'entries': self.entries.stats(),
+            }
+
+
+# Global instance
+answer_cache = SemanticAnswerCache()
@@ -0,0 +1,388 @@
+import asyncio
+import bisect
+import os
+import re
+import time
+from array import array
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+from ann_index import top_k_positions
+from database import AsyncSessionLocal
+from hadith_data_version import HadithDataVersionTracker
+from models import Hadith
+
+# Metin (lexical) arama motoru: 'bm25' bellek içi ters indeks, 'postgres' tsvector + GIN, 'ilike' eski LIKE zinciri
+HADITH_LEXICAL_ENGINE = (os.getenv('HADITH_LEXICAL_ENGINE') or 'bm25').strip().lower()
+BM25_K1 = float(os.getenv('BM25_K1') or 1.2)
+BM25_B = float(os.getenv('BM25_B') or 0.75)
+# Sonradan eklenen doküman sayısı bunu aşınca delta ana dizilere birleştirilir
+BM25_DELTA_MAX = int(os.getenv('BM25_DELTA_MAX') or 5000)
+
+# Alan ağırlıkları (BM25F): kitap/bab başlıkları metin gövdesinden daha belirleyici
+FIELD_WEIGHTS = {
+    'turkish_text': 1.0,
+    'english_text': 1.0,
+    'arabic_text': 1.0,
+    'kitap': 2.0,
+    'bab': 2.0,
+    'source': 1.5,
+    'reference': 1.0,
+}
+_FIELDS = tuple(FIELD_WEIGHTS)
+_FIELD_WEIGHT_ARRAY = np.asarray([FIELD_WEIGHTS[f] for f in _FIELDS], dtype=np.float32)
+
+# Sorgu kelimesi indekste birebir yoksa/kısaysa aynı önekle başlayan terimler de aranır (namaz → namazı)
+_PREFIX_MIN_LEN = 4
+_PREFIX_EXPANSION_MAX = 32
+_PREFIX_WEIGHT = 0.5
+_LOAD_CHUNK_SIZE = 1000
+
+STOPWORDS = {
+    "ile", "ilgili", "hakkinda", "hakkında", "uzerine", "üzerine", "konusunda",
+    "nedir", "nasil", "nasıl", "lütfen", "lutfen", "ver", "verir", "misin", "misiniz",
+    "hadis", "hadisler", "ayet", "ayetler", "kaynak", "kaynaklar", "bu", "konu", "konuda",
+}
+_PUNCT_RE = re.compile(r"[\.,;:!\?\(\)\[\]\{\}\-\"'“”‘’«»،؛؟]")
+_BASIC_TOPICS = ("namaz", "oruç", "zekat", "hac")
+
+
+def tokenize(text) -> List[str]:
+    """Doküman metnini küçük harfe çevirip noktalamadan ayırır ve durak kelimeleri atar."""
+    parts = _PUNCT_RE.sub(" ", str(text or "").lower()).split()
+    return [p for p in parts if p not in STOPWORDS]
+
+
+def preprocess(q: str) -> List[str]:
+    """Sorgu ön-işleme: durak kelimeleri ve gürültüyü temizleyip anahtar kelimeleri çıkarır."""
+    parts = _PUNCT_RE.sub(" ", (q or "").lower().strip()).split()
+    tokens = [t for t in parts if t not in STOPWORDS]
+    # Çok genel isteklerde anahtar kelimeyi koru
+    if not tokens and any(w in parts for w in _BASIC_TOPICS):
+        tokens = [w for w in parts if w in _BASIC_TOPICS]
+    seen = set()
+    dedup = []
+    for t in tokens:
+        if t not in seen:
+            seen.add(t)
+            dedup.append(t)
+    return dedup
+
+
+class _BM25State(NamedTuple):
+    doc_ids: np.ndarray             # Pozisyon → hadis id (ana + delta)
+    alive: np.ndarray               # Güncellenen/silinen dokümanların eski pozisyonları False
+    vocab: Dict[str, int]           # Terim → terim no
+    sorted_terms: List[str]         # Önek genişletmesi için sıralı ana sözlük
+    offsets: np.ndarray             # CSR: terim t'nin kayıtları offsets[t]:offsets[t+1]
+    post_pos: np.ndarray            # Kayıt → doküman pozisyonu (int32)
+    post_weight: np.ndarray         # Kayıt → doygunlaştırılmış BM25F terim ağırlığı (float32)
+    avg_len: np.ndarray             # Alan başına ortalama token sayısı (canlı dokümanlar)
+    doc_lengths: np.ndarray         # Pozisyon → alan başına token sayısı
+    len_sum: np.ndarray             # Canlı dokümanların alan başına toplam token sayısı
+    delta: Dict[int, Tuple[array, array]]   # Terim no → (pozisyonlar, ağırlıklar) sonradan eklenenler
+    delta_docs: int
+
+
+def _empty_state() -> _BM25State:
+    return _BM25State(
+        np.empty(0, dtype=np.int64), np.empty(0, dtype=bool), {}, [],
+        np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32),
+        np.ones(len(_FIELDS), dtype=np.float32), np.empty((0, len(_FIELDS)), dtype=np.float32),
+        np.zeros(len(_FIELDS), dtype=np.float64), {}, 0,
+    )
+
+
+def _avg_len(len_sum: np.ndarray, n_docs: int) -> np.ndarray:
+    avg_len = len_sum / max(n_docs, 1)
+    return np.where(avg_len > 0, avg_len, 1.0).astype(np.float32)
+
+
+def _doc_fields(hadith) -> Dict[str, str]:
+    return {f: getattr(hadith, f, None) for f in _FIELDS}
+
+
+def _postings(docs: Sequence[Dict[str, str]], start: int, vocab: Dict[str, int], base_len_sum: np.ndarray, base_docs: int):
+    """Dokümanları (terim no, pozisyon, ağırlık) üçlülerine çevirir; yeni terimler vocab'a eklenir.
+
+    Alan uzunluğu normalizasyonu bu dokümanlar ve base_docs adet mevcut canlı dokümanın
+    (token toplamı base_len_sum) ortalamasıyla yapılır. Dönen üçlüler (terim, pozisyon)
+    sırasındadır; dokümanların alan uzunlukları da döner.
+    """
+    terms, positions, fields, counts = array('i'), array('i'), array('b'), array('f')
+    lengths = np.zeros((len(docs), len(_FIELDS)), dtype=np.float32)
+    for i, doc in enumerate(docs):
+        for f, name in enumerate(_FIELDS):
+            tokens = tokenize(doc.get(name))
+            lengths[i, f] = len(tokens)
+            tf: Dict[str, int] = {}
+            for t in tokens:
+                tf[t] = tf.get(t, 0) + 1
+            for t, c in tf.items():
+                term_id = vocab.get(t)
+                if term_id is None:
+                    term_id = vocab[t] = len(vocab)
+                terms.append(term_id)
+                positions.append(start + i)
+                fields.append(f)
+                counts.append(c)
+    avg_len = _avg_len(base_len_sum + lengths.sum(axis=0), base_docs + len(docs))
+    terms_a = np.frombuffer(terms, dtype=np.int32)
+    pos_a = np.frombuffer(positions, dtype=np.int32)
+    field_a = np.frombuffer(fields, dtype=np.int8).astype(np.intp)
+    # BM25F: alan uzunluğuna göre normalize edilip ağırlıklandırılmış terim frekansı
+    norm = 1.0 - BM25_B + BM25_B * lengths[pos_a - start, field_a] / avg_len[field_a]
+    pseudo_tf = _FIELD_WEIGHT_ARRAY[field_a] * np.frombuffer(counts, dtype=np.float32) / norm
+    # Aynı (terim, doküman) çiftinin alan katkıları toplanır
+    order = np.lexsort((pos_a, terms_a))
+    terms_a, pos_a, pseudo_tf = terms_a[order], pos_a[order], pseudo_tf[order]
+    if terms_a.shape[0]:
+        starts = np.concatenate([[0], np.nonzero((np.diff(terms_a) != 0) | (np.diff(pos_a) != 0))[0] + 1])
+        terms_a, pos_a = terms_a[starts], pos_a[starts]
+        pseudo_tf = np.add.reduceat(pseudo_tf, starts)
+    weight = (pseudo_tf * (BM25_K1 + 1.0) / (pseudo_tf + BM25_K1)).astype(np.float32)
+    return terms_a, pos_a, weight, lengths
+
+
+def _csr(terms: np.ndarray, positions: np.ndarray, weights: np.ndarray, vocab_size: int):
+    order = np.lexsort((positions, terms))
+    counts = np.bincount(terms, minlength=vocab_size)
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    return offsets, positions[order].astype(np.int32), weights[order].astype(np.float32)
+
+
+class HadithBM25Index:
+    """Hadis metin alanları üzerinde bellek içi BM25F ters indeks.
+
+    Terim kayıtları CSR düzeninde (offsets + int32 pozisyon + float32 ağırlık) tutulur;
+    yeni yüklenen hadisler küçük bir delta sözlüğüne eklenir ve gerektiğinde birleştirilir.
+    Hadis veri sürümü değişince (herhangi bir worker'da import) indeks arka planda yeniden kurulur.
+    """
+
+    def __init__(self):
+        self._state = _empty_state()
+        self._pos_by_id: Dict[int, int] = {}
+        self.loaded = False
+        self.reloads = 0
+        self.data_version = HadithDataVersionTracker('BM25')
+        self._load_lock = asyncio.Lock()
+        self._reload_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._pos_by_id)
+
+    def build(self, ids: Sequence[int], docs: Sequence[Dict[str, str]]) -> int:
+        """İndeksi verilen id/alan sözlükleriyle baştan kurar."""
+        vocab: Dict[str, int] = {}
+        terms, positions, weights, lengths = _postings(docs, 0, vocab, np.zeros(len(_FIELDS)), 0)
+        offsets, post_pos, post_weight = _csr(terms, positions, weights, len(vocab))
+        doc_ids = np.asarray(ids, dtype=np.int64)
+        alive = np.ones(doc_ids.shape[0], dtype=bool)
+        # Aynı id birden fazla verilmişse sonuncusu geçerli
+        pos_by_id: Dict[int, int] = {}
+        for pos, hadith_id in enumerate(doc_ids.tolist()):
+            if hadith_id in pos_by_id:
+                alive[pos_by_id[hadith_id]] = False
+            pos_by_id[hadith_id] = pos
+        len_sum = lengths[alive].sum(axis=0, dtype=np.float64)
+        self._state = _BM25State(
+            doc_ids, alive, vocab, sorted(vocab), offsets, post_pos, post_weight,
+            _avg_len(len_sum, len(pos_by_id)), lengths, len_sum, {}, 0,
+        )
+        self._pos_by_id = pos_by_id
+        self.loaded = True
+        return len(self)
+
+    async def ensure_loaded(self) -> None:
+        if self.loaded:
+            await self.maybe_reload()
+            return
+        async with self._load_lock:
+            if not self.loaded:
+                await self._load()
+
+    async def load(self) -> int:
+        async with self._load_lock:
+            return await self._load()
+
+    async def maybe_reload(self) -> bool:
+        """Veri sürümü değiştiyse indeksi arka planda yeniden kurar; bu sırada eski indeks sunulur."""
+        if self._load_lock.locked() or not await self.data_version.is_stale():
+            return False
+        if self._reload_task is None or self._reload_task.done():
+            self.reloads += 1
+            self._reload_task = asyncio.create_task(self.load())
+        return True
+
+    async def _load(self) -> int:
+        started = time.perf_counter()
+        version = await self.data_version.begin_load()
+        ids, docs = await self._fetch_docs()
+        # Tokenizasyon CPU yoğun; event loop'u bloklamamak için thread'de kurulur
+        await asyncio.to_thread(self.build, ids, docs)
+        self.data_version.loaded(version)
+        st = self._state
+        print(f"[BM25] Hadis metin indeksi yüklendi: {len(self)} doküman, {len(st.vocab)} terim, {st.post_pos.shape[0]} kayıt, {time.perf_counter() - started:.2f}s")
+        return len(self)
+
+    async def _fetch_docs(self) -> Tuple[List[int], List[Dict[str, str]]]:
+        ids: List[int] = []
+        docs: List[Dict[str, str]] = []
+        async with AsyncSessionLocal() as session:
+            stmt = select(Hadith.id, *[getattr(Hadith, f) for f in _FIELDS])
+            result = await session.stream(stmt.execution_options(yield_per=_LOAD_CHUNK_SIZE))
+            async for row in result:
+                ids.append(row[0])
+                docs.append(dict(zip(_FIELDS, row[1:])))
+        return ids, docs
+
+    def add_hadiths(self, hadiths: Iterable) -> int:
+        """Yeni yüklenen/güncellenen Hadith nesnelerini indekse ekler (indeks yüklü değilse atlanır)."""
+        if not self.loaded:
+            return 0
+        hadiths = [h for h in hadiths if getattr(h, 'id', None) is not None]
+        return self.add([h.id for h in hadiths], [_doc_fields(h) for h in hadiths])
+
+    def add(self, ids: Sequence[int], docs: Sequence[Dict[str, str]]) -> int:
+        """Dokümanları delta segmente ekler; aynı id varsa eski kaydı geçersiz kılar."""
+        if not ids:
+            return 0
+        st = self._state
+        if not len(self):
+            return self.build(ids, docs)
+        start = int(st.doc_ids.shape[0])
+        vocab_before = len(st.vocab)
+        # Yeniden yüklenen dokümanların eski sürümü ortalamadan çıkarılır; yeni dokümanlar güncel ortalamayla normalize edilir
+        replaced = sorted({self._pos_by_id[int(h)] for h in ids if int(h) in self._pos_by_id})
+        base_len_sum = st.len_sum - st.doc_lengths[replaced].sum(axis=0, dtype=np.float64)
+        terms, positions, weights, lengths = _postings(docs, start, st.vocab, base_len_sum, len(self) - len(replaced))
+        # Yeni terimler önek genişletmesinde de bulunabilsin
+        for term in list(st.vocab)[vocab_before:]:
+            bisect.insort(st.sorted_terms, term)
+        for t, p, w in zip(terms.tolist(), positions.tolist(), weights.tolist()):
+            entry = st.delta.get(t)
+            if entry is None:
+                entry = st.delta[t] = (array('i'), array('f'))
+            entry[0].append(p)
+            entry[1].append(w)
+        alive = np.concatenate([st.alive, np.ones(len(ids), dtype=bool)])
+        for offset, hadith_id in enumerate(ids):
+            old = self._pos_by_id.get(int(hadith_id))
+            if old is not None:
+                alive[old] = False
+            self._pos_by_id[int(hadith_id)] = start + offset
+        doc_lengths = np.concatenate([st.doc_lengths, lengths])
+        # Aynı partide tekrarlanan id'lerin önceki kopyaları da canlı sayılmaz
+        dead = start + np.flatnonzero(~alive[start:])
+        len_sum = base_len_sum + lengths.sum(axis=0, dtype=np.float64) - doc_lengths[dead].sum(axis=0, dtype=np.float64)
+        self._state = st._replace(
+            doc_ids=np.concatenate([st.doc_ids, np.asarray(ids, dtype=np.int64)]),
+            alive=alive,
+            avg_len=_avg_len(len_sum, len(self)),
+            doc_lengths=doc_lengths,
+            len_sum=len_sum,
+            delta_docs=st.delta_docs + len(ids),
+        )
+        if self._state.delta_docs > BM25_DELTA_MAX:
+            self.compact()
+        return len(ids)
+
+    def compact(self) -> None:
+        """Delta kayıtlarını ana CSR dizilerine birleştirir ve geçersiz pozisyonları atar."""
+        st = self._state
+        base_terms = np.repeat(np.arange(st.offsets.shape[0] - 1, dtype=np.int32), np.diff(st.offsets))
+        delta_terms = [np.full(len(p), t, dtype=np.int32) for t, (p, _) in st.delta.items()]
+        terms = np.concatenate([base_terms] + delta_terms)
+        positions = np.concatenate([st.post_pos] + [np.array(p, dtype=np.int32) for p, _ in st.delta.values()])
+        weights = np.concatenate([st.post_weight] + [np.array(w, dtype=np.float32) for _, w in st.delta.values()])
+        keep = st.alive[positions]
+        new_pos = (np.cumsum(st.alive) - 1).astype(np.int32)
+        offsets, post_pos, post_weight = _csr(terms[keep], new_pos[positions[keep]], weights[keep], len(st.vocab))
+        doc_ids = st.doc_ids[st.alive]
+        self._state = _BM25State(
+            doc_ids, np.ones(doc_ids.shape[0], dtype=bool), st.vocab, sorted(st.vocab),
+            offsets, post_pos, post_weight, st.avg_len, st.doc_lengths[st.alive], st.len_sum, {}, 0,
+        )
+        self._pos_by_id = {hadith_id: pos for pos, hadith_id in enumerate(doc_ids.tolist())}
+
+    def _query_terms(self, tokens: Sequence[str]) -> Dict[int, float]:
+        st = self._state
+        out: Dict[int, float] = {}
+        for tok in tokens:
+            term_id = st.vocab.get(tok)
+            if term_id is not None:
+                out[term_id] = 1.0
+            if len(tok) < _PREFIX_MIN_LEN:
+                continue
+            i = bisect.bisect_left(st.sorted_terms, tok)
+            expanded = 0
+            while i < len(st.sorted_terms) and expanded < _PREFIX_EXPANSION_MAX and st.sorted_terms[i].startswith(tok):
+                other = st.vocab[st.sorted_terms[i]]
+                if other not in out:
+                    out[other] = _PREFIX_WEIGHT
+                i += 1
+                expanded += 1
+        return out
+
+    def search(self, query: str, top_k: int = 3, allowed_ids: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Sorguya en uygun top_k hadisin (ids, BM25 skorları) dizilerini azalan sırayla döner.
+
+        allowed_ids verilirse yalnızca bu id'lerdeki eşleşmeler sıralanır.
+        """
+        st = self._state
+        terms = self._query_terms(preprocess(query))
+        if not terms or not len(self) or top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        n_docs = len(self)
+        vocab_size = st.offsets.shape[0] - 1
+        pos_parts, score_parts = [], []
+        for term_id, qweight in terms.items():
+            parts_pos, parts_w = [], []
+            if term_id < vocab_size:
+                lo, hi = st.offsets[term_id], st.offsets[term_id + 1]
+                parts_pos.append(st.post_pos[lo:hi])
+                parts_w.append(st.post_weight[lo:hi])
+            if term_id in st.delta:
+                # Kopya alınır: delta dizileri sonraki eklemelerde büyüyebilir
+                p, w = st.delta[term_id]
+                parts_pos.append(np.array(p, dtype=np.int32))
+                parts_w.append(np.array(w, dtype=np.float32))
+            if not parts_pos:
+                continue
+            pos = np.concatenate(parts_pos) if len(parts_pos) > 1 else parts_pos[0]
+            # Yeniden yüklemeyle geçersiz kalan kayıtlar df'e sayılmaz (n_docs de yalnızca canlıları sayar)
+            df = int(st.alive[pos].sum())
+            idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            pos_parts.append(pos)
+            score_parts.append((np.concatenate(parts_w) if len(parts_w) > 1 else parts_w[0]) * np.float32(idf * qweight))
+        if not pos_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        # Yalnızca eşleşen dokümanlar üzerinde toplanır; tüm korpus taranmaz
+        touched, inverse = np.unique(np.concatenate(pos_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts)).astype(np.float32)
+        live = st.alive[touched]
+        if allowed_ids is not None:
+            live &= np.isin(st.doc_ids[touched], allowed_ids)
+        touched, scores = touched[live], scores[live]
+        top = top_k_positions(scores, top_k)
+        return st.doc_ids[touched[top]], scores[top]
+
+    def stats(self) -> Dict:
+        st = self._state
+        return {
+            'documents': len(self),
+            'terms': len(st.vocab),
+            'postings': int(st.post_pos.shape[0]),
+            'delta_documents': st.delta_docs,
+            'data_version': self.data_version.version,
+            'reloads': self.reloads,
+            'bytes': int(
+                st.offsets.nbytes + st.post_pos.nbytes + st.post_weight.nbytes + st.doc_ids.nbytes + st.doc_lengths.nbytes
+            ),
+        }
+
+
+# Global instance
+hadith_bm25 = HadithBM25Index()
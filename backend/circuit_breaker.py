@@ -0,0 +1,228 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from outbound_scheduler import RateLimitedError, classify_error
+
+T = TypeVar('T')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Kayan pencere (sn) ve devreyi açmak için gereken en az çağrı sayısı
+CIRCUIT_WINDOW_SECONDS = float(os.getenv('CIRCUIT_WINDOW_SECONDS') or 60)
+CIRCUIT_MIN_REQUESTS = int(os.getenv('CIRCUIT_MIN_REQUESTS') or 5)
+# Penceredeki hata oranı veya yavaş çağrı oranı bu eşikleri aşarsa devre açılır
+CIRCUIT_ERROR_RATE = float(os.getenv('CIRCUIT_ERROR_RATE') or 0.5)
+CIRCUIT_SLOW_CALL_RATE = float(os.getenv('CIRCUIT_SLOW_CALL_RATE') or 0.8)
+# Yavaş çağrı sınırı (ms): LLM tamamlamaları embedding isteklerinden çok daha uzun sürer
+CIRCUIT_LLM_SLOW_CALL_MS = float(os.getenv('CIRCUIT_LLM_SLOW_CALL_MS') or 25000)
+CIRCUIT_EMBEDDING_SLOW_CALL_MS = float(os.getenv('CIRCUIT_EMBEDDING_SLOW_CALL_MS') or 5000)
+# Açık devre bu süre sonra yarı açığa geçer; yarı açıkta en fazla bu kadar deneme çağrısına izin verilir
+CIRCUIT_OPEN_SECONDS = float(os.getenv('CIRCUIT_OPEN_SECONDS') or 30)
+CIRCUIT_HALF_OPEN_MAX_CALLS = int(os.getenv('CIRCUIT_HALF_OPEN_MAX_CALLS') or 1)
+
+
+class CircuitOpenError(Exception):
+    """Devre açık: sağlayıcı çağrılmadan atlandı."""
+
+
+def counts_as_failure(exc: BaseException) -> bool:
+    """Sağlayıcının kendisine ait hatalar (5xx, 408, bağlantı/zaman aşımı, bozuk cevap) devreyi etkiler.
+
+    Kendi limitimizden (RateLimitedError) ve 429/diğer 4xx'ten gelen hatalar sağlayıcının çöktüğünü göstermez.
+    """
+    if isinstance(exc, (RateLimitedError, CircuitOpenError)):
+        return False
+    _, status, _ = classify_error(exc)
+    if status is not None:
+        return status >= 500 or status == 408
+    return True
+
+
+class CircuitBreaker:
+    """Kayan pencerede hata ve gecikme oranına göre closed/open/half_open durumlu devre kesici.
+
+    Açık devrede çağrılar sağlayıcıya gitmeden reddedilir; CIRCUIT_OPEN_SECONDS sonra yarı açık
+    duruma geçilir ve sınırlı sayıda deneme çağrısı yapılır: deneme başarılı ve hızlıysa devre
+    kapanır, başarısız veya yavaşsa yeniden açılır.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        slow_call_ms: float = CIRCUIT_LLM_SLOW_CALL_MS,
+        window_seconds: float = CIRCUIT_WINDOW_SECONDS,
+        min_requests: int = CIRCUIT_MIN_REQUESTS,
+        error_rate: float = CIRCUIT_ERROR_RATE,
+        slow_call_rate: float = CIRCUIT_SLOW_CALL_RATE,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS,
+        half_open_max_calls: int = CIRCUIT_HALF_OPEN_MAX_CALLS,
+    ):
+        self.name = name
+        self.slow_call_ms = slow_call_ms
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self.opens = 0
+        self.rejected = 0
+        self.last_error: Optional[str] = None
+        self.last_change = time.time()
+        self._samples = deque()  # (monotonic zaman, hata mı, yavaş mı)
+        self._open_until = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """Açık ve bekleme süresi dolmamış; yan etkisizdir (deneme hakkı ayırmaz)."""
+        with self._lock:
+            return self.state == OPEN and time.monotonic() < self._open_until
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            print(f"[CIRCUIT] {self.name}: {self.state} -> {state}")
+            self.state = state
+            self.last_change = time.time()
+
+    def _open(self, now: float) -> None:
+        self._set_state(OPEN)
+        self._open_until = now + self.open_seconds
+        self._probes = 0
+        self._samples.clear()
+        self.opens += 1
+
+    def _trim(self, now: float) -> None:
+        while self._samples and self._samples[0][0] < now - self.window_seconds:
+            self._samples.popleft()
+
+    def allow(self) -> bool:
+        """Çağrıya izin verilip verilmediği; yarı açıkta izin bir deneme hakkı ayırır."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN:
+                if now < self._open_until:
+                    self.rejected += 1
+                    return False
+                self._set_state(HALF_OPEN)
+                self._probes = 0
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_max_calls:
+                    self.rejected += 1
+                    return False
+                self._probes += 1
+            return True
+
+    def release(self) -> None:
+        """Sonucu sayılmayan (iptal edilen, limite takılan) çağrının deneme hakkını geri verir."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+
+    def _add(self, now: float, failed: bool, slow: bool) -> None:
+        self._samples.append((now, failed, slow))
+        self._trim(now)
+        total = len(self._samples)
+        if self.state != CLOSED or total < self.min_requests:
+            return
+        errors = sum(1 for _, f, _ in self._samples if f)
+        slows = sum(1 for _, _, s in self._samples if s)
+        if errors / total >= self.error_rate or slows / total >= self.slow_call_rate:
+            self._open(now)
+
+    def record_success(self, ms: float) -> None:
+        slow = ms >= self.slow_call_ms
+        with self._lock:
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if slow:
+                    self._open(now)
+                else:
+                    self._set_state(CLOSED)
+                    self._samples.clear()
+                return
+            self._add(now, False, slow)
+
+    def record_failure(self, error: str) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self.last_error = error
+            if self.state == HALF_OPEN:
+                self._open(now)
+                return
+            self._add(now, True, False)
+
+    def record_error(self, exc: BaseException) -> None:
+        if counts_as_failure(exc):
+            self.record_failure(str(exc) or type(exc).__name__)
+        else:
+            self.release()
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """fn'i devre izin veriyorsa çalıştırır ve sonucu (süresiyle) kaydeder; açıksa CircuitOpenError."""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} devresi açık")
+        started = time.perf_counter()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            self.release()
+            raise
+        except Exception as e:
+            self.record_error(e)
+            raise
+        self.record_success((time.perf_counter() - started) * 1000)
+        return result
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            total = len(self._samples)
+            errors = sum(1 for _, f, _ in self._samples if f)
+            slows = sum(1 for _, _, s in self._samples if s)
+            return {
+                'state': self.state,
+                'window_requests': total,
+                'error_rate': round(errors / total, 4) if total else 0.0,
+                'slow_call_rate': round(slows / total, 4) if total else 0.0,
+                'retry_in_seconds': round(max(0.0, self._open_until - now), 1) if self.state == OPEN else None,
+                'opens': self.opens,
+                'rejected': self.rejected,
+                'last_error': self.last_error,
+                'last_change': self.last_change,
+            }
+
+
+class CircuitBreakerRegistry:
+    """Sağlayıcı adına göre devre kesiciler (LLM tamamlama uç noktaları)."""
+
+    def __init__(self, slow_call_ms: float = CIRCUIT_LLM_SLOW_CALL_MS):
+        self.slow_call_ms = slow_call_ms
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(name, self.slow_call_ms)
+            return breaker
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {name: breaker.snapshot() for name, breaker in sorted(breakers.items())}
+
+
+# Global instance
+circuit_breakers = CircuitBreakerRegistry()
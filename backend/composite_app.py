@@ -14,12 +14,25 @@ from models import (
 )
 
 # Vektör arama yardımcıları
+from hadith_filters import parse_filters
 from vector_search import search_hadiths
 
 # --- Mevcut endpoint: Hadis vektör arama ---
 @app.get("/api/hadith_search")
-async def hadith_search(q: str = Query(..., description="Aranacak metin"), top_k: int = 3) -> Any:
-    results = await search_hadiths(q, top_k=top_k)
+async def hadith_search(
+    q: str = Query(..., description="Aranacak metin"),
+    top_k: int = 3,
+    source: Optional[str] = Query(None, description="Kaynak filtresi (virgülle birden fazla: Buhari,Müslim)"),
+    category: Optional[str] = Query(None, description="Kategori filtresi"),
+    language: Optional[str] = Query(None, description="Dil filtresi (tr, en, ar)"),
+    authenticity: Optional[str] = Query(None, description="Sahihlik filtresi (sahih, hasen...)"),
+    query_language: Optional[str] = Query(None, description="Sorgu dili (tr, en, ar); boşsa tespit edilir"),
+    language_mode: Optional[str] = Query(None, description="route: sorgu dilinin indeksi, all: tüm dil indeksleri"),
+) -> Any:
+    filters = parse_filters(source=source, category=category, language=language, authenticity=authenticity)
+    results = await search_hadiths(
+        q, top_k=top_k, filters=filters, language=query_language, language_mode=language_mode,
+    )
     return [
         {
             "id": h.id,
@@ -27,9 +40,10 @@ async def hadith_search(q: str = Query(..., description="Aranacak metin"), top_k
             "source": h.source,
             "reference": h.reference,
             "category": h.category,
-            "language": h.language
+            "language": h.language,
+            "score": score
         }
-        for h in results
+        for h, score in results
     ]
 
 # --- Yardımcı: sure numarasını isme çevir ---
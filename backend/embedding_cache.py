@@ -0,0 +1,131 @@
+import hashlib
+import re
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from database import AsyncSessionLocal
+from hadith_index import decode_embedding, encode_embedding, parse_embedding
+from models import EmbeddingCache
+
+# Tek sorguda aranan en fazla özet sayısı (IN listesi); 1000 metinlik parti tek round-trip'tir
+_LOOKUP_CHUNK_SIZE = 1000
+
+
+def normalize_embedding_text(text: str) -> str:
+    """İçerik özeti için metni sadeleştirir: NFC, tek boşluk, baş/son boşluksuz (büyük/küçük harf korunur)."""
+    return re.sub(r"\s+", " ", unicodedata.normalize('NFC', text or '')).strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_embedding_text(text).encode('utf-8')).hexdigest()
+
+
+class EmbeddingContentCache:
+    """embedding_cache tablosu üzerinden (metin özeti, model, boyut) anahtarlı embedding önbelleği.
+
+    Import'larda tekrar eden hadis metinleri ve aynı soru sağlayıcıya yeniden gönderilmez.
+    Önbellek hataları aramayı/backfill'i durdurmaz; ıska sayılır.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.errors = 0
+
+    def _count(self, hits: int, misses: int) -> None:
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    async def lookup(
+        self, texts: Sequence[str], models: Sequence[str], dim: Optional[int] = None,
+    ) -> List[Optional[Tuple[np.ndarray, str]]]:
+        """Metinlerle hizalı (vektör, model) listesi; bulunamayanlar None.
+
+        Birden çok model varsa listedeki ilk modelin (sağlayıcı tercih sırası) kaydı seçilir.
+        """
+        results: List[Optional[Tuple[np.ndarray, str]]] = [None] * len(texts)
+        if not texts or not models:
+            return results
+        hashes = [text_hash(t) for t in texts]
+        found: Dict[str, Tuple[np.ndarray, str]] = {}
+        rank = {m: i for i, m in enumerate(models)}
+        unique = list(dict.fromkeys(hashes))
+        try:
+            async with AsyncSessionLocal() as session:
+                for start in range(0, len(unique), _LOOKUP_CHUNK_SIZE):
+                    stmt = select(EmbeddingCache.text_hash, EmbeddingCache.model, EmbeddingCache.dim, EmbeddingCache.embedding_vec).where(
+                        EmbeddingCache.text_hash.in_(unique[start:start + _LOOKUP_CHUNK_SIZE]),
+                        EmbeddingCache.model.in_(list(models)),
+                    )
+                    if dim:
+                        stmt = stmt.where(EmbeddingCache.dim == dim)
+                    for h, model, row_dim, blob in (await session.execute(stmt)).all():
+                        vec = decode_embedding(blob, row_dim)
+                        if vec is None:
+                            continue
+                        current = found.get(h)
+                        if current is None or rank[model] < rank[current[1]]:
+                            found[h] = (vec, model)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            print(f"[EMBCACHE] Önbellek okunamadı: {e}")
+        for i, h in enumerate(hashes):
+            results[i] = found.get(h)
+        hits = sum(1 for r in results if r is not None)
+        self._count(hits, len(texts) - hits)
+        return results
+
+    async def store(self, texts: Sequence[str], vectors: Sequence, model: Optional[str]) -> int:
+        """Yeni embedding'leri tek INSERT ... ON CONFLICT DO NOTHING ile yazar."""
+        if not model:
+            return 0
+        rows = {}
+        for text, vec in zip(texts, vectors):
+            vec = parse_embedding(vec)
+            if vec is None or not normalize_embedding_text(text):
+                continue
+            h = text_hash(text)
+            rows[h] = {
+                'text_hash': h,
+                'model': model,
+                'dim': int(vec.shape[0]),
+                'embedding_vec': encode_embedding(vec),
+            }
+        if not rows:
+            return 0
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(insert(EmbeddingCache).values(list(rows.values())).on_conflict_do_nothing())
+                await session.commit()
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            print(f"[EMBCACHE] Önbelleğe yazılamadı: {e}")
+            return 0
+        with self._lock:
+            self.stored += len(rows)
+        return len(rows)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'stored': self.stored,
+                'errors': self.errors,
+            }
+
+
+# Global instance
+embedding_content_cache = EmbeddingContentCache()
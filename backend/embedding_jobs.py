@@ -0,0 +1,263 @@
+import asyncio
+import os
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, or_, select, update
+
+from database import AsyncSessionLocal
+from hadith_index import EMBEDDING_LANGUAGES, hadith_index, has_embedding_clause, has_text_clause, missing_version_clause
+from models import BackgroundJob, Hadith
+
+EMBEDDING_BACKFILL_JOB = 'embedding_backfill'
+# Yeni model sürümünü hadith_embeddings tablosuna dolduran iş (sorgular eski modelle sürer)
+EMBEDDING_REEMBED_JOB = 'embedding_reembed'
+ACTIVE_JOB_STATUSES = ('pending', 'running')
+# Bu süre boyunca heartbeat yazmayan 'running' iş sahipsiz sayılır (çöken/yeniden deploy edilen worker)
+EMBEDDING_JOB_STALE_SECONDS = int(os.getenv('EMBEDDING_JOB_STALE_SECONDS') or 300)
+# Çalışan iş parti bitmesini beklemeden bu aralıkla heartbeat yazar (sağlayıcı beklemesinde sahiplik korunur)
+EMBEDDING_JOB_HEARTBEAT_SECONDS = float(os.getenv('EMBEDDING_JOB_HEARTBEAT_SECONDS') or EMBEDDING_JOB_STALE_SECONDS / 5)
+
+
+def _pending_rows_clause(after_id: int, model: Optional[str] = None, language: str = 'tr'):
+    """Verilen (yoksa sunulan) model ve dilde embedding'i olmayan, metni dolu ve checkpoint'ten sonra gelen hadisler."""
+    serving = hadith_index.model
+    model = model or serving
+    return (
+        ~has_embedding_clause(model) if language == 'tr' and model == serving else missing_version_clause(model, language),
+        has_text_clause(language),
+        Hadith.id > after_id,
+    )
+
+
+def job_progress(job: BackgroundJob, remaining: int) -> Tuple[Optional[float], Optional[float]]:
+    """(satır/sn, tahmini kalan sn): son başlatmadan bu yana işlenen satırlar / son heartbeat'e kadar geçen süre."""
+    throughput = None
+    if job.started_at and job.heartbeat_at:
+        elapsed = (job.heartbeat_at - job.started_at).total_seconds()
+        done_this_run = job.processed + job.failed - (job.run_processed or 0)
+        if elapsed > 0 and done_this_run > 0:
+            throughput = done_this_run / elapsed
+    eta = round(remaining / throughput, 1) if throughput and job.status == 'running' else None
+    return throughput, eta
+
+
+class EmbeddingJobRunner:
+    """Embedding backfill'ini background_jobs tablosundaki kaldığı yer bilgisiyle yürütür.
+
+    İş DB'de tutulduğu için HTTP isteği hemen döner; worker çökerse veya yeniden deploy
+    edilirse iş son checkpoint'ten (last_id) devam eder. Aynı iş birden çok worker'da
+    başlatılmaya çalışılsa da DB'deki atomik sahiplenme yalnızca birinin çalıştırmasına izin verir.
+    """
+
+    def __init__(self, heartbeat_seconds: float = EMBEDDING_JOB_HEARTBEAT_SECONDS):
+        self.heartbeat_seconds = heartbeat_seconds
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    async def enqueue(
+        self, kind: str = EMBEDDING_BACKFILL_JOB, model: Optional[str] = None, language: str = 'tr',
+    ) -> BackgroundJob:
+        """Aynı türde (modelde ve dilde) aktif iş varsa onu, yoksa yeni bir iş döner ve arka planda başlatır."""
+        await hadith_index.resolve_model()
+        async with AsyncSessionLocal() as session:
+            job = (await session.execute(
+                select(BackgroundJob)
+                .where(
+                    BackgroundJob.kind == kind,
+                    BackgroundJob.model.is_not_distinct_from(model),
+                    BackgroundJob.language == language,
+                    BackgroundJob.status.in_(ACTIVE_JOB_STATUSES),
+                )
+                .order_by(BackgroundJob.id)
+                .limit(1)
+            )).scalars().first()
+            if job is None:
+                total = (await session.execute(
+                    select(func.count(Hadith.id)).where(*_pending_rows_clause(0, model, language))
+                )).scalar_one()
+                job = BackgroundJob(kind=kind, model=model, language=language, status='pending', total=total)
+                session.add(job)
+                await session.commit()
+                print(f"[JOB] Embedding işi oluşturuldu: #{job.id} {kind}/{language} ({total} hadis)")
+        await self.start(job.id)
+        return job
+
+    async def enqueue_languages(self, kind: str = EMBEDDING_BACKFILL_JOB, model: Optional[str] = None) -> List[BackgroundJob]:
+        """EMBEDDING_LANGUAGES'taki her dil için ayrı iş (ayrı checkpoint) kuyruğa alır."""
+        return [await self.enqueue(kind, model, language) for language in EMBEDDING_LANGUAGES]
+
+    async def start(self, job_id: int) -> bool:
+        """İşi sahiplenebilirse bu worker'da arka plan görevi olarak başlatır."""
+        task = self._tasks.get(job_id)
+        if task is not None and not task.done():
+            return True
+        job = await self._claim(job_id)
+        if job is None:
+            return False
+        self._tasks[job_id] = asyncio.create_task(self._run(job))
+        return True
+
+    async def wait(self, job_id: int) -> None:
+        task = self._tasks.get(job_id)
+        if task is not None:
+            await task
+
+    async def _claim(self, job_id: int) -> Optional[BackgroundJob]:
+        """Bekleyen veya sahipsiz kalmış işi atomik olarak 'running' durumuna alır."""
+        stale_before = func.now() - timedelta(seconds=EMBEDDING_JOB_STALE_SECONDS)
+        async with AsyncSessionLocal() as session:
+            claimed = await session.execute(
+                update(BackgroundJob)
+                .where(
+                    BackgroundJob.id == job_id,
+                    or_(
+                        BackgroundJob.status == 'pending',
+                        (BackgroundJob.status == 'running') & or_(
+                            BackgroundJob.heartbeat_at == None, BackgroundJob.heartbeat_at < stale_before,
+                        ),
+                    ),
+                )
+                .values(
+                    status='running', started_at=func.now(), heartbeat_at=func.now(),
+                    run_processed=BackgroundJob.processed + BackgroundJob.failed,
+                )
+            )
+            await session.commit()
+            if not claimed.rowcount:
+                return None
+            return await session.get(BackgroundJob, job_id)
+
+    async def _run(self, job: BackgroundJob) -> None:
+        from embedding_utils import update_hadith_embeddings
+
+        job_id = job.id
+        print(f"[JOB] Embedding işi #{job_id} başladı ({job.language}, last_id={job.last_id})")
+        lock = asyncio.Lock()
+        watermark = job.last_id
+
+        async def _checkpoint(done_until: int, ok: int, failed: int) -> None:
+            nonlocal watermark
+            # Partiler eşzamanlı bittiği için yazımlar sıralanır; last_id hiç geri gitmez
+            async with lock:
+                watermark = max(watermark, done_until)
+                await self._write_checkpoint(job_id, watermark, ok, failed)
+
+        heartbeat = asyncio.create_task(self._keep_alive(job_id))
+        status, error = 'completed', None
+        try:
+            await update_hadith_embeddings(
+                start_after_id=job.last_id, on_progress=_checkpoint, model=job.model, language=job.language,
+            )
+        except Exception as e:
+            status, error = 'failed', str(e)
+            print(f"[JOB] Embedding işi #{job_id} başarısız: {e}")
+        finally:
+            heartbeat.cancel()
+        await self._finish(job_id, status, error)
+        print(f"[JOB] Embedding işi #{job_id} bitti: {status}")
+        if status == 'completed' and job.kind == EMBEDDING_REEMBED_JOB:
+            from embedding_versions import embedding_versions
+            await embedding_versions.maybe_cutover(job.model)
+
+    async def _keep_alive(self, job_id: int) -> None:
+        """Tek parti EMBEDDING_JOB_STALE_SECONDS'tan uzun sürse de iş başka worker'a geçmesin diye heartbeat yazar."""
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                await self._heartbeat(job_id)
+            except Exception as e:
+                print(f"[JOB] Embedding işi #{job_id} heartbeat yazılamadı: {e}")
+
+    async def _write_checkpoint(self, job_id: int, watermark: int, ok: int, failed: int) -> None:
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(BackgroundJob)
+                .where(BackgroundJob.id == job_id)
+                .values(
+                    last_id=func.greatest(BackgroundJob.last_id, watermark),
+                    processed=BackgroundJob.processed + ok,
+                    failed=BackgroundJob.failed + failed,
+                    heartbeat_at=func.now(),
+                )
+            )
+            await session.commit()
+
+    async def _heartbeat(self, job_id: int) -> None:
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(BackgroundJob)
+                .where(BackgroundJob.id == job_id, BackgroundJob.status == 'running')
+                .values(heartbeat_at=func.now())
+            )
+            await session.commit()
+
+    async def _finish(self, job_id: int, status: str, error: Optional[str]) -> None:
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(BackgroundJob)
+                .where(BackgroundJob.id == job_id)
+                .values(status=status, error=error, finished_at=func.now(), heartbeat_at=func.now())
+            )
+            await session.commit()
+
+    async def resume_pending(self) -> int:
+        """Startup'ta yarım kalmış backfill ve yeniden embedding işlerini bu worker'da devam ettirir.
+
+        Başka bir worker'ın checkpoint'i hâlâ tazeyse iş sahipsiz kalana (veya bitene) kadar beklenir.
+        """
+        await hadith_index.resolve_model()
+        resumed = 0
+        while True:
+            async with AsyncSessionLocal() as session:
+                jobs = (await session.execute(
+                    select(BackgroundJob)
+                    .where(
+                        BackgroundJob.kind.in_((EMBEDDING_BACKFILL_JOB, EMBEDDING_REEMBED_JOB)),
+                        BackgroundJob.status.in_(ACTIVE_JOB_STATUSES),
+                    )
+                    .order_by(BackgroundJob.id)
+                )).scalars().all()
+            if not jobs:
+                return resumed
+            for job in jobs:
+                if await self.start(job.id):
+                    resumed += 1
+            if resumed:
+                return resumed
+            await asyncio.sleep(EMBEDDING_JOB_STALE_SECONDS)
+
+    async def status(self, job_id: int) -> Optional[Dict]:
+        """İş ilerlemesi: işlenen/başarısız/kalan sayıları, hız (satır/sn) ve tahmini bitiş süresi."""
+        await hadith_index.resolve_model()
+        async with AsyncSessionLocal() as session:
+            job = await session.get(BackgroundJob, job_id)
+            if job is None:
+                return None
+            remaining = 0
+            if job.status in ACTIVE_JOB_STATUSES:
+                remaining = (await session.execute(
+                    select(func.count(Hadith.id)).where(*_pending_rows_clause(job.last_id, job.model, job.language))
+                )).scalar_one()
+        throughput, eta = job_progress(job, remaining)
+        return {
+            'id': job.id,
+            'kind': job.kind,
+            'model': job.model,
+            'language': job.language,
+            'status': job.status,
+            'last_id': job.last_id,
+            'total': job.total,
+            'processed': job.processed,
+            'failed': job.failed,
+            'remaining': remaining,
+            'throughput_per_sec': round(throughput, 2) if throughput else None,
+            'eta_seconds': eta,
+            'error': job.error,
+            'created_at': job.created_at,
+            'started_at': job.started_at,
+            'finished_at': job.finished_at,
+        }
+
+
+# Global instance
+embedding_jobs = EmbeddingJobRunner()
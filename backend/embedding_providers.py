@@ -0,0 +1,352 @@
+import asyncio
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import httpx
+import numpy as np
+from dotenv import load_dotenv
+
+from circuit_breaker import CIRCUIT_EMBEDDING_SLOW_CALL_MS, CircuitBreaker
+from hadith_index import parse_embedding
+from local_embedding import (
+    LOCAL_EMBEDDING_MODEL, LOCAL_EMBEDDING_MODEL_PATH, ONNX_AVAILABLE, MicroBatcher, OnnxSentenceEncoder,
+)
+from outbound_scheduler import BACKGROUND, FOREGROUND, estimate_tokens, outbound_scheduler
+
+load_dotenv()
+
+# Sağlayıcı anahtarları ve uç noktaları
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+OPENAI_EMBEDDING_MODEL = os.getenv('OPENAI_EMBEDDING_MODEL', 'text-embedding-3-small')
+OPENAI_EMBEDDING_URL = 'https://api.openai.com/v1/embeddings'
+
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+GEMINI_EMBEDDING_MODEL = 'gemini-embedding-exp-03-07'
+GEMINI_BATCH_EMBEDDING_URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}:batchEmbedContents"
+
+# Dağıtım başına sağlayıcı seçimi: auto (OpenAI, sonra Gemini) | openai | gemini | local
+EMBEDDING_PROVIDER = (os.getenv('EMBEDDING_PROVIDER') or 'auto').strip().lower()
+
+# Paylaşılan keep-alive istemci ve yedek sağlayıcıya geçiş ayarları
+EMBEDDING_HTTP_TIMEOUT = float(os.getenv('EMBEDDING_HTTP_TIMEOUT') or 30)
+EMBEDDING_MAX_CONNECTIONS = int(os.getenv('EMBEDDING_MAX_CONNECTIONS') or 50)
+# Birincil sağlayıcı bu süre içinde cevap vermezse yedek sağlayıcıya paralel istek atılır
+EMBEDDING_HEDGE_DELAY_MS = float(os.getenv('EMBEDDING_HEDGE_DELAY_MS') or 1500)
+# Birincilin EWMA gecikmesi biliniyorsa hedge bu katında (alt sınırla) başlar; yavaşlama erken fark edilir
+EMBEDDING_HEDGE_EWMA_FACTOR = float(os.getenv('EMBEDDING_HEDGE_EWMA_FACTOR') or 3)
+EMBEDDING_HEDGE_MIN_DELAY_MS = float(os.getenv('EMBEDDING_HEDGE_MIN_DELAY_MS') or 250)
+EMBEDDING_EWMA_ALPHA = float(os.getenv('EMBEDDING_EWMA_ALPHA') or 0.2)
+# Art arda bu kadar hata alan sağlayıcı bekleme süresi boyunca sona alınır
+EMBEDDING_PROVIDER_FAILURE_THRESHOLD = int(os.getenv('EMBEDDING_PROVIDER_FAILURE_THRESHOLD') or 3)
+EMBEDDING_PROVIDER_COOLDOWN = float(os.getenv('EMBEDDING_PROVIDER_COOLDOWN') or 30)
+
+
+class ProviderHealth:
+    """Sağlayıcı başına başarı/hata sayıları ve EWMA gecikme (ms)."""
+
+    def __init__(self, alpha: float = EMBEDDING_EWMA_ALPHA):
+        self.alpha = alpha
+        self.ewma_ms: Optional[float] = None
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_error: Optional[str] = None
+        self._unhealthy_until = 0.0
+        self._lock = threading.Lock()
+
+    def record_success(self, ms: float) -> None:
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.ewma_ms = ms if self.ewma_ms is None else self.alpha * ms + (1 - self.alpha) * self.ewma_ms
+
+    def record_failure(self, error: str) -> None:
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = error
+            if self.consecutive_failures >= EMBEDDING_PROVIDER_FAILURE_THRESHOLD:
+                self._unhealthy_until = time.monotonic() + EMBEDDING_PROVIDER_COOLDOWN
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self._unhealthy_until
+
+    def snapshot(self) -> Dict:
+        return {
+            'healthy': self.healthy,
+            'ewma_ms': round(self.ewma_ms, 1) if self.ewma_ms is not None else None,
+            'successes': self.successes,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures,
+            'last_error': self.last_error,
+        }
+
+
+class EmbeddingProvider(ABC):
+    """Tek istekte metin listesini embed eden HTTP sağlayıcı; hata durumunda istisna fırlatır."""
+
+    name = ''
+    # Aynı API anahtarıyla çağrılabilen model adı önekleri (model sürümleri arası geçiş için)
+    model_prefixes: Tuple[str, ...] = ()
+
+    def __init__(self, api_key: Optional[str], model: str):
+        self.api_key = api_key
+        self.model = model
+        self.health = ProviderHealth()
+        # Sağlayıcı çökükken sorgular bağlantı/zaman aşımı beklemeden sıradakine geçer
+        self.breaker = CircuitBreaker(f'embedding:{self.name}', CIRCUIT_EMBEDDING_SLOW_CALL_MS)
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def supports(self, model: str) -> bool:
+        return model == self.model or model.startswith(self.model_prefixes)
+
+    @abstractmethod
+    async def embed(self, client: httpx.AsyncClient, texts: Sequence[str], model: Optional[str] = None) -> List:
+        """Metinlerle hizalı embedding listesi (model verilmezse sağlayıcının modeli)."""
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    name = 'openai'
+    model_prefixes = ('text-embedding-',)
+
+    async def embed(self, client: httpx.AsyncClient, texts: Sequence[str], model: Optional[str] = None) -> List:
+        resp = await client.post(
+            OPENAI_EMBEDDING_URL,
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            json={"model": model or self.model, "input": [t or "" for t in texts]},
+        )
+        resp.raise_for_status()
+        # API sırayı garanti etmez; index alanına göre girdi sırasına dizilir
+        items = sorted(resp.json().get('data', []), key=lambda d: d.get('index', 0))
+        return [item.get('embedding') for item in items]
+
+
+class GeminiEmbeddingProvider(EmbeddingProvider):
+    name = 'gemini'
+    model_prefixes = ('gemini-embedding',)
+
+    async def embed(self, client: httpx.AsyncClient, texts: Sequence[str], model: Optional[str] = None) -> List:
+        model = model or self.model
+        resp = await client.post(
+            GEMINI_BATCH_EMBEDDING_URL.format(model=model),
+            headers={"x-goog-api-key": self.api_key},
+            json={
+                "requests": [
+                    {
+                        "model": f"models/{model}",
+                        "content": {"parts": [{"text": t or ""}]},
+                        "taskType": "SEMANTIC_SIMILARITY",
+                    }
+                    for t in texts
+                ],
+            },
+        )
+        resp.raise_for_status()
+        return [item.get('values') for item in resp.json().get('embeddings', [])]
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """Süreç içinde CPU'da çalışan ONNX cümle embedding modeli (ağ çağrısı yok).
+
+    Eşzamanlı sorgular MicroBatcher ile tek forward pass'te embed edilir. onnxruntime/tokenizers
+    kurulu değilse veya model klasörü yoksa yapılandırılmamış sayılır.
+    """
+
+    name = 'local'
+
+    def __init__(self, model_path: str, model: str):
+        super().__init__(None, model)
+        self.model_path = model_path
+        self._encoder: Optional[OnnxSentenceEncoder] = None
+        self._encoder_lock = threading.Lock()
+        self.batcher = MicroBatcher(self._encode)
+
+    @property
+    def configured(self) -> bool:
+        return ONNX_AVAILABLE and bool(self.model_path) and os.path.isdir(self.model_path)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        # Model ilk kullanımda (batcher thread'inde) bir kez yüklenir
+        if self._encoder is None:
+            with self._encoder_lock:
+                if self._encoder is None:
+                    self._encoder = OnnxSentenceEncoder(self.model_path)
+                    print(f"[EMBED] Yerel embedding modeli yüklendi: {self.model}")
+        return self._encoder.encode(texts)
+
+    async def embed(self, client: httpx.AsyncClient, texts: Sequence[str], model: Optional[str] = None) -> List:
+        return await self.batcher.embed(texts)
+
+
+class EmbeddingProviderPool:
+    """Sağlayıcıları paylaşılan keep-alive httpx.AsyncClient üzerinden sırayla/hedge ederek çağırır.
+
+    Sağlıklı sağlayıcılar tercih sırasını korur (indeksle aynı model öncelikli); art arda hata
+    alanlar bekleme süresince sona alınır. Birincil sağlayıcı kendi EWMA gecikmesine göre beklenenden
+    (en fazla EMBEDDING_HEDGE_DELAY_MS) uzun sürerse sıradaki sağlayıcıya paralel istek atılır,
+    ilk başarılı cevap kullanılır.
+    """
+
+    def __init__(self, providers: Sequence[EmbeddingProvider], hedge_delay_ms: float = EMBEDDING_HEDGE_DELAY_MS, transport=None):
+        self.providers = list(providers)
+        self.hedge_delay_ms = hedge_delay_ms
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop = None
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # İstemci havuzu oluşturulduğu event loop'a bağlıdır (betikler asyncio.run ile yeni loop açar)
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(EMBEDDING_HTTP_TIMEOUT, connect=5.0),
+                limits=httpx.Limits(max_connections=EMBEDDING_MAX_CONNECTIONS, max_keepalive_connections=EMBEDDING_MAX_CONNECTIONS),
+                headers={"Content-Type": "application/json"},
+                transport=self._transport,
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    def ordered(self) -> List[EmbeddingProvider]:
+        configured = [p for p in self.providers if p.configured]
+        preferred = [p for p in configured if p.health.healthy and not p.breaker.is_open]
+        return preferred + [p for p in configured if p not in preferred]
+
+    def hedge_delay(self, provider: EmbeddingProvider) -> float:
+        """Hedge'e kadar beklenecek süre (sn): EWMA gecikmesinin katı, [alt sınır, yapılandırılmış] aralığında."""
+        ewma = provider.health.ewma_ms
+        if ewma is None:
+            return self.hedge_delay_ms / 1000
+        delay = min(self.hedge_delay_ms, max(EMBEDDING_HEDGE_MIN_DELAY_MS, EMBEDDING_HEDGE_EWMA_FACTOR * ewma))
+        return delay / 1000
+
+    def models(self) -> List[str]:
+        return [p.model for p in self.ordered()]
+
+    def active_model(self) -> Optional[str]:
+        """İndeksin ve sorguların kullandığı model: tercih sırasındaki ilk yapılandırılmış sağlayıcı.
+
+        Sağlık durumundan bağımsızdır; farklı modelin vektörleri indeksteki vektörlerle karşılaştırılamaz.
+        """
+        return next((p.model for p in self.providers if p.configured), None)
+
+    async def _call(
+        self, client: httpx.AsyncClient, provider: EmbeddingProvider, texts: Sequence[str], model: Optional[str] = None,
+        priority: int = FOREGROUND,
+    ) -> Optional[List[np.ndarray]]:
+        if provider.breaker.is_open:
+            return None
+        started = time.perf_counter()
+        try:
+            # Limit/öncelik/yeniden deneme ortak zamanlayıcıda; LLM çağrılarıyla aynı sağlayıcı kovası.
+            # Her deneme devre kesiciden geçer (açıksa CircuitOpenError, yeniden denenmez).
+            raw = await outbound_scheduler.call(
+                provider.name, lambda: provider.breaker.call(lambda: provider.embed(client, texts, model)),
+                tokens=estimate_tokens(*texts), priority=priority,
+            )
+            vectors = [parse_embedding(v) for v in raw]
+            if len(vectors) != len(texts) or any(v is None for v in vectors):
+                raise ValueError("eksik embedding cevabı")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            provider.health.record_failure(str(e) or type(e).__name__)
+            print(f"[EMBED] {provider.name} embedding hatası: {e}")
+            return None
+        provider.health.record_success((time.perf_counter() - started) * 1000)
+        return vectors
+
+    async def embed(
+        self, texts: Sequence[str], hedge: bool = True, model: Optional[str] = None, priority: Optional[int] = None,
+    ) -> Tuple[List[Optional[np.ndarray]], Optional[str]]:
+        """Metinlerle hizalı (vektörler, model); hiçbir sağlayıcı başarılı olmazsa vektörler None.
+
+        hedge=False (ör. backfill) ise yedek sağlayıcı yalnızca birincil başarısız olunca çağrılır.
+        model verilirse yalnızca o modeli üreten sağlayıcılar denenir (indeksle uyumlu vektör).
+        priority verilmezse hedge'li (sorgu) çağrılar canlı, diğerleri arka plan önceliğindedir.
+        """
+        if priority is None:
+            priority = FOREGROUND if hedge else BACKGROUND
+        queue = [p for p in self.ordered() if model is None or p.supports(model)]
+        if not texts or not queue:
+            return [None] * len(texts), None
+        client = self._get_client()
+        pending: Dict[asyncio.Task, EmbeddingProvider] = {}
+        primary = queue[0]
+        hedged = False
+
+        def _launch() -> None:
+            provider = queue.pop(0)
+            pending[asyncio.create_task(self._call(client, provider, texts, model, priority))] = provider
+
+        _launch()
+        try:
+            while pending:
+                timeout = self.hedge_delay(primary) if hedge and queue else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Birincil gecikti: tam zaman aşımını beklemeden sıradakine de istek at
+                    self.hedges += 1
+                    hedged = True
+                    _launch()
+                    continue
+                for task in done:
+                    provider = pending.pop(task)
+                    vectors = task.result()
+                    if vectors is not None:
+                        if hedged and provider is not primary:
+                            self.hedge_wins += 1
+                        return vectors, model or provider.model
+                if queue and not pending:
+                    _launch()
+            return [None] * len(texts), None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict:
+        providers = {
+            p.name: {'model': p.model, 'configured': p.configured, **p.health.snapshot(), 'circuit': p.breaker.snapshot()}
+            for p in self.providers
+        }
+        for p in self.providers:
+            if isinstance(p, LocalEmbeddingProvider):
+                providers[p.name]['micro_batching'] = p.batcher.stats()
+        return {
+            'selected': EMBEDDING_PROVIDER,
+            'active_model': self.active_model(),
+            'providers': providers,
+            'hedge_delay_ms': self.hedge_delay_ms,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+        }
+
+
+def build_providers(selection: str = EMBEDDING_PROVIDER) -> List[EmbeddingProvider]:
+    """EMBEDDING_PROVIDER seçimine göre tercih sırasındaki sağlayıcılar."""
+    available = {
+        'openai': lambda: OpenAIEmbeddingProvider(OPENAI_API_KEY, OPENAI_EMBEDDING_MODEL),
+        'gemini': lambda: GeminiEmbeddingProvider(GEMINI_API_KEY, GEMINI_EMBEDDING_MODEL),
+        'local': lambda: LocalEmbeddingProvider(LOCAL_EMBEDDING_MODEL_PATH, LOCAL_EMBEDDING_MODEL),
+    }
+    if selection in available:
+        return [available[selection]()]
+    return [available['openai'](), available['gemini']()]
+
+
+# Global instance: varsayılan tercih sırası önce OpenAI, sonra Gemini
+embedding_providers = EmbeddingProviderPool(build_providers())
@@ -0,0 +1,130 @@
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Tüm uvicorn worker'larının paylaştığı, sürümlenmiş embedding snapshot dizini
+_backend_dir = os.path.abspath(os.path.dirname(__file__))
+EMBEDDING_SNAPSHOT_DIR = os.getenv('EMBEDDING_SNAPSHOT_DIR') or os.path.join(_backend_dir, 'data', 'embedding_snapshots')
+# Diskte tutulacak en fazla snapshot sürümü (eski worker'lar bir önceki sürümü mmap'lemiş olabilir)
+EMBEDDING_SNAPSHOT_KEEP = int(os.getenv('EMBEDDING_SNAPSHOT_KEEP') or 2)
+
+_CURRENT_FILE = 'CURRENT'
+_MANIFEST_FILE = 'manifest.json'
+_IDS_FILE = 'ids.npy'
+_VECTORS_FILE = 'vectors.npy'
+_IVF_CENTROIDS_FILE = 'ivf_centroids.npy'
+_IVF_ASSIGN_FILE = 'ivf_assign.npy'
+_QUANT_FILE_PREFIX = 'quant_'
+
+
+def current_version(base_dir: str = EMBEDDING_SNAPSHOT_DIR) -> Optional[str]:
+    """CURRENT işaretçisinin gösterdiği snapshot sürümünü döner (yoksa None)."""
+    try:
+        with open(os.path.join(base_dir, _CURRENT_FILE), encoding='utf-8') as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return version or None
+
+
+def write_snapshot(
+    ids: np.ndarray,
+    matrix: np.ndarray,
+    model: Optional[str],
+    ivf: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    base_dir: str = EMBEDDING_SNAPSHOT_DIR,
+    quant: Optional[Tuple[str, Dict[str, np.ndarray]]] = None,
+) -> Dict:
+    """ids, normalize vektörler ve manifest'i yeni bir sürüm dizinine yazar, ardından
+    CURRENT işaretçisini atomik olarak (os.replace) yeni sürüme çevirir.
+
+    ivf verilirse (centroids, satır başına küme no) da kaydedilir; worker'lar yeniden eğitmez.
+    quant verilirse (tür, {'quant_*': dizi}) nicemli kodlar da yazılır ve mmap ile paylaşılır.
+    """
+    os.makedirs(base_dir, exist_ok=True)
+    version = f"v{datetime.utcnow().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    tmp_dir = os.path.join(base_dir, f".tmp-{version}")
+    os.makedirs(tmp_dir)
+    try:
+        np.save(os.path.join(tmp_dir, _IDS_FILE), np.ascontiguousarray(ids, dtype=np.int64))
+        np.save(os.path.join(tmp_dir, _VECTORS_FILE), np.ascontiguousarray(matrix, dtype=np.float32))
+        if ivf is not None:
+            np.save(os.path.join(tmp_dir, _IVF_CENTROIDS_FILE), np.ascontiguousarray(ivf[0], dtype=np.float32))
+            np.save(os.path.join(tmp_dir, _IVF_ASSIGN_FILE), np.ascontiguousarray(ivf[1], dtype=np.int32))
+        if quant is not None:
+            for name, arr in quant[1].items():
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(arr))
+        manifest = {
+            'version': version,
+            'model': model,
+            'dimension': int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+            'row_count': int(ids.shape[0]),
+            'max_hadith_id': int(ids.max()) if ids.shape[0] else 0,
+            'normalized': True,
+            'ivf': ivf is not None,
+            'quantization': quant[0] if quant is not None else None,
+            'quant_arrays': sorted(quant[1]) if quant is not None else [],
+            'created_at': datetime.utcnow().isoformat(),
+        }
+        with open(os.path.join(tmp_dir, _MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.rename(tmp_dir, os.path.join(base_dir, version))
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    pointer_tmp = os.path.join(base_dir, f".{_CURRENT_FILE}.{uuid.uuid4().hex[:6]}")
+    with open(pointer_tmp, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(base_dir, _CURRENT_FILE))
+    _prune_old_versions(base_dir, keep=version)
+    return manifest
+
+
+def _prune_old_versions(base_dir: str, keep: str) -> None:
+    # Linux'ta silinen dosyanın mevcut mmap'leri geçerli kalır; yine de bir önceki sürüm korunur
+    versions = sorted(d for d in os.listdir(base_dir) if d.startswith('v') and d != keep)
+    for old in versions[:max(0, len(versions) - (EMBEDDING_SNAPSHOT_KEEP - 1))]:
+        shutil.rmtree(os.path.join(base_dir, old), ignore_errors=True)
+
+
+def open_snapshot(version: Optional[str] = None, base_dir: str = EMBEDDING_SNAPSHOT_DIR):
+    """Snapshot'ı salt-okunur mmap olarak açar.
+
+    Returns: (manifest, ids, matrix, ivf, quant) veya snapshot yoksa None.
+    ivf: (centroids, assign) ya da None
+    quant: {'quant_*': dizi} (kodlar mmap) ya da None
+    """
+    version = version or current_version(base_dir)
+    if not version:
+        return None
+    path = os.path.join(base_dir, version)
+    try:
+        with open(os.path.join(path, _MANIFEST_FILE), encoding='utf-8') as f:
+            manifest = json.load(f)
+        ids = np.load(os.path.join(path, _IDS_FILE), mmap_mode='r')
+        matrix = np.load(os.path.join(path, _VECTORS_FILE), mmap_mode='r')
+        ivf = None
+        if manifest.get('ivf'):
+            ivf = (
+                np.load(os.path.join(path, _IVF_CENTROIDS_FILE)),
+                np.load(os.path.join(path, _IVF_ASSIGN_FILE), mmap_mode='r'),
+            )
+        quant = None
+        if manifest.get('quantization'):
+            quant = {
+                name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+                for name in manifest.get('quant_arrays', [])
+                if name.startswith(_QUANT_FILE_PREFIX)
+            }
+    except (FileNotFoundError, ValueError, json.JSONDecodeError) as e:
+        print(f"[SNAPSHOT] {version} açılamadı: {e}")
+        return None
+    if ids.shape[0] != manifest.get('row_count') or (ids.shape[0] and matrix.shape[1] != manifest.get('dimension')):
+        print(f"[SNAPSHOT] {version} manifest ile uyuşmuyor, yok sayılıyor")
+        return None
+    return manifest, ids, matrix, ivf, quant
@@ -1,94 +1,324 @@
 import os
-import requests
+import re
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import AsyncSessionLocal
-from models import Hadith
+from models import Hadith, HadithEmbedding
 import asyncio
-from sqlalchemy import select
+import inspect
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from typing import Callable, List, Optional, Sequence, Tuple
+import numpy as np
+from hadith_index import (
+    LANGUAGE_TEXT_COLUMNS, hadith_index, language_indexes, parse_embedding, encode_embedding,
+    has_embedding_clause, has_text_clause, missing_version_clause,
+)
+from ttl_cache import LRUTTLCache
+from embedding_cache import embedding_content_cache, text_hash
+from embedding_providers import (
+    embedding_providers,
+    OPENAI_API_KEY, OPENAI_EMBEDDING_MODEL, GEMINI_API_KEY, GEMINI_EMBEDDING_MODEL,
+)
 from dotenv import load_dotenv
 load_dotenv()
 
-# Sağlayıcı anahtarları ve uç noktaları
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-OPENAI_EMBEDDING_MODEL = os.getenv('OPENAI_EMBEDDING_MODEL', 'text-embedding-3-small')
-OPENAI_EMBEDDING_URL = 'https://api.openai.com/v1/embeddings'
+# Toplu embedding (backfill): istek başına metin sayısı ve eşzamanlı istek sayısı
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE') or 64)
+EMBEDDING_CONCURRENCY = int(os.getenv('EMBEDDING_CONCURRENCY') or 4)
 
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-GEMINI_EMBEDDING_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-embedding-exp-03-07:embedContent"
+# Sorgu embedding önbelleği: aynı soru tekrar sorulduğunda sağlayıcıya gidilmez
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE') or 2048)
+QUERY_EMBEDDING_CACHE_TTL = float(os.getenv('QUERY_EMBEDDING_CACHE_TTL') or 24 * 3600)
+query_embedding_cache = LRUTTLCache(QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL)
 
-def _generate_openai_embedding(text: str):
-    if not OPENAI_API_KEY:
+async def embed_texts(
+    texts: Sequence[str], hedge: bool = False, model: Optional[str] = None,
+) -> Tuple[List[Optional[np.ndarray]], Optional[str]]:
+    """Metin listesini tek sağlayıcı isteğiyle embed eder: (vektörler, model).
+
+    model verilmezse indeksin sunduğu model kullanılır; yalnızca o modeli üretebilen sağlayıcılar
+    denenir, hepsi başarısızsa tüm vektörler None olur.
+    """
+    return await embedding_providers.embed(texts, hedge=hedge, model=model or hadith_index.model)
+
+# Sağlayıcı-agnostik embedding üretici (EMBEDDING_PROVIDER ile seçilen model)
+async def embed_text(text: str) -> Tuple[Optional[np.ndarray], Optional[str]]:
+    """Metnin float32 embedding vektörünü ve onu üreten model adını döner.
+
+    Kullanıcıyı bekleten çağrılar için birincil sağlayıcı gecikirse yedeğe hedge edilir.
+    """
+    vectors, model = await embed_texts([text], hedge=True)
+    return vectors[0], model
+
+def normalize_query_text(text: str) -> str:
+    """Önbellek anahtarı için soruyu sadeleştirir: küçük harf, tek boşluk, sondaki noktalama yok."""
+    text = re.sub(r"\s+", " ", (text or "").strip()).casefold()
+    return text.rstrip(" ?!.")
+
+def _embedding_models():
+    # Önbellekten de yalnızca indekste karşılaştırılabilir (sunulan model) vektörler okunur
+    model = hadith_index.model
+    return [model] if model else []
+
+def _cached_query_embedding(key: str, models) -> Optional[np.ndarray]:
+    for model in models:
+        vec = query_embedding_cache.get((key, model))
+        if vec is not None:
+            return vec
+    return None
+
+def _remember_query_embedding(key: str, vec: np.ndarray, model: str) -> np.ndarray:
+    # Önbellekteki dizi paylaşılır; yanlışlıkla değiştirilmesin
+    vec.setflags(write=False)
+    query_embedding_cache.set((key, model), vec)
+    return vec
+
+async def generate_embedding(text: str) -> Optional[np.ndarray]:
+    """Arama sorgusunun embedding'ini döner: bellek önbelleği, sonra embedding_cache tablosu, en son sağlayıcı.
+
+    Bellek önbelleği (normalize metin, model) anahtarlıdır; sağlayıcı çağrısı event loop'u bloklamaz.
+    """
+    key = normalize_query_text(text)
+    if not key:
         return None
-    try:
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-        }
-        payload = {
-            "model": OPENAI_EMBEDDING_MODEL,
-            "input": text or "",
-        }
-        resp = requests.post(OPENAI_EMBEDDING_URL, headers=headers, json=payload, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
-        vec = data.get('data', [{}])[0].get('embedding')
-        if not vec:
-            return None
-        return ','.join(map(str, vec))
-    except Exception as e:
-        print(f"OpenAI embedding hatası: {e}")
+    models = _embedding_models()
+    vec = _cached_query_embedding(key, models)
+    if vec is not None:
+        return vec
+    cached = (await embedding_content_cache.lookup([key], models, _index_dim()))[0]
+    if cached is not None:
+        vec, model = cached
+        return _remember_query_embedding(key, vec.copy(), model)
+    vec, model = await embed_text(text)
+    if vec is None:
         return None
+    await embedding_content_cache.store([key], [vec], model)
+    return _remember_query_embedding(key, vec, model)
 
-def _generate_gemini_embedding(text: str):
-    if not GEMINI_API_KEY:
-        return None
-    try:
-        headers = {
-            "Content-Type": "application/json",
-            "x-goog-api-key": GEMINI_API_KEY,
-        }
-        payload = {
-            "model": "models/gemini-embedding-exp-03-07",
-            "content": {"parts": [{"text": text or ""}]},
-            "taskType": "SEMANTIC_SIMILARITY",
+def _index_dim() -> Optional[int]:
+    # Önbellekten indeksle aynı boyutta vektör istenir (farklı boyut aramada kullanılamaz)
+    return (hadith_index.dim or None) if hadith_index.loaded else None
+
+def embedding_columns(value, model: Optional[str] = None) -> dict:
+    """Hadith satırına yazılacak binary embedding alanlarını hazırlar (eski metin alanı boş kalır)."""
+    vec = parse_embedding(value)
+    if vec is None:
+        return {}
+    return {
+        'embedding_vec': encode_embedding(vec),
+        'embedding_dim': int(vec.shape[0]),
+        'embedding_model': model,
+    }
+
+def supplied_embedding_columns(value, model) -> dict:
+    """Dosyayla gelen (CSV) embedding'i yalnızca hangi modelle üretildiği de verilmişse saklar.
+
+    Modeli bilinmeyen vektör sunulan modelin vektörleriyle karşılaştırılamaz; o satırlar
+    apply_cached_embeddings ve backfill işiyle sunulan modelde yeniden embed edilir.
+    """
+    if not isinstance(model, str) or not model.strip():
+        return {}
+    return embedding_columns(value, model.strip())
+
+async def embed_texts_cached(
+    texts: Sequence[str], model: Optional[str] = None,
+) -> List[Tuple[Optional[np.ndarray], Optional[str]]]:
+    """Metinleri önce embedding_cache tablosunda (tek sorgu) arar, yalnızca ıskaları sağlayıcıya gönderir.
+
+    Aynı metin partide birden çok kez geçse de bir kez embed edilir. Metinlerle hizalı (vektör, model) döner.
+    model verilmezse sunulan model kullanılır.
+    """
+    if model and model != hadith_index.model:
+        results = await embedding_content_cache.lookup(texts, [model])
+    else:
+        results = await embedding_content_cache.lookup(texts, _embedding_models(), _index_dim())
+    missing: dict = {}
+    for i, hit in enumerate(results):
+        if hit is None:
+            missing.setdefault(text_hash(texts[i]), []).append(i)
+    if missing:
+        miss_texts = [texts[positions[0]] for positions in missing.values()]
+        vectors, model = await embed_texts(miss_texts, model=model)
+        await embedding_content_cache.store(miss_texts, vectors, model)
+        for positions, vec in zip(missing.values(), vectors):
+            if vec is not None:
+                for i in positions:
+                    results[i] = (vec, model)
+    return [hit if hit is not None else (None, None) for hit in results]
+
+def _version_rows(pairs, language: str = 'tr') -> List[dict]:
+    return [
+        {
+            'hadith_id': hadith_id, 'model': model, 'language': language,
+            'dim': int(vec.shape[0]), 'embedding_vec': encode_embedding(vec),
         }
-        response = requests.post(GEMINI_EMBEDDING_URL, headers=headers, json=payload, timeout=30)
-        response.raise_for_status()
-        data = response.json()
-        embedding = data.get('embedding', {}).get('values')
-        if not embedding:
-            return None
-        return ','.join(map(str, embedding))
-    except Exception as e:
-        print(f"Gemini embedding hatası: {e}")
-        return None
+        for hadith_id, vec, model in pairs
+    ]
+
+async def _upsert_versions(session, pairs, language: str = 'tr') -> None:
+    """hadith_embeddings tablosuna (hadis, model, dil) başına tek satır yazar; varsa günceller."""
+    stmt = pg_insert(HadithEmbedding).values(_version_rows(pairs, language))
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=[HadithEmbedding.hadith_id, HadithEmbedding.model, HadithEmbedding.language],
+        set_={'dim': stmt.excluded.dim, 'embedding_vec': stmt.excluded.embedding_vec},
+    ))
+
+async def _write_embeddings(pairs) -> int:
+    """(hadis id, vektör, model) üçlülerini birincil anahtara göre toplu UPDATE ile yazar ve indekse ekler.
+
+    Aynı transaction'da model sürüm tablosuna (hadith_embeddings) da yazılır.
+    """
+    params = [{'id': hadith_id, **embedding_columns(vec, model)} for hadith_id, vec, model in pairs]
+    if not params:
+        return 0
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(Hadith), params)
+        await _upsert_versions(session, pairs)
+        await session.commit()
+    # Bellekteki indeks zaten yüklüyse yeni vektörleri ekle (yüklü değilse ilk aramada DB'den kurulur)
+    if hadith_index.loaded:
+        for model in {p[2] for p in pairs}:
+            group = [p for p in pairs if p[2] == model]
+            hadith_index.add([p[0] for p in group], [p[1] for p in group], model=model)
+    return len(params)
+
+async def apply_cached_embeddings(hadiths) -> int:
+    """Yeni yüklenen hadislere embedding_cache'te karşılığı olan embedding'leri sağlayıcıya gitmeden yazar.
+
+    Önbellekte olmayanlar backfill işine kalır. Yazılan satır sayısını döner.
+    """
+    rows = [
+        (h.id, h.turkish_text) for h in hadiths
+        if getattr(h, 'id', None) is not None and h.turkish_text and not h.embedding_vec and not h.embedding
+    ]
+    if not rows:
+        return 0
+    hits = await embedding_content_cache.lookup([text for _, text in rows], _embedding_models(), _index_dim())
+    pairs = [(hadith_id, hit[0], hit[1]) for (hadith_id, _), hit in zip(rows, hits) if hit is not None]
+    updated = await _write_embeddings(pairs)
+    if updated:
+        print(f"[EMBCACHE] {updated} yeni hadis önbellekten embed edildi.")
+    return updated
 
-# Sağlayıcı-agnostik embedding üretici: Önce OpenAI, sonra Gemini
-def generate_embedding(text: str):
-    emb = _generate_openai_embedding(text)
-    if emb:
-        return emb
-    return _generate_gemini_embedding(text)
+async def _write_version_embeddings(pairs, language: str = 'tr') -> int:
+    """Embedding'leri yalnızca hadith_embeddings tablosuna yazar (geçiş hedefi model veya tr dışı diller).
 
-async def update_hadith_embeddings() -> int:
+    Sunulan modelin tr dışı vektörleri, yüklüyse o dilin indeksine de eklenir.
+    """
+    if not pairs:
+        return 0
     async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Hadith).where((Hadith.embedding == None) | (Hadith.embedding == ''))
-        )
-        hadiths = result.scalars().all()
-        updated = 0
-        for hadith in hadiths:
-            # Yeni şemada embedding için turkish_text kullanılmalı
-            text = hadith.turkish_text or ''
-            if not text:
-                continue
-            emb = generate_embedding(text)
-            hadith.embedding = emb if emb is not None else ''
-            session.add(hadith)
-            updated += 1
+        await _upsert_versions(session, pairs, language)
         await session.commit()
-        print(f"{updated} hadisin embeddingi güncellendi.")
-        return updated
+    index = language_indexes.get(language)
+    if language != 'tr' and index is not None and index.loaded:
+        for model in {p[2] for p in pairs}:
+            group = [p for p in pairs if p[2] == model]
+            index.add([p[0] for p in group], [p[1] for p in group], model=model)
+    return len(pairs)
+
+async def _embed_batch(rows, model: Optional[str] = None, language: str = 'tr') -> Tuple[int, int]:
+    """Bir sayfa (id, metin) satırını embed edip (önbellek + tek sağlayıcı isteği) kendi transaction'ında yazar.
+
+    model sunulan modelden farklıysa (yeniden embedding işi) veya dil 'tr' değilse sunulan kopyaya
+    (Hadith sütunları) dokunulmaz.
+    """
+    embedded = await embed_texts_cached([text for _, text in rows], model=model)
+    pairs = [(hadith_id, vec, m) for (hadith_id, _), (vec, m) in zip(rows, embedded) if vec is not None]
+    if language != 'tr' or (model and model != hadith_index.model):
+        updated = await _write_version_embeddings(pairs, language)
+    else:
+        # Birincil anahtara göre toplu UPDATE; her parti ayrı commit edilir
+        updated = await _write_embeddings(pairs)
+    return updated, len(rows) - updated
+
+async def update_hadith_embeddings(
+    batch_size: Optional[int] = None,
+    concurrency: Optional[int] = None,
+    start_after_id: int = 0,
+    on_progress: Optional[Callable[[int, int, int], object]] = None,
+    model: Optional[str] = None,
+    language: str = 'tr',
+) -> int:
+    """Embedding'i olmayan hadisleri id sırasıyla partiler halinde embed eder.
+
+    model verilmezse (veya sunulan modelse) sunulan kopya doldurulur; başka bir model verilirse
+    o modelin hadith_embeddings satırı olmayan hadisler embed edilir (model geçişi).
+    language 'en'/'ar' ise o dildeki metin (english_text/arabic_text) embed edilip hadith_embeddings'e yazılır.
+
+    Satırlar keyset sayfalama (id > son_id) ile okunur; her parti tek sağlayıcı isteği ve
+    tek commit'tir, en fazla `concurrency` parti eşzamanlı çalışır. Başarısız partiler
+    atlanır ve bir sonraki çalıştırmada tekrar denenir.
+
+    on_progress(watermark_id, ok, failed): her parti bittiğinde çağrılır; watermark_id,
+    kendisine kadar tüm partilerin bittiği en büyük id'dir (kaldığı yerden devam için).
+    Geri çağırım coroutine dönerse beklenir (ör. checkpoint'in DB'ye yazılması).
+    Başarıyla güncellenen satır sayısını döner.
+    """
+    batch_size = batch_size or EMBEDDING_BATCH_SIZE
+    serving = await hadith_index.resolve_model()
+    model = model or serving
+    if language == 'tr' and model == serving:
+        pending_clause = ~has_embedding_clause(model)
+    else:
+        pending_clause = missing_version_clause(model, language)
+    text_column = LANGUAGE_TEXT_COLUMNS[language]
+    semaphore = asyncio.Semaphore(concurrency or EMBEDDING_CONCURRENCY)
+    last_id = start_after_id
+    # Oluşturulma sırasıyla partiler: [son_id, bitti_mi]; watermark bitmiş ön ekin son id'si
+    batches: List[list] = []
+    watermark = start_after_id
+    totals = {'ok': 0, 'failed': 0}
+    tasks = []
+
+    async def _done(batch, ok: int, failed: int) -> None:
+        nonlocal watermark
+        batch[1] = True
+        totals['ok'] += ok
+        totals['failed'] += failed
+        while batches and batches[0][1]:
+            watermark = batches.pop(0)[0]
+        if on_progress:
+            result = on_progress(watermark, ok, failed)
+            if inspect.isawaitable(result):
+                await result
+
+    async def _run(rows, batch) -> None:
+        ok, failed = 0, len(rows)
+        try:
+            ok, failed = await _embed_batch(rows, model, language)
+        except Exception as e:
+            print(f"[EMBED] Parti (son id {batch[0]}) başarısız: {e}")
+        finally:
+            semaphore.release()
+            await _done(batch, ok, failed)
+
+    while True:
+        await semaphore.acquire()
+        try:
+            async with AsyncSessionLocal() as session:
+                rows = (await session.execute(
+                    select(Hadith.id, text_column)
+                    .where(pending_clause, Hadith.id > last_id)
+                    # Her dil kendi metin sütunundan embed edilir (tr: turkish_text)
+                    .where(has_text_clause(language))
+                    .order_by(Hadith.id)
+                    .limit(batch_size)
+                )).all()
+        except Exception:
+            semaphore.release()
+            raise
+        if not rows:
+            semaphore.release()
+            break
+        last_id = rows[-1][0]
+        batch = [last_id, False]
+        batches.append(batch)
+        tasks.append(asyncio.create_task(_run([tuple(r) for r in rows], batch)))
+    if tasks:
+        await asyncio.gather(*tasks)
+    print(f"{totals['ok']} hadisin embeddingi güncellendi ({language}, {totals['failed']} başarısız).")
+    return totals['ok']
 
 if __name__ == "__main__":
     asyncio.run(update_hadith_embeddings())
\ No newline at end of file
@@ -0,0 +1,146 @@
+import asyncio
+import os
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+
+from database import AsyncSessionLocal
+from embedding_jobs import EMBEDDING_REEMBED_JOB, embedding_jobs
+from embedding_providers import embedding_providers
+from hadith_index import (
+    EMBEDDING_LANGUAGES, EMBEDDING_SERVING_MODEL_KEY, HadithEmbeddingIndex,
+    hadith_index, has_text_clause, language_indexes,
+)
+from models import Hadith, HadithEmbedding, Setting
+
+# Yeniden embedding işi bitip kapsama %100 olunca yeni modele kendiliğinden geçilir
+EMBEDDING_AUTO_CUTOVER = os.getenv('EMBEDDING_AUTO_CUTOVER', 'true').strip().lower() in {'1', 'true', 'yes'}
+
+
+class EmbeddingVersionManager:
+    """Embedding model sürümleri arasında çevrimiçi geçiş (dual-read).
+
+    Sorgular sunulan (serving) modelin indeksinden cevaplanırken yeni modelin embedding'leri
+    hadith_embeddings tablosuna arka plan işiyle doldurulur. Kapsama %100 olunca tek bir
+    transaction'da sunulan kopya (Hadith sütunları) ve settings'teki model değiştirilir,
+    bellekteki indeks yeni modelin indeksiyle tek atamada yer değiştirir.
+    """
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+
+    def target_model(self) -> Optional[str]:
+        """Yapılandırılmış (EMBEDDING_PROVIDER / *_EMBEDDING_MODEL) model; sunulandan farklıysa geçiş hedefidir."""
+        return embedding_providers.active_model()
+
+    async def coverage(self, model: str, language: str = 'tr') -> Dict:
+        """Verilen dilde metni olan hadislerden kaçının o model için embedding'i olduğu."""
+        async with AsyncSessionLocal() as session:
+            total = (await session.execute(
+                select(func.count(Hadith.id)).where(has_text_clause(language))
+            )).scalar_one()
+            embedded = (await session.execute(
+                select(func.count(HadithEmbedding.hadith_id))
+                .join(Hadith, Hadith.id == HadithEmbedding.hadith_id)
+                .where(HadithEmbedding.model == model, HadithEmbedding.language == language, has_text_clause(language))
+            )).scalar_one()
+        return {
+            'model': model,
+            'language': language,
+            'total': total,
+            'embedded': embedded,
+            'missing': max(total - embedded, 0),
+            'coverage': round(embedded / total, 4) if total else 1.0,
+        }
+
+    async def coverage_all(self, model: str) -> Dict[str, Dict]:
+        """EMBEDDING_LANGUAGES'taki her dil için kapsama; geçiş hepsi tamamlanınca yapılır."""
+        return {language: await self.coverage(model, language) for language in EMBEDDING_LANGUAGES}
+
+    async def status(self) -> Dict:
+        serving = await hadith_index.resolve_model()
+        target = self.target_model()
+        async with AsyncSessionLocal() as session:
+            per_model = (await session.execute(
+                select(
+                    HadithEmbedding.model, HadithEmbedding.language, HadithEmbedding.dim,
+                    func.count(HadithEmbedding.hadith_id),
+                )
+                .group_by(HadithEmbedding.model, HadithEmbedding.language, HadithEmbedding.dim)
+            )).all()
+        return {
+            'serving_model': serving,
+            'target_model': target,
+            'languages': EMBEDDING_LANGUAGES,
+            'migration_needed': bool(target and serving and target != serving),
+            'versions': [{'model': m, 'language': lang, 'dim': d, 'rows': c} for m, lang, d, c in per_model],
+            'serving_coverage': await self.coverage_all(serving) if serving else None,
+            'target_coverage': await self.coverage_all(target) if target and target != serving else None,
+        }
+
+    async def start_reembed(self, model: Optional[str] = None) -> List:
+        """Yeni model için her dilde yeniden embedding işini kuyruğa alır (sunulan model değişmez)."""
+        model = model or self.target_model()
+        serving = await hadith_index.resolve_model()
+        if not model or model == serving:
+            raise ValueError("Hedef model sunulan modelle aynı")
+        return await embedding_jobs.enqueue_languages(EMBEDDING_REEMBED_JOB, model=model)
+
+    async def maybe_cutover(self, model: str) -> bool:
+        if not EMBEDDING_AUTO_CUTOVER:
+            return False
+        # Her dilin işi bittiğinde çağrılır; son biten dil geçişi tetikler
+        if any(c['missing'] for c in (await self.coverage_all(model)).values()):
+            print(f"[EMBED] {model} kapsaması eksik; otomatik geçiş yapılmadı")
+            return False
+        await self.cutover(model)
+        return True
+
+    async def _promote_serving_copy(self, session, model: str) -> None:
+        """Sunulan kopyayı (Hadith sütunları) modelin Türkçe satırlarıyla değiştirir ve settings'e yazar; commit çağırana aittir."""
+        # hadith_embeddings'te hadis başına dil satırları var; sunulan kopya yalnızca 'tr' satırından alınır
+        await session.execute(text(
+            "UPDATE hadiths AS h SET embedding_vec = e.embedding_vec, embedding_dim = e.dim, "
+            "embedding_model = e.model, embedding = NULL "
+            "FROM hadith_embeddings AS e WHERE e.hadith_id = h.id AND e.model = :model AND e.language = 'tr'"
+        ), {'model': model})
+        # Yeni modelde karşılığı olmayan eski vektörler sunulmaz; backfill bunları doldurur
+        await session.execute(
+            update(Hadith)
+            .where(Hadith.embedding_model.is_distinct_from(model))
+            .where((Hadith.embedding_vec != None) | (Hadith.embedding != None))
+            .values(embedding_vec=None, embedding_dim=None, embedding_model=None, embedding=None)
+        )
+        stmt = insert(Setting).values(key=EMBEDDING_SERVING_MODEL_KEY, value=model)
+        await session.execute(stmt.on_conflict_do_update(index_elements=[Setting.key], set_={'value': model}))
+
+    async def cutover(self, model: str, force: bool = False) -> Dict:
+        """Sunulan modeli atomik olarak değiştirir; kapsama eksikse force olmadan reddedilir."""
+        async with self._lock:
+            coverage = await self.coverage_all(model)
+            missing = sum(c['missing'] for c in coverage.values())
+            if missing and not force:
+                raise ValueError(f"{model} kapsaması eksik: {missing} hadis/dil")
+            previous = await hadith_index.resolve_model()
+            # Yeni indeks geçişten önce kurulur; geçiş anında yalnızca durum ataması yapılır
+            new_index = HadithEmbeddingIndex(
+                engine=hadith_index.engine, quantization=hadith_index.quantization, model=model, source='versions',
+            )
+            await new_index.load()
+            async with AsyncSessionLocal() as session:
+                await self._promote_serving_copy(session, model)
+                await session.commit()
+            hadith_index.adopt(new_index)
+            # Diğer dillerin indeksleri settings'teki yeni modelin satırlarıyla yeniden kurulur
+            for language, index in language_indexes.items():
+                if index is not hadith_index and index.loaded:
+                    await index.load()
+            print(f"[EMBED] Sunulan embedding modeli değişti: {previous} → {model} ({len(hadith_index)} satır)")
+        # Diğer worker'lar yeni snapshot'ı (CURRENT) görünce settings'ten yeni modeli okuyup yeniden yükler
+        asyncio.create_task(hadith_index.rebuild_snapshot())
+        return {'previous_model': previous, 'serving_model': model, 'rows': len(hadith_index), 'coverage': coverage}
+
+
+# Global instance
+embedding_versions = EmbeddingVersionManager()
@@ -0,0 +1,84 @@
+import os
+import time
+import weakref
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from database import AsyncSessionLocal
+from models import Setting
+
+# Hadis verisi her import'ta değişen sürüm anahtarı (settings tablosu)
+HADITH_DATA_VERSION_KEY = 'hadith_data_version'
+# Bellek içi indekslerin (filtre kümeleri, BM25) başka worker'daki import'ları kontrol aralığı (saniye)
+HADITH_DATA_VERSION_CHECK_SECONDS = float(os.getenv('HADITH_DATA_VERSION_CHECK_SECONDS') or 30)
+
+# Bu süreçteki izleyiciler: sürüm burada artırılınca beklemeden bayat sayılırlar
+_trackers: 'weakref.WeakSet[HadithDataVersionTracker]' = weakref.WeakSet()
+
+
+async def read_hadith_data_version() -> Optional[str]:
+    async with AsyncSessionLocal() as session:
+        return (await session.execute(
+            select(Setting.value).where(Setting.key == HADITH_DATA_VERSION_KEY)
+        )).scalar()
+
+
+async def bump_hadith_data_version() -> str:
+    """Hadisler değişti: yeni sürümü yazar; bu süreçteki izleyiciler hemen, diğer worker'lar kontrol aralığında görür."""
+    for tracker in list(_trackers):
+        tracker.stale = True
+    version = datetime.utcnow().isoformat()
+    async with AsyncSessionLocal() as session:
+        stmt = insert(Setting).values(key=HADITH_DATA_VERSION_KEY, value=version)
+        await session.execute(stmt.on_conflict_do_update(index_elements=[Setting.key], set_={'value': version}))
+        await session.commit()
+    return version
+
+
+class HadithDataVersionTracker:
+    """Bellek içi bir yapının hangi hadis veri sürümüyle kurulduğunu izler.
+
+    Yükleme başında begin_load ile sürüm okunur, yükleme başarıyla bitince loaded ile kaydedilir;
+    is_stale en fazla check_seconds'ta bir DB'deki sürümü okur ve farklıysa (başka worker'da veya
+    komut satırından import) True döner. Başarısız yükleme sürümü değiştirmez, sonraki kontrolde yeniden denenir.
+    """
+
+    def __init__(self, name: str, check_seconds: float = HADITH_DATA_VERSION_CHECK_SECONDS):
+        self.name = name
+        self.check_seconds = check_seconds
+        self.version: Optional[str] = None
+        self.stale = False
+        self._last_check = 0.0
+        _trackers.add(self)
+
+    async def begin_load(self) -> Optional[str]:
+        # Sürüm satırlardan önce okunur; yükleme sürerken gelen import sonraki kontrolde yakalanır
+        self.stale = False
+        self._last_check = time.monotonic()
+        try:
+            return await read_hadith_data_version()
+        except Exception as e:
+            print(f"[{self.name}] Hadis veri sürümü okunamadı: {e}")
+            return self.version
+
+    def loaded(self, version: Optional[str]) -> None:
+        self.version = version
+
+    async def is_stale(self) -> bool:
+        if self.stale:
+            return True
+        now = time.monotonic()
+        if now - self._last_check < self.check_seconds:
+            return False
+        self._last_check = now
+        try:
+            version = await read_hadith_data_version()
+        except Exception as e:
+            print(f"[{self.name}] Hadis veri sürümü okunamadı: {e}")
+            return False
+        if version != self.version:
+            self.stale = True
+        return self.stale
@@ -0,0 +1,196 @@
+import asyncio
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import and_, func, or_, select
+
+from database import AsyncSessionLocal
+from hadith_data_version import HadithDataVersionTracker
+from models import Hadith
+
+# Filtrelenebilir hadis alanları
+FILTER_FIELDS = ('source', 'category', 'language', 'authenticity')
+# Dil filtresinde satırın language sütunu dışında bu metin alanları doluysa o dilde de sayılır
+LANGUAGE_TEXT_FIELDS = {'tr': 'turkish_text', 'en': 'english_text', 'ar': 'arabic_text'}
+# AskRequest.source_filter'ın kaynak adı olmayan genel değerleri
+GENERIC_SOURCE_FILTERS = {'', 'all', 'hadis', 'hadith', 'quran', 'kuran'}
+_LOAD_CHUNK_SIZE = 5000
+_CACHE_MAX = 256
+
+
+def normalize_filter_value(value) -> str:
+    return str(value or '').strip().casefold()
+
+
+def parse_filters(**values) -> Dict[str, List[str]]:
+    """Virgülle ayrılmış filtre değerlerini {alan: [normalize değerler]} sözlüğüne çevirir.
+
+    Örn. parse_filters(source="Buhari,Müslim", language="tr"); boş değerler atlanır.
+    """
+    filters: Dict[str, List[str]] = {}
+    for field in FILTER_FIELDS:
+        raw = values.get(field)
+        if raw is None:
+            continue
+        items = raw if isinstance(raw, (list, tuple)) else str(raw).split(',')
+        normalized = sorted({normalize_filter_value(v) for v in items} - {''})
+        if normalized:
+            filters[field] = normalized
+    return filters
+
+
+def filter_clauses(filters: Optional[Dict[str, List[str]]]) -> list:
+    """Aynı filtrelerin SQL karşılığı (FTS ve ILIKE motorları için WHERE koşulları)."""
+    clauses = []
+    for field, values in (filters or {}).items():
+        matches = [func.lower(getattr(Hadith, field)).in_(values)]
+        if field == 'language':
+            for lang in values:
+                text_field = LANGUAGE_TEXT_FIELDS.get(lang)
+                if text_field:
+                    col = getattr(Hadith, text_field)
+                    matches.append(and_(col != None, col != ''))
+        clauses.append(or_(*matches))
+    return clauses
+
+
+class HadithAttributeIndex:
+    """Kaynak, kategori, dil ve sahihlik değerleri için sıralı hadis id kümeleri.
+
+    Filtreli aramada izin verilen id'ler skorlamadan önce bu kümelerin kesişimiyle
+    bulunur; böylece vektör/BM25 motorları yalnızca alt kümeyi tarar. Hadis veri sürümü
+    değişince (herhangi bir worker'da import) kümeler arka planda yeniden yüklenir.
+    """
+
+    def __init__(self):
+        self._sets: Dict[str, Dict[str, np.ndarray]] = {f: {} for f in FILTER_FIELDS}
+        self._cache: Dict[tuple, np.ndarray] = {}
+        self.loaded = False
+        self.reloads = 0
+        self.data_version = HadithDataVersionTracker('FILTER')
+        self._load_lock = asyncio.Lock()
+        self._reload_task: Optional[asyncio.Task] = None
+
+    async def ensure_loaded(self) -> None:
+        if self.loaded:
+            await self.maybe_reload()
+            return
+        async with self._load_lock:
+            if not self.loaded:
+                await self._load()
+
+    async def load(self) -> None:
+        async with self._load_lock:
+            await self._load()
+
+    async def maybe_reload(self) -> bool:
+        """Veri sürümü değiştiyse kümeleri arka planda yeniden yükler; bu sırada eski kümeler sunulur."""
+        if self._load_lock.locked() or not await self.data_version.is_stale():
+            return False
+        if self._reload_task is None or self._reload_task.done():
+            self.reloads += 1
+            self._reload_task = asyncio.create_task(self.load())
+        return True
+
+    async def _load(self) -> None:
+        started = time.perf_counter()
+        version = await self.data_version.begin_load()
+        rows = await self._fetch_rows()
+        await asyncio.to_thread(self.build, rows)
+        self.data_version.loaded(version)
+        print(f"[FILTER] Hadis filtre kümeleri yüklendi: {len(rows)} satır, {time.perf_counter() - started:.2f}s")
+
+    async def _fetch_rows(self) -> List:
+        has_text = [
+            and_(getattr(Hadith, col) != None, getattr(Hadith, col) != '').label(lang)
+            for lang, col in LANGUAGE_TEXT_FIELDS.items()
+        ]
+        rows = []
+        async with AsyncSessionLocal() as session:
+            stmt = select(Hadith.id, *[getattr(Hadith, f) for f in FILTER_FIELDS], *has_text)
+            result = await session.stream(stmt.execution_options(yield_per=_LOAD_CHUNK_SIZE))
+            async for row in result:
+                rows.append(self._row_values(row[0], dict(zip(FILTER_FIELDS, row[1:5])), dict(zip(LANGUAGE_TEXT_FIELDS, row[5:]))))
+        return rows
+
+    @staticmethod
+    def _row_values(hadith_id: int, attrs: Dict, has_text: Dict[str, bool]):
+        values = {f: {normalize_filter_value(attrs.get(f))} - {''} for f in FILTER_FIELDS}
+        values['language'] |= {lang for lang, present in has_text.items() if present}
+        return hadith_id, values
+
+    def build(self, rows: Iterable) -> None:
+        """(id, {alan: {değerler}}) satırlarından kümeleri baştan kurar."""
+        members: Dict[str, Dict[str, List[int]]] = {f: {} for f in FILTER_FIELDS}
+        for hadith_id, values in rows:
+            for field, vals in values.items():
+                for v in vals:
+                    members[field].setdefault(v, []).append(hadith_id)
+        self._sets = {
+            field: {v: np.unique(np.asarray(ids, dtype=np.int64)) for v, ids in by_value.items()}
+            for field, by_value in members.items()
+        }
+        self._cache = {}
+        self.loaded = True
+
+    def add_hadiths(self, hadiths: Iterable) -> int:
+        """Yeni yüklenen Hadith nesnelerini kümelere ekler (yüklü değilse atlanır)."""
+        if not self.loaded:
+            return 0
+        added = 0
+        for h in hadiths:
+            if getattr(h, 'id', None) is None:
+                continue
+            has_text = {lang: bool(getattr(h, col, None)) for lang, col in LANGUAGE_TEXT_FIELDS.items()}
+            _, values = self._row_values(h.id, {f: getattr(h, f, None) for f in FILTER_FIELDS}, has_text)
+            for field, vals in values.items():
+                for v in vals:
+                    current = self._sets[field].get(v)
+                    self._sets[field][v] = np.union1d(current, [h.id]) if current is not None else np.asarray([h.id], dtype=np.int64)
+            added += 1
+        if added:
+            self._cache = {}
+        return added
+
+    def allowed_ids(self, filters: Optional[Dict[str, List[str]]]) -> Optional[np.ndarray]:
+        """Filtrelere uyan sıralı id dizisi; filtre yoksa None (tüm korpus).
+
+        Bir alandaki değerler birleşim (VEYA), farklı alanlar kesişim (VE) ile uygulanır.
+        """
+        if not filters:
+            return None
+        key = tuple((f, tuple(v)) for f, v in sorted(filters.items()))
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        result = None
+        # En küçük kümeden başlamak kesişimi ucuzlatır
+        per_field = []
+        for field, values in filters.items():
+            arrays = [self._sets.get(field, {}).get(v) for v in values]
+            arrays = [a for a in arrays if a is not None]
+            per_field.append(np.unique(np.concatenate(arrays)) if arrays else np.empty(0, dtype=np.int64))
+        for ids in sorted(per_field, key=len):
+            result = ids if result is None else np.intersect1d(result, ids, assume_unique=True)
+            if not result.shape[0]:
+                break
+        if len(self._cache) >= _CACHE_MAX:
+            self._cache = {}
+        self._cache[key] = result
+        return result
+
+    def values(self, field: str) -> Dict[str, int]:
+        """Bir alanın değerlerini ve her birindeki hadis sayısını döner."""
+        return {v: int(ids.shape[0]) for v, ids in sorted(self._sets.get(field, {}).items())}
+
+    def stats(self) -> Dict:
+        return {
+            **{field: len(by_value) for field, by_value in self._sets.items()},
+            'data_version': self.data_version.version,
+            'reloads': self.reloads,
+        }
+
+
+# Global instance
+hadith_filters = HadithAttributeIndex()
@@ -0,0 +1,54 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bm25_index import preprocess
+from hadith_filters import filter_clauses
+from models import Hadith
+
+# search_vector sütunundaki alanlarla aynı yapılandırmalar: Türkçe kök bulma + dil bağımsız + İngilizce
+_TS_CONFIGS = ('turkish', 'simple', 'english')
+# to_tsquery sözdizimini bozabilecek karakterler (& | ! : * ( ) < >) terimden atılır
+_NON_WORD_RE = re.compile(r"[^\w]+")
+# Kısa kelimelerde (ve, ile...) önek eşleşmesi gürültü üretir
+_PREFIX_MIN_LEN = 4
+
+
+def build_tsquery_text(query: str) -> str:
+    """Sorgu kelimelerini önek eşleşmeli VEYA sorgusuna çevirir: 'oruç | misvak:*'."""
+    terms = []
+    for token in preprocess(query):
+        token = _NON_WORD_RE.sub("", token)
+        if token:
+            terms.append(f"{token}:*" if len(token) >= _PREFIX_MIN_LEN else token)
+    return " | ".join(terms)
+
+
+def hadith_tsquery(tsquery_text: str):
+    """Her metin yapılandırması için tsquery üretip VEYA ile birleştirir."""
+    combined = None
+    for config in _TS_CONFIGS:
+        part = func.to_tsquery(literal_column(f"'{config}'::regconfig"), tsquery_text)
+        combined = part if combined is None else combined.op('||')(part)
+    return combined
+
+
+async def fts_search(
+    session: AsyncSession, query: str, top_k: int = 3, filters: Optional[Dict[str, List[str]]] = None,
+) -> Tuple[List[int], List[float]]:
+    """GIN indeksli search_vector üzerinde arar; ts_rank_cd'ye göre (ids, skorlar) döner."""
+    tsquery_text = build_tsquery_text(query)
+    if not tsquery_text:
+        return [], []
+    tsquery = hadith_tsquery(tsquery_text)
+    rank = func.ts_rank_cd(Hadith.search_vector, tsquery).label('rank')
+    result = await session.execute(
+        select(Hadith.id, rank)
+        .where(Hadith.search_vector.op('@@')(tsquery), *filter_clauses(filters))
+        .order_by(rank.desc())
+        .limit(top_k)
+    )
+    rows = result.all()
+    return [r[0] for r in rows], [float(r[1]) for r in rows]
@@ -0,0 +1,687 @@
+import asyncio
+import os
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import exists, func, null, select
+
+import embedding_snapshot
+from ann_index import HADITH_ANN_ENGINE, build_ann, recall_report, top_k_positions
+from quantization import (
+    HADITH_INDEX_QUANTIZATION, HADITH_QUANT_RERANK, QUANTIZERS,
+    build_quantizer, merge_rows, quantization_report, rerank,
+)
+from database import AsyncSessionLocal
+from models import Hadith, HadithEmbedding, Setting
+
+# Başlangıçta DB'den okunurken her turda çekilecek satır sayısı
+_LOAD_CHUNK_SIZE = 1000
+# Sonradan eklenen (delta) vektörler bu sayıyı aşınca arka planda birleştirilir (sunulan kopyada yeni snapshot yazılır)
+HADITH_INDEX_DELTA_MAX = int(os.getenv('HADITH_INDEX_DELTA_MAX') or 50000)
+# Diğer worker'ların yazdığı yeni snapshot'ı kontrol etme aralığı (saniye)
+EMBEDDING_SNAPSHOT_CHECK_SECONDS = float(os.getenv('EMBEDDING_SNAPSHOT_CHECK_SECONDS') or 30)
+
+# Sunulan (serving) embedding modelinin settings tablosundaki anahtarı
+EMBEDDING_SERVING_MODEL_KEY = 'embedding_serving_model'
+
+# Embedding'i tutulan metin dilleri; 'tr' sunulan kopyadır (Hadith sütunları), diğerleri hadith_embeddings'te
+EMBEDDING_LANGUAGES = [
+    lang.strip().lower() for lang in (os.getenv('EMBEDDING_LANGUAGES') or 'tr,en,ar').split(',') if lang.strip()
+]
+if 'tr' not in EMBEDDING_LANGUAGES:
+    EMBEDDING_LANGUAGES.insert(0, 'tr')
+LANGUAGE_TEXT_COLUMNS = {
+    'tr': Hadith.turkish_text,
+    'en': Hadith.english_text,
+    'ar': Hadith.arabic_text,
+}
+EMBEDDING_LANGUAGES = [lang for lang in EMBEDDING_LANGUAGES if lang in LANGUAGE_TEXT_COLUMNS]
+
+# Binary embedding formatı: little-endian float32 ham baytlar
+EMBEDDING_DTYPE = np.dtype('<f4')
+
+
+def encode_embedding(vec) -> Optional[bytes]:
+    """Vektörü Hadith.embedding_vec sütunu için float32 ham bayta çevirir."""
+    arr = parse_embedding(vec)
+    if arr is None:
+        return None
+    return arr.astype(EMBEDDING_DTYPE, copy=False).tobytes()
+
+
+def decode_embedding(blob, dim: Optional[int] = None) -> Optional[np.ndarray]:
+    """Binary embedding'i kopyalamadan (np.frombuffer) salt-okunur float32 vektöre çevirir."""
+    if not blob:
+        return None
+    if len(blob) % EMBEDDING_DTYPE.itemsize:
+        return None
+    vec = np.frombuffer(blob, dtype=EMBEDDING_DTYPE)
+    if dim and vec.shape[0] != dim:
+        return None
+    return vec
+
+
+def read_hadith_embedding(blob, dim: Optional[int], text_value) -> Optional[np.ndarray]:
+    """Önce binary sütunu, yoksa eski virgüllü metin formatını okur."""
+    vec = decode_embedding(blob, dim)
+    if vec is None and text_value:
+        vec = parse_embedding(text_value)
+    return vec
+
+
+def parse_embedding(value) -> Optional[np.ndarray]:
+    """Virgülle ayrılmış metin, liste veya dizi halindeki embedding'i float32 vektöre çevirir.
+
+    Geçersiz/boş değerlerde None döner.
+    """
+    if value is None:
+        return None
+    try:
+        if isinstance(value, np.ndarray):
+            vec = value.astype(np.float32, copy=False)
+        elif isinstance(value, str):
+            parts = [x for x in value.split(',') if x.strip()]
+            if not parts:
+                return None
+            vec = np.array(parts, dtype=np.float32)
+        else:
+            vec = np.asarray(value, dtype=np.float32)
+    except (TypeError, ValueError):
+        return None
+    if vec.ndim != 1 or vec.size == 0:
+        return None
+    return vec
+
+
+def has_embedding_clause(model: Optional[str] = None):
+    """Binary veya eski metin formatında embedding'i olan satırlar için WHERE koşulu.
+
+    model verilirse yalnızca o modelin (veya modeli kaydedilmemiş eski satırların) embedding'leri sayılır.
+    """
+    clause = (Hadith.embedding_vec != None) | ((Hadith.embedding != None) & (Hadith.embedding != ""))
+    if model:
+        clause = clause & ((Hadith.embedding_model == model) | (Hadith.embedding_model == None))
+    return clause
+
+
+def missing_version_clause(model: str, language: str = 'tr'):
+    """hadith_embeddings tablosunda verilen model ve dil için embedding'i olmayan hadisler."""
+    return ~exists().where(
+        HadithEmbedding.hadith_id == Hadith.id, HadithEmbedding.model == model, HadithEmbedding.language == language,
+    )
+
+
+def has_text_clause(language: str = 'tr'):
+    """Verilen dildeki metni dolu hadisler (embedding'e aday satırlar)."""
+    column = LANGUAGE_TEXT_COLUMNS[language]
+    return (column != None) & (column != '')
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Satırları L2 normuna böler; sıfır normlu satırlar sıfır kalır."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+class _IndexState(NamedTuple):
+    ids: np.ndarray                 # Ana segment id'leri (snapshot'tan geliyorsa mmap)
+    matrix: np.ndarray              # Ana segment normalize vektörleri (snapshot'tan geliyorsa mmap)
+    ann: object                     # Ana segment üzerinde ANN motoru (yoksa None)
+    quant: object                   # Ana segmentin nicemli kodları (yoksa None)
+    delta_ids: np.ndarray           # Sonradan eklenen/güncellenen id'ler (bellekte)
+    delta_matrix: np.ndarray        # Sonradan eklenen normalize vektörler (bellekte)
+    shadowed: int                   # Ana segmentte olup delta'da güncellenen id sayısı
+    snapshot_version: Optional[str]
+
+
+def _empty_state(dim: int = 0, snapshot_version: Optional[str] = None) -> _IndexState:
+    return _IndexState(
+        np.empty(0, dtype=np.int64),
+        np.empty((0, dim), dtype=np.float32),
+        None,
+        None,
+        np.empty(0, dtype=np.int64),
+        np.empty((0, dim), dtype=np.float32),
+        0,
+        snapshot_version,
+    )
+
+
+class HadithEmbeddingIndex:
+    """Hadis embedding'leri için bellekte tutulan yoğun (dense) indeks.
+
+    L2-normalize edilmiş float32 matris ve buna paralel id dizisi tutar;
+    arama tek bir matris-vektör çarpımı ve argpartition ile top-k seçimidir.
+    HADITH_ANN_ENGINE='ivf' ise büyük korpuslarda IVF-flat motoru üzerinden aranır.
+
+    Ana segment diskteki snapshot'tan salt-okunur mmap ile açılabilir; böylece tüm
+    worker'lar aynı page-cache kopyasını paylaşır. Sonradan eklenen vektörler küçük
+    bir bellek içi delta segmentinde tutulur ve aramada ana segmentle birleştirilir.
+
+    HADITH_INDEX_QUANTIZATION='int8' veya 'pq' ise ana segment nicemli kodlarla taranır;
+    tam hassasiyetli vektörler yalnızca en iyi adayları yeniden skorlamak için okunur.
+    """
+
+    def __init__(
+        self,
+        engine: str = HADITH_ANN_ENGINE,
+        snapshot_dir: Optional[str] = None,
+        quantization: str = HADITH_INDEX_QUANTIZATION,
+        model: Optional[str] = None,
+        source: str = 'hadiths',
+        language: str = 'tr',
+    ):
+        self.engine = engine
+        # model verilmezse settings'teki sunulan model, o da yoksa etkin sağlayıcının modeli kullanılır
+        self._model = model
+        self._serving_model: Optional[str] = None
+        # 'hadiths': sunulan kopya (Hadith sütunları, snapshot'lı); 'versions': hadith_embeddings tablosu
+        self.source = source
+        # Hangi dildeki metnin embedding'leri ('versions' kaynağında diller ayrı indekslenir)
+        self.language = language
+        self.quantization = quantization
+        self.snapshot_dir = snapshot_dir or embedding_snapshot.EMBEDDING_SNAPSHOT_DIR
+        # Durum tek atamayla değiştirilir; aramalar tutarlı bir görüntü okur
+        self._state = _empty_state()
+        self.loaded = False
+        self._load_lock = asyncio.Lock()
+        self._last_snapshot_check = 0.0
+        # Filtreli aramada id → pozisyon çevirisi için ana segmentin sıralı id'leri (tembel kurulur)
+        self._sorted_base = None
+        self._compact_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        st = self._state
+        return int(st.ids.shape[0] + st.delta_ids.shape[0] - st.shadowed)
+
+    @property
+    def dim(self) -> int:
+        st = self._state
+        if st.ids.shape[0]:
+            return int(st.matrix.shape[1])
+        return int(st.delta_matrix.shape[1]) if st.delta_ids.shape[0] else 0
+
+    @property
+    def model(self) -> Optional[str]:
+        """İndekslenen embedding modeli; farklı modelin vektörleri indekse alınmaz."""
+        if self._model:
+            return self._model
+        if self._serving_model:
+            return self._serving_model
+        # Henüz settings okunmadıysa etkin sağlayıcının modeli (embedding_providers bu modülü import eder)
+        from embedding_providers import embedding_providers
+        return embedding_providers.active_model()
+
+    async def resolve_model(self) -> Optional[str]:
+        """Sunulan modeli settings tablosundan okur (model geçişinden sonra diğer worker'lar da görür)."""
+        if self._model:
+            return self._model
+        try:
+            async with AsyncSessionLocal() as session:
+                value = (await session.execute(
+                    select(Setting.value).where(Setting.key == EMBEDDING_SERVING_MODEL_KEY)
+                )).scalar()
+            self._serving_model = value or None
+        except Exception as e:
+            print(f"[INDEX] Sunulan embedding modeli okunamadı: {e}")
+        return self.model
+
+    def adopt(self, other: 'HadithEmbeddingIndex') -> None:
+        """Başka bir indeksin durumunu ve modelini tek atamayla devralır (model geçişi)."""
+        self._serving_model = other.model
+        self._state = other._state
+        self._sorted_base = None
+        self.loaded = True
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self.export()[0]
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self.export()[1]
+
+    @property
+    def ann(self):
+        return self._state.ann
+
+    @property
+    def quant(self):
+        return self._state.quant
+
+    @property
+    def snapshot_version(self) -> Optional[str]:
+        return self._state.snapshot_version
+
+    def build(self, ids: Sequence[int], vectors: Sequence[np.ndarray]) -> int:
+        """Verilen id/vektör listesiyle indeksi baştan kurar. Eklenen satır sayısını döner."""
+        ids_arr, matrix = self._stack(ids, vectors)
+        self.set_base(ids_arr, matrix)
+        return len(self)
+
+    def set_base(self, ids: np.ndarray, matrix: np.ndarray, snapshot_version: Optional[str] = None, ivf=None, quant=None) -> None:
+        """Normalize edilmiş (ids, matrix) çiftini ana segment yapar; delta boşaltılır.
+
+        ivf / quant: snapshot'tan gelen kayıtlı ANN atamaları ve nicemli kodlar (varsa).
+        """
+        state = _empty_state(int(matrix.shape[1]) if matrix.ndim == 2 else 0, snapshot_version)
+        self._state = state._replace(
+            ids=ids,
+            matrix=matrix,
+            ann=build_ann(matrix, self.engine, ivf=ivf),
+            quant=build_quantizer(matrix, self.quantization, arrays=quant),
+        )
+        self.loaded = True
+
+    def _stack(self, ids: Sequence[int], vectors: Sequence[np.ndarray], dim: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        if not dim:
+            # Farklı boyutlar karışmışsa en yaygın boyut esas alınır
+            dims: Dict[int, int] = {}
+            for v in vectors:
+                dims[v.shape[0]] = dims.get(v.shape[0], 0) + 1
+            dim = max(dims, key=dims.get) if dims else 0
+        keep = [i for i, v in enumerate(vectors) if v.shape[0] == dim]
+        skipped = len(vectors) - len(keep)
+        if skipped:
+            print(f"[INDEX] {skipped} embedding boyut uyuşmazlığı nedeniyle atlandı (beklenen {dim})")
+        if not keep:
+            return np.empty(0, dtype=np.int64), np.empty((0, dim), dtype=np.float32)
+        ids_arr = np.asarray([ids[i] for i in keep], dtype=np.int64)
+        matrix = normalize_rows(np.vstack([vectors[i] for i in keep]).astype(np.float32, copy=False))
+        return ids_arr, matrix
+
+    async def load(self) -> int:
+        """İndeksi snapshot (varsa) + DB farkından, yoksa tamamen DB'den kurar."""
+        async with self._load_lock:
+            return await self._load()
+
+    async def ensure_loaded(self) -> None:
+        if self.loaded:
+            await self.maybe_refresh_snapshot()
+            return
+        async with self._load_lock:
+            if not self.loaded:
+                await self._load()
+
+    async def _load(self) -> int:
+        started = time.perf_counter()
+        await self.resolve_model()
+        if self.source == 'versions':
+            # Dil indeksleri ve geçişte kurulan yeni model indeksi; snapshot yalnızca sunulan kopya için tutulur
+            ids_list, vectors = await self._fetch_vectors()
+            if ids_list:
+                await asyncio.to_thread(self.build, ids_list, vectors)
+            else:
+                self._state = _empty_state()
+                self.loaded = True
+            self._last_snapshot_check = time.monotonic()
+            print(f"[INDEX] {self.model} ({self.language}) sürüm indeksi yüklendi: {len(self)} satır, boyut={self.dim}, {time.perf_counter() - started:.2f}s")
+            return len(self)
+        snap = await asyncio.to_thread(embedding_snapshot.open_snapshot, None, self.snapshot_dir)
+        if snap is None and self.quantization in QUANTIZERS:
+            # Nicemli modda tam hassasiyetli vektörler heap yerine diskte (mmap) tutulur
+            await self._write_snapshot()
+            snap = await asyncio.to_thread(embedding_snapshot.open_snapshot, None, self.snapshot_dir)
+        if snap is not None:
+            manifest, ids, matrix, ivf, quant = snap
+            if self.model and manifest.get('model') not in (None, self.model):
+                # Başka modelle yazılmış snapshot bu indekste kullanılamaz
+                print(f"[INDEX] Snapshot modeli ({manifest.get('model')}) etkin modelden ({self.model}) farklı; yeniden yazılıyor")
+                await self._write_snapshot()
+                snap = await asyncio.to_thread(embedding_snapshot.open_snapshot, None, self.snapshot_dir)
+                manifest, ids, matrix, ivf, quant = snap
+        if snap is not None:
+            if manifest.get('quantization') != self.quantization:
+                quant = None
+            await asyncio.to_thread(self.set_base, ids, matrix, manifest['version'], ivf, quant)
+            added = await self._load_missing_from_db(manifest)
+            source = f"snapshot {manifest['version']} (+{added} DB)"
+        else:
+            ids_list, vectors = await self._fetch_vectors()
+            # ANN eğitimi CPU yoğun olabilir; event loop'u bloklamamak için thread'de kurulur
+            await asyncio.to_thread(self.build, ids_list, vectors)
+            source = "DB"
+        self._last_snapshot_check = time.monotonic()
+        print(f"[INDEX] Hadis embedding indeksi yüklendi ({source}): {len(self)} satır, boyut={self.dim}, {time.perf_counter() - started:.2f}s")
+        return len(self)
+
+    async def _fetch_vectors(self, id_filter=None) -> Tuple[List[int], List[np.ndarray]]:
+        ids: List[int] = []
+        vectors: List[np.ndarray] = []
+        async with AsyncSessionLocal() as session:
+            if self.source == 'versions':
+                stmt = select(
+                    HadithEmbedding.hadith_id, HadithEmbedding.embedding_vec, HadithEmbedding.dim, null(),
+                ).where(HadithEmbedding.model == self.model, HadithEmbedding.language == self.language)
+            else:
+                stmt = select(Hadith.id, Hadith.embedding_vec, Hadith.embedding_dim, Hadith.embedding).where(has_embedding_clause(self.model))
+            if id_filter is not None:
+                stmt = stmt.where(id_filter)
+            result = await session.stream(stmt.execution_options(yield_per=_LOAD_CHUNK_SIZE))
+            async for hadith_id, blob, dim, emb in result:
+                vec = read_hadith_embedding(blob, dim, emb)
+                if vec is None:
+                    continue
+                ids.append(hadith_id)
+                vectors.append(vec)
+        return ids, vectors
+
+    async def _load_missing_from_db(self, manifest: Dict) -> int:
+        """Snapshot'tan sonra embedding'i oluşan satırları DB'den delta segmente yükler."""
+        async with AsyncSessionLocal() as session:
+            count, max_id = (await session.execute(
+                select(func.count(Hadith.id), func.max(Hadith.id)).where(has_embedding_clause(self.model))
+            )).one()
+            if count == manifest['row_count'] and (max_id or 0) == manifest['max_hadith_id']:
+                return 0
+            # Sayılar uyuşmuyorsa yalnızca id listesi çekilip snapshot ile farkı bulunur
+            db_ids = np.fromiter(
+                (await session.execute(select(Hadith.id).where(has_embedding_clause(self.model)))).scalars(),
+                dtype=np.int64,
+            )
+        missing = np.setdiff1d(db_ids, self._state.ids, assume_unique=True)
+        added = 0
+        for start in range(0, missing.shape[0], _LOAD_CHUNK_SIZE):
+            chunk = missing[start:start + _LOAD_CHUNK_SIZE].tolist()
+            ids, vectors = await self._fetch_vectors(Hadith.id.in_(chunk))
+            added += self.add(ids, vectors)
+        return added
+
+    async def maybe_refresh_snapshot(self) -> bool:
+        """Başka bir worker yeni snapshot yazdıysa (CURRENT değiştiyse) ona geçer.
+
+        Snapshot'sız dil indeksleri sunulan model değiştiyse (başka worker'da geçiş) yeniden yüklenir.
+        """
+        now = time.monotonic()
+        if now - self._last_snapshot_check < EMBEDDING_SNAPSHOT_CHECK_SECONDS:
+            return False
+        self._last_snapshot_check = now
+        if self.source != 'hadiths':
+            previous = self.model
+            if self._model or self._load_lock.locked() or await self.resolve_model() == previous:
+                return False
+            await self.load()
+            return True
+        version = embedding_snapshot.current_version(self.snapshot_dir)
+        if not version or version == self.snapshot_version or self._load_lock.locked():
+            return False
+        await self.load()
+        return True
+
+    async def rebuild_snapshot(self) -> Dict:
+        """DB'deki tüm embedding'lerden yeni snapshot yazar ve bu worker'ı ona geçirir."""
+        async with self._load_lock:
+            manifest = await self._write_snapshot()
+            await self._load()
+            return manifest
+
+    async def _write_snapshot(self) -> Dict:
+        ids_list, vectors = await self._fetch_vectors()
+        model = self.model
+        if model is None:
+            async with AsyncSessionLocal() as session:
+                models = (await session.execute(
+                    select(Hadith.embedding_model, func.count(Hadith.id))
+                    .where(Hadith.embedding_model != None)
+                    .group_by(Hadith.embedding_model)
+                )).all()
+            model = Counter(dict(models)).most_common(1)[0][0] if models else None
+
+        def _write():
+            ids_arr, matrix = self._stack(ids_list, vectors)
+            ann = build_ann(matrix, self.engine)
+            ivf = (ann.centroids, ann.assignments(matrix.shape[0])) if ann is not None else None
+            quantizer = build_quantizer(matrix, self.quantization)
+            quant = (quantizer.kind, quantizer.to_arrays()) if quantizer is not None else None
+            return embedding_snapshot.write_snapshot(ids_arr, matrix, model, ivf=ivf, base_dir=self.snapshot_dir, quant=quant)
+
+        return await asyncio.to_thread(_write)
+
+    def export(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Ana ve delta segmentleri birleştirilmiş (ids, matrix) olarak döner."""
+        st = self._state
+        if not st.delta_ids.shape[0]:
+            return st.ids, st.matrix
+        keep = ~np.isin(st.ids, st.delta_ids)
+        return (
+            np.concatenate([st.ids[keep], st.delta_ids]),
+            np.vstack([st.matrix[keep], st.delta_matrix]),
+        )
+
+    def add(self, ids: Iterable[int], vectors: Iterable[np.ndarray], model: Optional[str] = None) -> int:
+        """Yeni veya güncellenmiş vektörleri delta segmente ekler (aynı id varsa değiştirir).
+
+        model indekslenen modelden farklıysa vektörler eklenmez.
+        """
+        ids = list(ids)
+        vectors = list(vectors)
+        if not ids:
+            return 0
+        if model and self.model and model != self.model:
+            return 0
+        st = self._state
+        if not len(self):
+            return self.build(ids, vectors)
+        new_ids, new_matrix = self._stack(ids, vectors, dim=self.dim)
+        if not len(new_ids):
+            return 0
+        keep = ~np.isin(st.delta_ids, new_ids)
+        delta_ids = np.concatenate([st.delta_ids[keep], new_ids])
+        self._state = st._replace(
+            delta_ids=delta_ids,
+            delta_matrix=np.vstack([st.delta_matrix[keep], new_matrix]),
+            shadowed=int(np.isin(st.ids, delta_ids).sum()),
+        )
+        if self._state.delta_ids.shape[0] > HADITH_INDEX_DELTA_MAX:
+            self._schedule_compaction()
+        return int(len(new_ids))
+
+    def _schedule_compaction(self) -> None:
+        """Büyüyen delta'yı event loop'u bloklamadan arka planda birleştirir (görev zaten sürüyorsa bekler)."""
+        if self._compact_task is not None and not self._compact_task.done():
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Event loop dışında (betikler) doğrudan birleştirilir
+            self.compact()
+            return
+        self._compact_task = asyncio.create_task(self._compact_in_background())
+
+    async def _compact_in_background(self) -> None:
+        try:
+            if self.source == 'hadiths':
+                # Sunulan kopya yeni snapshot'a yazılır; ana segment heap'e kopyalanmadan mmap olarak açılır
+                await self.rebuild_snapshot()
+                return
+            async with self._load_lock:
+                st = self._state
+                compacted = await asyncio.to_thread(self._compacted, st)
+                current = self._state
+                if current.ids is not st.ids:
+                    return
+                # Birleştirme sürerken eklenen/güncellenen satırlar delta'da kalır
+                pending = self._added_since(st, current)
+                delta_ids = current.delta_ids[pending]
+                self._state = compacted._replace(
+                    delta_ids=delta_ids,
+                    delta_matrix=current.delta_matrix[pending],
+                    shadowed=int(np.isin(compacted.ids, delta_ids).sum()),
+                )
+            print(f"[INDEX] Delta birleştirildi: {len(self)} satır")
+        except Exception as e:
+            print(f"[INDEX] Delta birleştirme hatası: {e}")
+
+    @staticmethod
+    def _added_since(old: _IndexState, current: _IndexState) -> np.ndarray:
+        """current delta'sında old delta'sındakiyle aynı olmayan (yeni veya değişmiş) satırların maskesi."""
+        if not old.delta_ids.shape[0] or not current.delta_ids.shape[0]:
+            return np.ones(current.delta_ids.shape[0], dtype=bool)
+        order = np.argsort(old.delta_ids, kind="stable")
+        idx = np.minimum(np.searchsorted(old.delta_ids[order], current.delta_ids), order.shape[0] - 1)
+        src = order[idx]
+        same = (old.delta_ids[src] == current.delta_ids) & np.all(old.delta_matrix[src] == current.delta_matrix, axis=1)
+        return ~same
+
+    def compact(self) -> None:
+        """Delta segmentini bellek içi ana matrise birleştirir (mmap paylaşımı bu worker için biter)."""
+        if self._state.delta_ids.shape[0]:
+            self._state = self._compacted(self._state)
+
+    def _compacted(self, st: _IndexState) -> _IndexState:
+        keep = ~np.isin(st.ids, st.delta_ids)
+        matrix = np.vstack([st.matrix[keep], st.delta_matrix])
+        ann = st.ann
+        if ann is not None:
+            # Yeni vektörler mevcut kümelere eklenir; yeniden eğitim gerekmez
+            ann = ann.without_rows(keep).with_rows(matrix, int(keep.sum()))
+        else:
+            ann = build_ann(matrix, self.engine)
+        if st.quant is not None:
+            quant = merge_rows(st.quant, keep, st.delta_matrix)
+        else:
+            quant = build_quantizer(matrix, self.quantization)
+        return _empty_state(int(matrix.shape[1]))._replace(
+            ids=np.concatenate([st.ids[keep], st.delta_ids]), matrix=matrix, ann=ann, quant=quant,
+        )
+
+    def _prepare_query(self, query) -> Optional[np.ndarray]:
+        vec = parse_embedding(query)
+        if vec is None or vec.shape[0] != self.dim:
+            return None
+        norm = float(np.linalg.norm(vec))
+        if norm == 0.0:
+            return None
+        return vec / norm
+
+    def _base_positions(self, st: _IndexState, hadith_ids: np.ndarray) -> np.ndarray:
+        """Verilen hadis id'lerinin ana segmentteki pozisyonlarını (artan sırada) döner."""
+        cached = self._sorted_base
+        if cached is None or cached[0] is not st.ids:
+            order = np.argsort(st.ids, kind="stable")
+            cached = self._sorted_base = (st.ids, order, np.asarray(st.ids)[order])
+        _, order, sorted_ids = cached
+        idx = np.minimum(np.searchsorted(sorted_ids, hadith_ids), sorted_ids.shape[0] - 1)
+        hit = sorted_ids[idx] == hadith_ids
+        return np.sort(order[idx[hit]])
+
+    def _search_subset(self, st: _IndexState, q: np.ndarray, top_k: int, allowed_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Yalnızca izin verilen satırlar skorlanır; ANN kümeleri yerine alt küme doğrudan taranır
+        pos = self._base_positions(st, allowed_ids) if st.ids.shape[0] else np.empty(0, dtype=np.int64)
+        if st.delta_ids.shape[0] and pos.shape[0]:
+            pos = pos[~np.isin(st.ids[pos], st.delta_ids)]
+        if not pos.shape[0]:
+            base_ids, base_scores = st.ids[:0], np.empty(0, dtype=np.float32)
+        elif st.quant is not None:
+            cand = top_k_positions(st.quant.score(q, pos), top_k * HADITH_QUANT_RERANK)
+            top_pos, base_scores = rerank(st.matrix, q, pos[cand], top_k)
+            base_ids = st.ids[top_pos]
+        else:
+            scores = np.asarray(st.matrix[pos]) @ q
+            top = top_k_positions(scores, top_k)
+            base_ids, base_scores = st.ids[pos[top]], scores[top]
+        dmask = np.isin(st.delta_ids, allowed_ids)
+        if not dmask.any():
+            return base_ids, base_scores
+        all_ids = np.concatenate([base_ids, st.delta_ids[dmask]])
+        all_scores = np.concatenate([base_scores, st.delta_matrix[dmask] @ q])
+        top = top_k_positions(all_scores, top_k)
+        return all_ids[top], all_scores[top]
+
+    def search(self, query, top_k: int = 3, nprobe: Optional[int] = None, exact: bool = False, allowed_ids: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Sorgu vektörüne en yakın top_k hadisin (ids, skorlar) dizilerini döner.
+
+        Skorlar kosinüs benzerliğidir ve azalan sıradadır. ANN motoru kuruluysa
+        nprobe ile recall/gecikme dengesi ayarlanabilir; exact=True tam aramayı zorlar.
+        Nicemli modda adaylar kodlarla seçilir, dönen skorlar tam hassasiyetlidir.
+        allowed_ids (sıralı hadis id dizisi) verilirse yalnızca bu alt küme skorlanır.
+        """
+        st = self._state
+        q = self._prepare_query(query)
+        if q is None or not len(self) or top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if allowed_ids is not None:
+            return self._search_subset(st, q, top_k, np.asarray(allowed_ids, dtype=np.int64))
+        # Delta'da güncellenen (gölgelenen) ana segment id'leri atılacağı için o kadar fazladan aday alınır
+        base_k = top_k + st.shadowed
+        if not st.ids.shape[0]:
+            base_ids, base_scores = st.ids, np.empty(0, dtype=np.float32)
+        elif st.quant is not None and not exact:
+            cand_k = base_k * HADITH_QUANT_RERANK
+            if st.ann is not None:
+                cand, _ = st.ann.search(st.matrix, q, cand_k, nprobe, scorer=st.quant.score)
+            else:
+                cand = top_k_positions(st.quant.score(q), cand_k)
+            pos, base_scores = rerank(st.matrix, q, cand, base_k)
+            base_ids = st.ids[pos]
+        elif st.ann is not None and not exact:
+            pos, base_scores = st.ann.search(st.matrix, q, base_k, nprobe)
+            base_ids = st.ids[pos]
+        else:
+            scores = st.matrix @ q
+            pos = top_k_positions(scores, base_k)
+            base_ids, base_scores = st.ids[pos], scores[pos]
+        if not st.delta_ids.shape[0]:
+            return base_ids[:top_k], base_scores[:top_k]
+        keep = ~np.isin(base_ids, st.delta_ids)
+        all_ids = np.concatenate([base_ids[keep], st.delta_ids])
+        all_scores = np.concatenate([base_scores[keep], st.delta_matrix @ q])
+        top = top_k_positions(all_scores, top_k)
+        return all_ids[top], all_scores[top]
+
+    def recall_report(self, nprobe_values: Sequence[int], top_k: int = 10, sample: int = 200) -> Dict:
+        """ANN motorunun ve (açıksa) nicemlemenin tam aramaya göre recall/gecikme raporunu üretir."""
+        st = self._state
+        if st.ann is None:
+            report = {'engine': 'exact', 'rows': len(self), 'results': []}
+        else:
+            report = recall_report(st.matrix, st.ann, nprobe_values, top_k=top_k, sample=sample)
+            report['engine'] = st.ann.name
+        if st.quant is not None and st.ids.shape[0]:
+            report['quantization'] = quantization_report(st.matrix, st.quant, top_k=top_k, sample=sample)
+        return report
+
+    def score_ids(self, query, hadith_ids: Iterable[int]) -> Dict[int, float]:
+        """Verilen hadis id'leri için sorguya kosinüs skorlarını döner (indekste olmayanlar atlanır)."""
+        st = self._state
+        q = self._prepare_query(query)
+        wanted = np.asarray([i for i in hadith_ids if i is not None], dtype=np.int64)
+        if q is None or not len(self) or not len(wanted):
+            return {}
+        out: Dict[int, float] = {}
+        # Önce ana segment, sonra delta (delta güncel değeri ezer)
+        for ids, matrix in ((st.ids, st.matrix), (st.delta_ids, st.delta_matrix)):
+            pos = np.nonzero(np.isin(ids, wanted))[0]
+            if pos.shape[0]:
+                for p, s in zip(pos, matrix[pos] @ q):
+                    out[int(ids[p])] = float(s)
+        return out
+
+    def stats(self) -> Dict:
+        st = self._state
+        return {
+            'rows': len(self),
+            'dimension': self.dim,
+            'base_rows': int(st.ids.shape[0]),
+            'delta_rows': int(st.delta_ids.shape[0]),
+            'engine': st.ann.name if st.ann is not None else 'exact',
+            'quantization': st.quant.kind if st.quant is not None else 'none',
+            'quant_bytes': st.quant.nbytes if st.quant is not None else 0,
+            'float32_bytes': int(st.matrix.nbytes),
+            'snapshot_version': st.snapshot_version,
+            'mmap': isinstance(st.matrix, np.memmap),
+            'language': self.language,
+            'model': self.model,
+        }
+
+
+# Global instance
+hadith_index = HadithEmbeddingIndex()
+# Dil başına indeksler: 'tr' sunulan kopya, diğer diller hadith_embeddings'teki sunulan model satırları
+language_indexes: Dict[str, HadithEmbeddingIndex] = {
+    lang: hadith_index if lang == 'tr' else HadithEmbeddingIndex(quantization='none', source='versions', language=lang)
+    for lang in EMBEDDING_LANGUAGES
+}
@@ -3,6 +3,8 @@ import asyncio
 from sqlalchemy.ext.asyncio import AsyncSession
 from models import Hadith
 from database import AsyncSessionLocal
+from embedding_utils import supplied_embedding_columns, apply_cached_embeddings
+from answer_cache import answer_cache
 import sys
 import math
 
@@ -45,6 +47,7 @@ async def main():
         try:
             eklenen = 0
             atlanan = 0
+            added_hadiths = []
             for i, row in df.iterrows():
                 # Zorunlu alan kontrolü
                 if not row.get('turkish_text') or not row.get('source'):
@@ -69,9 +72,11 @@ async def main():
                         reference=row.get('reference'),
                         category=row.get('category'),
                         language=row.get('language', 'tr'),
-                        embedding=row.get('embedding')
+                        # Modelsiz (embedding_model sütunu boş) vektörler saklanmaz; önbellek/backfill doldurur
+                        **supplied_embedding_columns(row.get('embedding'), row.get('embedding_model'))
                     )
                     session.add(hadith)
+                    added_hadiths.append(hadith)
                     print(f"EKLENİYOR (satır {i+2}): hadis_id={row.get('hadis_id')}, turkish_text={str(row.get('turkish_text'))[:30]}")
                     eklenen += 1
                 except Exception as row_e:
@@ -79,6 +84,9 @@ async def main():
                     atlanan += 1
             await session.commit()
             print(f'Hadisler başarıyla yüklendi. Eklenen: {eklenen}, Atlanan: {atlanan}')
+            # Embedding'i olmayan ama aynı metni daha önce embed edilmiş hadisler önbellekten doldurulur
+            await apply_cached_embeddings(added_hadiths)
+            await answer_cache.invalidate()
         except Exception as e:
             await session.rollback()
             print('Yükleme sırasında genel hata oluştu:', e)
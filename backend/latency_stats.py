@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class LatencyStats:
+    """Son N ölçümün kayan penceresi üzerinden gecikme istatistikleri (ms)."""
+
+    def __init__(self, window: int = 1000):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+
+    def record(self, ms: float, error: bool = False) -> None:
+        with self._lock:
+            self._samples.append(ms)
+            self.count += 1
+            self.total_ms += ms
+            if error:
+                self.errors += 1
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Penceredeki ölçümlerin p. yüzdeliği (0-100); ölçüm yoksa None."""
+        with self._lock:
+            if not self._samples:
+                return None
+            samples = np.fromiter(self._samples, dtype=np.float64)
+        return float(np.percentile(samples, p))
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            samples = np.fromiter(self._samples, dtype=np.float64)
+        if not samples.shape[0]:
+            return {'count': self.count, 'errors': self.errors}
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'avg_ms': round(self.total_ms / max(self.count, 1), 3),
+            'p50_ms': round(float(p50), 3),
+            'p95_ms': round(float(p95), 3),
+            'p99_ms': round(float(p99), 3),
+            'max_ms': round(float(samples.max()), 3),
+        }
+
+
+class LatencyRegistry:
+    """Aşama adına göre LatencyStats tutar (ör. 'embedding', 'vector', 'lexical')."""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._stats: Dict[str, LatencyStats] = {}
+
+    def get(self, name: str) -> LatencyStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats.setdefault(name, LatencyStats(self.window))
+        return stats
+
+    @contextmanager
+    def timed(self, name: str):
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.get(name).record((time.perf_counter() - started) * 1000, error=error)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {name: stats.snapshot() for name, stats in sorted(self._stats.items())}
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import threading
+from typing import Dict, Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (httpx HTTP/2 desteği için gerekli)
+    H2_AVAILABLE = True
+except Exception:
+    H2_AVAILABLE = False
+
+# LLM sağlayıcıları için paylaşılan, sağlayıcı başına ayrı keep-alive istemci havuzları
+LLM_PROVIDERS = ('openai', 'claude', 'gemini')
+LLM_HTTP_TIMEOUT = float(os.getenv('LLM_HTTP_TIMEOUT') or 30)
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT') or 5)
+# h2 paketi kuruluysa HTTP/2 (tek bağlantı üzerinden çoklu akış) kullanılır
+LLM_HTTP2 = (os.getenv('LLM_HTTP2') or 'true').strip().lower() in {'1', 'true', 'yes'}
+# Sağlayıcı başına eşzamanlı bağlantı sınırı (örn. LLM_MAX_CONNECTIONS_OPENAI=100)
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS') or 50)
+LLM_PROVIDER_MAX_CONNECTIONS: Dict[str, int] = {
+    name: int(os.getenv(f'LLM_MAX_CONNECTIONS_{name.upper()}') or LLM_MAX_CONNECTIONS)
+    for name in LLM_PROVIDERS
+}
+
+
+class LLMClientPool:
+    """Sağlayıcı başına paylaşılan httpx.AsyncClient (HTTP/2, bağlantı sınırlı).
+
+    Tamamlama çağrıları event loop'u bloklamaz; bir sağlayıcının yavaşlığı diğerlerinin
+    bağlantılarını tüketmez. İstemciler oluşturuldukları event loop'a bağlıdır.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, http2: bool = LLM_HTTP2, transport=None):
+        self.limits = dict(LLM_PROVIDER_MAX_CONNECTIONS if limits is None else limits)
+        self.http2 = http2 and H2_AVAILABLE
+        self._transport = transport
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._client_loops: Dict[str, asyncio.AbstractEventLoop] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def client(self, provider: str) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(provider)
+        if client is None or client.is_closed or self._client_loops.get(provider) is not loop:
+            max_connections = self.limits.get(provider, LLM_MAX_CONNECTIONS)
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(LLM_HTTP_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+                http2=self.http2,
+                transport=self._transport,
+            )
+            self._clients[provider] = client
+            self._client_loops[provider] = loop
+        return client
+
+    async def post(self, provider: str, url: str, **kwargs) -> httpx.Response:
+        """POST atar ve HTTP hatalarını istisnaya çevirir (zamanlayıcı 429/5xx'te yeniden dener)."""
+        with self._lock:
+            self._in_flight[provider] = self._in_flight.get(provider, 0) + 1
+            self._requests[provider] = self._requests.get(provider, 0) + 1
+        try:
+            resp = await self.client(provider).post(url, **kwargs)
+            resp.raise_for_status()
+            return resp
+        finally:
+            with self._lock:
+                self._in_flight[provider] -= 1
+
+    async def open_stream(self, provider: str, url: str, **kwargs) -> httpx.Response:
+        """Akışlı POST: başlıklar gelince gövdeyi okumadan döner; yanıt close_stream ile kapatılmalı."""
+        with self._lock:
+            self._in_flight[provider] = self._in_flight.get(provider, 0) + 1
+            self._requests[provider] = self._requests.get(provider, 0) + 1
+        try:
+            client = self.client(provider)
+            resp = await client.send(client.build_request('POST', url, **kwargs), stream=True)
+            if resp.is_error:
+                await resp.aread()
+                await resp.aclose()
+                resp.raise_for_status()
+            return resp
+        except BaseException:
+            with self._lock:
+                self._in_flight[provider] -= 1
+            raise
+
+    async def close_stream(self, provider: str, resp: httpx.Response) -> None:
+        try:
+            await resp.aclose()
+        finally:
+            with self._lock:
+                self._in_flight[provider] -= 1
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        self._client_loops = {}
+        for client in clients.values():
+            if not client.is_closed:
+                await client.aclose()
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                name: {
+                    'max_connections': self.limits.get(name, LLM_MAX_CONNECTIONS),
+                    'in_flight': self._in_flight.get(name, 0),
+                    'requests': self._requests.get(name, 0),
+                    'http2': self.http2,
+                }
+                for name in sorted(set(self.limits) | set(self._requests))
+            }
+
+
+# Global instance
+llm_clients = LLMClientPool()
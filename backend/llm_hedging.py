@@ -0,0 +1,191 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from latency_stats import LatencyRegistry
+
+T = TypeVar('T')
+
+# Birincil model ilk cevap parçasını bu gecikmede vermezse yedek model paralel başlatılır
+LLM_HEDGE_ENABLED = (os.getenv('LLM_HEDGE_ENABLED') or 'true').strip().lower() in {'1', 'true', 'yes'}
+# Gecikme birincilin aynı türdeki (akışlı/akışsız) son ölçümlerinin bu yüzdeliğidir
+LLM_HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE') or 95)
+# Yeterli ölçüm yokken kullanılan gecikme ve alt/üst sınırlar (ms)
+LLM_HEDGE_DEFAULT_DELAY_MS = float(os.getenv('LLM_HEDGE_DEFAULT_DELAY_MS') or 4000)
+LLM_HEDGE_MIN_DELAY_MS = float(os.getenv('LLM_HEDGE_MIN_DELAY_MS') or 500)
+LLM_HEDGE_MAX_DELAY_MS = float(os.getenv('LLM_HEDGE_MAX_DELAY_MS') or 15000)
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES') or 20)
+LLM_HEDGE_WINDOW = int(os.getenv('LLM_HEDGE_WINDOW') or 200)
+
+
+class _PairStats:
+    def __init__(self):
+        self.requests = 0
+        self.hedges = 0
+        self.primary_wins = 0
+        self.fallback_wins = 0
+        self.both_failed = 0
+
+    def snapshot(self) -> Dict:
+        decided = self.primary_wins + self.fallback_wins
+        return {
+            'requests': self.requests,
+            'hedges': self.hedges,
+            'hedge_rate': round(self.hedges / self.requests, 4) if self.requests else 0.0,
+            'primary_wins': self.primary_wins,
+            'fallback_wins': self.fallback_wins,
+            'both_failed': self.both_failed,
+            'fallback_win_rate': round(self.fallback_wins / decided, 4) if decided else 0.0,
+        }
+
+
+class LLMHedgePolicy:
+    """Birincil/yedek LLM çağrıları için yüzdelik tabanlı hedge politikası.
+
+    Sağlayıcı başına iki ayrı kayan pencere tutulur: akışlı çağrılarda ilk cevap parçasına kadar
+    geçen süre, akışsız çağrılarda tüm cevabın süresi (ikisi karışırsa yüzdelik anlamını yitirir).
+    Birincil, çağrı türünün penceresindeki LLM_HEDGE_PERCENTILE yüzdeliğini aşarsa yedek paralel
+    başlatılır, ilk başarılı olan kazanır ve diğeri iptal edilir. Hedge ve kazanma oranları
+    (birincil->yedek) çifti başına tutulur.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = LLM_HEDGE_ENABLED,
+        percentile: float = LLM_HEDGE_PERCENTILE,
+        default_delay_ms: float = LLM_HEDGE_DEFAULT_DELAY_MS,
+        min_delay_ms: float = LLM_HEDGE_MIN_DELAY_MS,
+        max_delay_ms: float = LLM_HEDGE_MAX_DELAY_MS,
+        min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+        window: int = LLM_HEDGE_WINDOW,
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.default_delay_ms = default_delay_ms
+        self.min_delay_ms = min_delay_ms
+        self.max_delay_ms = max_delay_ms
+        self.min_samples = min_samples
+        self.latency = LatencyRegistry(window)
+        self._pairs: Dict[str, _PairStats] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _window(provider: str, streaming: bool) -> str:
+        return f"{provider}/{'stream' if streaming else 'complete'}"
+
+    def record(self, provider: str, ms: float, streaming: bool = False) -> None:
+        self.latency.get(self._window(provider, streaming)).record(ms)
+
+    def delay_ms(self, provider: str, streaming: bool = False) -> float:
+        return self._delay_ms(self._window(provider, streaming))
+
+    def _delay_ms(self, window: str) -> float:
+        stats = self.latency.get(window)
+        if stats.count < self.min_samples:
+            return self.default_delay_ms
+        delay = stats.percentile(self.percentile)
+        if delay is None:
+            return self.default_delay_ms
+        return min(self.max_delay_ms, max(self.min_delay_ms, delay))
+
+    def _pair(self, primary: str, fallback: str) -> _PairStats:
+        key = f"{primary}->{fallback}"
+        with self._lock:
+            pair = self._pairs.get(key)
+            if pair is None:
+                pair = self._pairs[key] = _PairStats()
+            return pair
+
+    async def race(
+        self,
+        primary: str,
+        fallback: str,
+        start: Callable[[str], Awaitable[Optional[T]]],
+        discard: Optional[Callable[[T], Awaitable[None]]] = None,
+        streaming: bool = False,
+    ) -> Tuple[Optional[T], Optional[str], List[str]]:
+        """Birincili başlatır, gecikirse yedeği de başlatıp ilk başarılı sonucu döner.
+
+        start(name) başarısızlıkta None döner. Dönüş: (sonuç, kazanan, sırayla denenebilecek
+        sağlayıcılar) — kazanan sonradan (ör. akış ortasında) başarısız olursa veya sonuç yoksa
+        çağıran bu listeyi sırayla dener. İptal edilen kaybeden listeye girer, başarısız olan girmez.
+        discard aynı anda biten kaybedenin sonucunu serbest bırakır (ör. açık akışı kapatır).
+        streaming gecikmenin hangi pencereden (ilk parça / tüm cevap) hesaplanacağını seçer.
+        """
+        hedgeable = self.enabled and primary != fallback
+        if hedgeable:
+            pair = self._pair(primary, fallback)
+            with self._lock:
+                pair.requests += 1
+        first = asyncio.create_task(start(primary))
+        try:
+            if not hedgeable:
+                return await first, primary, [fallback]
+            done, _ = await asyncio.wait({first}, timeout=self.delay_ms(primary, streaming) / 1000)
+            if done:
+                result = first.result()
+                with self._lock:
+                    if result is not None:
+                        pair.primary_wins += 1
+                return result, primary, [fallback]
+        except BaseException:
+            first.cancel()
+            raise
+
+        with self._lock:
+            pair.hedges += 1
+        print(f"[LLM] {primary} gecikti; {fallback} paralel başlatıldı (hedge)")
+        tasks = {first: primary, asyncio.create_task(start(fallback)): fallback}
+        pending = set(tasks)
+        winner: Optional[Tuple[T, str]] = None
+        failed: List[str] = []
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Aynı anda bitenlerde birincil tercih edilir
+                for task in sorted(done, key=lambda t: tasks[t] != primary):
+                    result = task.result()
+                    if result is None:
+                        failed.append(tasks[task])
+                    elif winner is None:
+                        winner = (result, tasks[task])
+                    elif discard is not None:
+                        await discard(result)
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+                for task in pending:
+                    # İptal yetişmeden bitmiş kaybedenin sonucu da serbest bırakılır
+                    if discard is not None and not task.cancelled() and task.exception() is None and task.result() is not None:
+                        await discard(task.result())
+        with self._lock:
+            if winner is None:
+                pair.both_failed += 1
+            elif winner[1] == primary:
+                pair.primary_wins += 1
+            else:
+                pair.fallback_wins += 1
+        if winner is None:
+            return None, None, []
+        loser = fallback if winner[1] == primary else primary
+        return winner[0], winner[1], [] if loser in failed else [loser]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            pairs = {key: pair.snapshot() for key, pair in sorted(self._pairs.items())}
+        latency = self.latency.snapshot()
+        return {
+            'enabled': self.enabled,
+            'percentile': self.percentile,
+            'delay_ms': {name: round(self._delay_ms(name), 1) for name in latency},
+            'latency': latency,
+            'pairs': pairs,
+        }
+
+
+# Global instance
+llm_hedging = LLMHedgePolicy()
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import threading
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import onnxruntime
+    from tokenizers import Tokenizer
+    ONNX_AVAILABLE = True
+except Exception:
+    onnxruntime = None
+    Tokenizer = None
+    ONNX_AVAILABLE = False
+
+# Yerel (CPU) embedding modeli: klasörde model.onnx ve tokenizer.json beklenir
+LOCAL_EMBEDDING_MODEL_PATH = os.getenv('LOCAL_EMBEDDING_MODEL_PATH', '')
+LOCAL_EMBEDDING_MODEL = os.getenv('LOCAL_EMBEDDING_MODEL') or (
+    os.path.basename(os.path.normpath(LOCAL_EMBEDDING_MODEL_PATH)) if LOCAL_EMBEDDING_MODEL_PATH else 'local-embedding'
+)
+LOCAL_EMBEDDING_MAX_LENGTH = int(os.getenv('LOCAL_EMBEDDING_MAX_LENGTH') or 256)
+LOCAL_EMBEDDING_THREADS = int(os.getenv('LOCAL_EMBEDDING_THREADS') or 0)
+# Mikro-batch: eşzamanlı sorgular en fazla bu kadar bekleyip tek forward pass'te embed edilir
+LOCAL_EMBEDDING_MAX_BATCH = int(os.getenv('LOCAL_EMBEDDING_MAX_BATCH') or 32)
+LOCAL_EMBEDDING_BATCH_WAIT_MS = float(os.getenv('LOCAL_EMBEDDING_BATCH_WAIT_MS') or 5)
+
+
+class OnnxSentenceEncoder:
+    """ONNX (tercihen nicemli) cümle embedding modeli; mean pooling + L2 normalize ile vektör üretir."""
+
+    def __init__(self, model_dir: str, max_length: int = LOCAL_EMBEDDING_MAX_LENGTH):
+        model_file = os.path.join(model_dir, 'model_quantized.onnx')
+        if not os.path.exists(model_file):
+            model_file = os.path.join(model_dir, 'model.onnx')
+        options = onnxruntime.SessionOptions()
+        if LOCAL_EMBEDDING_THREADS:
+            options.intra_op_num_threads = LOCAL_EMBEDDING_THREADS
+        self.session = onnxruntime.InferenceSession(model_file, options, providers=['CPUExecutionProvider'])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        # Aynı oturumda eşzamanlı run çağrıları yerine sıralı forward pass
+        self._lock = threading.Lock()
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch([t or '' for t in texts])
+        input_ids = np.asarray([e.ids for e in encodings], dtype=np.int64)
+        attention = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {'input_ids': input_ids, 'attention_mask': attention}
+        if 'token_type_ids' in self.input_names:
+            feeds['token_type_ids'] = np.zeros_like(input_ids)
+        with self._lock:
+            hidden = self.session.run(None, feeds)[0]
+        mask = attention[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        norms[norms == 0.0] = 1.0
+        return (pooled / norms).astype(np.float32)
+
+
+class MicroBatcher:
+    """Eşzamanlı embed isteklerini kuyrukta toplayıp tek encode çağrısında işler.
+
+    İlk istek geldikten sonra en fazla `wait_ms` beklenir veya `max_batch` metne ulaşılınca
+    toplu encode thread'de çalıştırılır; her çağıran kendi vektörlerini alır.
+    """
+
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], max_batch: int = LOCAL_EMBEDDING_MAX_BATCH, wait_ms: float = LOCAL_EMBEDDING_BATCH_WAIT_MS):
+        self.encode = encode
+        self.max_batch = max_batch
+        self.wait_ms = wait_ms
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop = None
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop or self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._loop = loop
+            self._worker = loop.create_task(self._run(self._queue))
+        return self._queue
+
+    async def embed(self, texts: Sequence[str]) -> List[np.ndarray]:
+        queue = self._ensure_worker()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            queue.put_nowait((text, future))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        while True:
+            batch = [await queue.get()]
+            deadline = asyncio.get_running_loop().time() + self.wait_ms / 1000
+            while len(batch) < self.max_batch:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            batch = [(text, future) for text, future in batch if not future.cancelled()]
+            if not batch:
+                continue
+            try:
+                # CPU yoğun forward pass event loop'u bloklamasın
+                matrix = await asyncio.to_thread(self.encode, [text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), vec in zip(batch, matrix):
+                if not future.done():
+                    future.set_result(vec)
+
+    def stats(self) -> dict:
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch': round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
@@ -1,8 +1,9 @@
 from fastapi import FastAPI
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional, Any
+from typing import AsyncIterator, List, Optional, Any
 from database import engine, Base
 import models
 from dotenv import load_dotenv
@@ -10,6 +11,7 @@ import os
 import requests
 import urllib.parse
 import asyncio
+import time
 from auth import router as auth_router
 from fastapi import Query, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -17,7 +19,21 @@ from database import AsyncSessionLocal
 from models import User, UserQuestionHistory, UserFavoriteHadith, Hadith, Setting, ChatSession, ChatMessage
 from sqlalchemy import select, text
 from sqlalchemy.dialects.postgresql import insert
-from vector_search import search_hadiths
+from hadith_filters import parse_filters, hadith_filters
+from vector_search import search_hadiths, search_latency, HADITH_SEARCH_MODE, HADITH_FUSION_METHOD
+from hadith_index import hadith_index, language_indexes
+from bm25_index import HADITH_LEXICAL_ENGINE, hadith_bm25
+from embedding_utils import supplied_embedding_columns, query_embedding_cache, apply_cached_embeddings
+from embedding_cache import embedding_content_cache
+from embedding_providers import embedding_providers
+from circuit_breaker import circuit_breakers
+from llm_clients import LLM_PROVIDERS, llm_clients
+from llm_hedging import llm_hedging
+from outbound_scheduler import outbound_scheduler
+from answer_cache import CachedAnswer, answer_cache
+from single_flight import SingleFlightAborted, ask_flight_key, ask_single_flight
+from pre_router import CLARIFY_REPLIES, ask_pre_router, reply_language
+from latency_stats import LatencyRegistry
 import logging
 import re
 from auth import get_current_user
@@ -37,6 +53,8 @@ import httpx
 from textwrap import shorten
 import uuid
 from scripts.migrate_and_seed import run as migrate_and_seed_run
+from embedding_jobs import embedding_jobs
+from embedding_versions import embedding_versions
 from math import radians, degrees, sin, cos, atan2
 from fastapi.staticfiles import StaticFiles
 from typing import Literal
@@ -210,6 +228,30 @@ async def on_startup():
         asyncio.create_task(migrate_and_seed_run())
     except Exception:
         logging.exception("Startup migrate+seed arka plan görevi başlatılamadı")
+    # Hadis embedding indekslerini (dil başına) arka planda belleğe yükle (ilk arama yüklemeyi bekler)
+    try:
+        for index in language_indexes.values():
+            asyncio.create_task(index.ensure_loaded())
+    except Exception:
+        logging.exception("Hadis embedding indeksi yükleme görevi başlatılamadı")
+    # Yarım kalan embedding backfill işleri checkpoint'ten devam eder
+    try:
+        asyncio.create_task(embedding_jobs.resume_pending())
+    except Exception:
+        logging.exception("Embedding işleri devam ettirilemedi")
+    # BM25 metin indeksi de arka planda kurulur
+    if HADITH_LEXICAL_ENGINE == 'bm25':
+        try:
+            asyncio.create_task(hadith_bm25.ensure_loaded())
+        except Exception:
+            logging.exception("Hadis BM25 indeksi yükleme görevi başlatılamadı")
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    # Embedding sağlayıcılarının paylaşılan keep-alive bağlantılarını kapat
+    await embedding_providers.aclose()
+    # LLM sağlayıcılarının HTTP/2 bağlantı havuzları
+    await llm_clients.aclose()
 
 # CORS ayarları (geliştirme için esnek localhost/127.0.0.1 izinleri)
 # Not: Render üzerinde farklı yerel portlardan (8091, 19006, 8082, 8083 vb.)
@@ -279,45 +321,58 @@ GEMINI_URL = os.getenv("GEMINI_URL")
 from ultimate_rag_main import (
     search_hadiths_ultimate,
     generate_ai_response_with_fallback,
+    AnswerStream,
 )
 
-@app.post("/api/ask", response_model=AskResponse)
-async def ask_ai(request: AskRequest, current_user: User = Depends(get_current_user_optional)):
-    import logging
-    from sqlalchemy import func
-    from datetime import datetime
-    user_id = current_user.id if current_user else None
-    # --- Sorgu limiti kontrolü ---
-    if current_user and not current_user.is_premium:
-        from database import AsyncSessionLocal
-        from models import UserQuestionHistory
-        # Varsayılan limit UI ile uyumlu olacak şekilde 3
-        daily_limit_raw = await get_setting('ai_daily_limit', '3')
-        try:
-            daily_limit = int(str(daily_limit_raw))
-        except Exception:
-            daily_limit = 1
-        limit_message = await get_setting('ai_limit_message', 'Günlük ücretsiz sorgu limitinizi doldurdunuz. Premium’a geçin!')
-        today = datetime.utcnow().date()
-        start_of_day = datetime.combine(today, datetime.min.time())
-        async with AsyncSessionLocal() as session:
-            result = await session.execute(
-                select(func.count()).where(
-                    UserQuestionHistory.user_id == user_id,
-                    UserQuestionHistory.created_at >= start_of_day
-                )
-            )
-            count = result.scalar() or 0
-            if count >= daily_limit:
-                raise HTTPException(status_code=429, detail=limit_message)
+# Akışlı cevapların kullanıcıya görünen gecikmeleri (ms): ilk olay (kaynaklar), ilk cevap parçası, toplam
+ask_stream_latency = LatencyRegistry()
+
+# Kullanıcıya özgü olmayan cevaplar önbelleğe alınmaz (netleştirme/selamlaşma soruya birebir bağlı)
+_UNCACHED_RESPONSE_TYPES = {'clarify', 'greeting'}
+
+
+def _answer_cacheable(question: str) -> bool:
+    # Tek kelimelik sorular netleştirme cevabı alır; benzer uzun sorularla eşleştirilmez
+    return len(question.strip().split()) >= 2
+
+
+def _hadith_source_items(hadith_dicts: List[dict]) -> List[SourceItem]:
+    """Bulunan hadislerin UI için sade kaynak listesi (skorlu); LLM cevabından önce gösterilebilir."""
+    sources = []
+    for h in hadith_dicts:
+        base = f"{h['full_reference']} - {h['text'][:60]}" if h.get('full_reference') else f"{h.get('source','')} - {h.get('reference','')}"
+        score = h.get('score')
+        display = f"{base} (skor: {score:.2f})" if isinstance(score, (int, float)) and score is not None else base
+        def _clean_source_text(s: str) -> str:
+            tokens = re.split(r"\s*[\-·]\s*", s)
+            tokens = [t.strip() for t in tokens if t and t.strip().lower() != "none"]
+            return " · ".join(tokens)
+        sources.append(SourceItem(type="hadis", name=_clean_source_text(display)))
+    return sources
+
+
+async def _generate_ask_answer(question: str, language: Optional[str], source_filter: Optional[str]) -> CachedAnswer:
+    """Hadis araması + LLM (fallback zinciri) ile cevap, UI kaynakları ve cevap türünü üretir."""
     # --- Ultimate RAG: vektör arama ve akıllı fallback yanıt üretimi ---
-    hadith_dicts = await search_hadiths_ultimate(request.question, top_k=3)
-    answer, used_fallback, response_type = generate_ai_response_with_fallback(
-        request.question,
+    hadith_dicts = await search_hadiths_ultimate(
+        question, top_k=3, source_filter=source_filter, language=language
+    )
+    llm_started = time.perf_counter()
+    answer, used_fallback, response_type = await generate_ai_response_with_fallback(
+        question,
         hadith_dicts,
         True,
-        request.language or 'tr'
+        language or 'tr'
     )
+    llm_ms = (time.perf_counter() - llm_started) * 1000
+    return await _finalize_ask_answer(question, language, source_filter, hadith_dicts, answer, response_type, llm_ms)
+
+
+async def _finalize_ask_answer(
+    question: str, language: Optional[str], source_filter: Optional[str], hadith_dicts: List[dict],
+    answer: str, response_type: str, llm_ms: float,
+) -> CachedAnswer:
+    """LLM cevabına son işlemleri uygular: kaynak filtreleme, AI eki, yönlendirme/selamlaşma ve giriş cümlesi."""
     # Hadis bulunamadığında ayardan okunabilir bir fallback mesajı göster
     if not hadith_dicts:
         answer = await get_setting(
@@ -325,16 +380,7 @@ async def ask_ai(request: AskRequest, current_user: User = Depends(get_current_u
             'Bu konuda güvenilir hadis kaynağı bulunamadı. Lütfen sorunuzu farklı şekilde ifade edin.'
         )
     # Kaynakları hazırla (UI için sade gösterim)
-    sources = []
-    for h in hadith_dicts:
-        base = f"{h['full_reference']} - {h['text'][:60]}" if h.get('full_reference') else f"{h.get('source','')} - {h.get('reference','')}"
-        score = h.get('score')
-        display = f"{base} (skor: {score:.2f})" if isinstance(score, (int, float)) and score is not None else base
-        def _clean_source_text(s: str) -> str:
-            tokens = re.split(r"\s*[\-·]\s*", s)
-            tokens = [t.strip() for t in tokens if t and t.strip().lower() != "none"]
-            return " · ".join(tokens)
-        sources.append(SourceItem(type="hadis", name=_clean_source_text(display)))
+    sources = _hadith_source_items(hadith_dicts)
     ai_source = "ultimate_rag"
     # Gelişmiş kaynaklar kutusu mantığı
     system_prompt = (
@@ -389,33 +435,17 @@ async def ask_ai(request: AskRequest, current_user: User = Depends(get_current_u
         sources = []
     # --- Sistem promptunun aynısını döndürmeyi engelle ---
     system_prompt_start = system_prompt[:80].lower()
-    # Kısa/tek kelime sorularda kullanıcıyı yönlendir
-    if len(request.question.strip().split()) < 2:
-        lang = (request.language or 'tr').lower()
-        answer = (
-            "Sorunuzu daha açık yazar mısınız?" if lang == 'tr' else (
-                "Please clarify your question." if lang == 'en' else "يرجى توضيح سؤالك."
-            )
-        )
-        sources = []
     # Modelden gelen cevap sistem promptuna çok benziyorsa veya 'anlaşıldı' ile başlıyorsa override et
     if answer.lower().startswith(system_prompt_start) or "resmi yapay zeka asistanı" in answer.lower() or answer.lower().startswith("anlaşıldı") or "bundan sonra" in answer.lower():
-        lang = (request.language or 'tr').lower()
-        answer = (
-            "Sorunuzu daha açık yazar mısınız?" if lang == 'tr' else (
-                "Please clarify your question." if lang == 'en' else "يرجى توضيح سؤالك."
-            )
-        )
+        answer = CLARIFY_REPLIES[reply_language(language)]
         sources = []
-    # Selamlaşma mesajlarında özel karşılama
-    if request.question.strip().lower() in ["selam", "merhaba", "merhabalar", "selamünaleyküm", "hello", "hi", "salam", "السلام عليكم"]:
-        lang = (request.language or 'tr').lower()
-        answer = (
-            "Merhaba! Size nasıl yardımcı olabilirim?" if lang == 'tr' else (
-                "Hello! How can I help you?" if lang == 'en' else "مرحبًا! كيف يمكنني مساعدتك؟"
-            )
-        )
+        response_type = 'clarify'
+    # Selamlaşma ve kısa sorular normalde ön yönlendirmede cevaplanır; kapalıysa aynı hazır cevaplar burada verilir
+    canned = ask_pre_router.classify(question, language)
+    if canned is not None:
+        answer = canned.answer
         sources = []
+        response_type = canned.response_type
     # Cevaba uygun giriş
     def _prefix(lang: str, has_hadith: bool, src_filter: str) -> str:
         lg = (lang or 'tr').lower()
@@ -437,30 +467,213 @@ async def ask_ai(request: AskRequest, current_user: User = Depends(get_current_u
             )
         )
     try:
-        lang = (request.language or 'tr')
-        pref = _prefix(lang, bool(hadith_dicts and len(hadith_dicts) > 0), request.source_filter or 'all')
+        lang = (language or 'tr')
+        pref = _prefix(lang, bool(hadith_dicts and len(hadith_dicts) > 0), source_filter or 'all')
         answer = f"{pref}{answer}" if pref and isinstance(answer, str) and not answer.strip().lower().startswith(pref.strip().lower()[:20]) else answer
     except Exception:
         pass
+    hadith_id = hadith_dicts[0].get('id') if hadith_dicts else None
+    return CachedAnswer(
+        question=question,
+        answer=answer,
+        sources=[{"type": s.type, "name": s.name} for s in sources],
+        response_type=response_type or '',
+        hadith_id=hadith_id,
+        llm_ms=llm_ms,
+    )
+
+
+async def _answer_question(question: str, language: Optional[str], source_filter: Optional[str]) -> CachedAnswer:
+    """Anlamsal cevap önbelleği: benzer soru cevaplandıysa arama ve LLM çağrısı atlanır; yoksa üretilip saklanır."""
+    cacheable = _answer_cacheable(question)
+    if cacheable:
+        reply = await answer_cache.lookup(question, language, source_filter)
+        if reply is not None:
+            return reply
+    generation = answer_cache.generation
+    reply = await _generate_ask_answer(question, language, source_filter)
+    if cacheable and reply.response_type not in _UNCACHED_RESPONSE_TYPES:
+        await answer_cache.store(question, language, source_filter, reply, generation)
+    return reply
+
+
+async def _check_daily_limit(current_user: Optional[User]) -> None:
+    """Premium olmayan kullanıcının günlük ücretsiz sorgu limitini aşmışsa 429 fırlatır."""
+    from sqlalchemy import func
+    if not current_user or current_user.is_premium:
+        return
+    # Varsayılan limit UI ile uyumlu olacak şekilde 3
+    daily_limit_raw = await get_setting('ai_daily_limit', '3')
+    try:
+        daily_limit = int(str(daily_limit_raw))
+    except Exception:
+        daily_limit = 1
+    limit_message = await get_setting('ai_limit_message', 'Günlük ücretsiz sorgu limitinizi doldurdunuz. Premium’a geçin!')
+    today = datetime.utcnow().date()
+    start_of_day = datetime.combine(today, datetime.min.time())
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(func.count()).where(
+                UserQuestionHistory.user_id == current_user.id,
+                UserQuestionHistory.created_at >= start_of_day
+            )
+        )
+        count = result.scalar() or 0
+        if count >= daily_limit:
+            raise HTTPException(status_code=429, detail=limit_message)
+
+
+async def _save_question_history(user_id: Optional[int], question: str, reply: CachedAnswer) -> None:
+    """Kullanıcı geçmişine otomatik kayıt (hata cevabı etkilemez)."""
+    if user_id is None:
+        return
+    try:
+        async with AsyncSessionLocal() as session:
+            history = UserQuestionHistory(user_id=user_id, question=question, answer=reply.answer, hadith_id=reply.hadith_id)
+            session.add(history)
+            await session.commit()
+    except Exception as e:
+        logging.exception("Geçmiş kaydı HATASI", exc_info=True)
+    # TODO: Add UNIQUE (user_id, question_hash) constraint to UserQuestionHistory for deduplication
+
+
+@app.post("/api/ask", response_model=AskResponse)
+async def ask_ai(request: AskRequest, current_user: User = Depends(get_current_user_optional)):
+    user_id = current_user.id if current_user else None
+    # --- Selamlaşma/tek kelime: arama, LLM, limit ve geçmiş kaydı olmadan hazır cevap ---
+    canned = ask_pre_router.route(request.question, request.language)
+    if canned is not None:
+        return AskResponse(answer=canned.answer, sources=[])
+    # --- Sorgu limiti kontrolü ---
+    await _check_daily_limit(current_user)
+    # --- Aynı soru eşzamanlı gelirse arama ve LLM çağrısı tek sefer yapılır; geçmiş her çağıran için yazılır ---
+    reply, _ = await ask_single_flight.do(
+        ask_flight_key(request.question, request.language, request.source_filter),
+        lambda: _answer_question(request.question, request.language, request.source_filter),
+    )
     # Genel yönlendirme veya açıklama isteyen cevaplarda kaynaklar kutusu gösterilmesin
     # Yönlendirme niteliğindeki cevaplarda dahi hadis bulunduysa kaynaklar korunur.
     # --- Kullanıcı geçmişine otomatik kayıt ---
-    if user_id is not None:
-        from database import AsyncSessionLocal
-        from models import UserQuestionHistory
-        try:
-            async with AsyncSessionLocal() as session:
-                hadith_id = None
-                if hadith_dicts:
-                    first = hadith_dicts[0]
-                    hadith_id = first.get('id')
-                history = UserQuestionHistory(user_id=user_id, question=request.question, answer=answer, hadith_id=hadith_id)
-                session.add(history)
-                await session.commit()
-        except Exception as e:
-            logging.exception("Geçmiş kaydı HATASI", exc_info=True)
-    # TODO: Add UNIQUE (user_id, question_hash) constraint to UserQuestionHistory for deduplication
-    return AskResponse(answer=answer, sources=sources)
+    await _save_question_history(user_id, request.question, reply)
+    return AskResponse(answer=reply.answer, sources=[SourceItem(**s) for s in reply.sources])
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _stream_ask_events(
+    question: str, language: Optional[str], source_filter: Optional[str], outcome: dict, done_extra: Optional[dict] = None,
+    canned: Optional[CachedAnswer] = None,
+) -> AsyncIterator[str]:
+    """/api/ask akışının SSE olayları.
+
+    sources: arama biter bitmez bulunan hadisler; token: sağlayıcının ürettiği cevap parçaları;
+    reset: sağlayıcı akışın ortasında koptu, o ana kadarki metin silinmeli (yedek sağlayıcı baştan yazar);
+    done: son işlemlerden (kaynak filtreleme, giriş cümlesi, yönlendirme) geçmiş nihai cevap ve kaynaklar;
+    error: cevap üretilemedi. Nihai cevap outcome['reply']'e yazılır (kayıtlar akış kapanınca yapılır).
+    canned verilmişse (ön yönlendirme) arama ve LLM yapılmadan doğrudan o cevap gönderilir.
+    """
+    started = time.perf_counter()
+    key = ask_flight_key(question, language, source_filter)
+    flight = None
+    try:
+        reply = canned
+        if reply is not None:
+            yield _sse('sources', {'sources': [], 'cached': False})
+            outcome['reply'] = reply
+            yield _sse('done', {
+                'answer': reply.answer, 'sources': [], 'response_type': reply.response_type, **(done_extra or {}),
+            })
+            return
+        coalesced = False
+        shared = ask_single_flight.join(key)
+        if shared is not None:
+            # Aynı soru şu an cevaplanıyor: ikinci arama/LLM çağrısı yapılmaz, ortak sonuç beklenir
+            try:
+                reply = await asyncio.shield(shared)
+                coalesced = True
+            except SingleFlightAborted:
+                reply = None
+        cacheable = _answer_cacheable(question)
+        if reply is None:
+            # Bu akış ortak iş olur; sürerken gelen kopyalar sonucunu bekler
+            flight = ask_single_flight.begin(key)
+            if cacheable:
+                reply = await answer_cache.lookup(question, language, source_filter)
+        if reply is not None:
+            yield _sse('sources', {'sources': reply.sources, 'cached': True, 'coalesced': coalesced})
+            ask_stream_latency.get('sources').record((time.perf_counter() - started) * 1000)
+        else:
+            generation = answer_cache.generation
+            hadith_dicts = await search_hadiths_ultimate(
+                question, top_k=3, source_filter=source_filter, language=language
+            )
+            yield _sse('sources', {'sources': [{'type': s.type, 'name': s.name} for s in _hadith_source_items(hadith_dicts)], 'cached': False})
+            ask_stream_latency.get('sources').record((time.perf_counter() - started) * 1000)
+            llm_started = time.perf_counter()
+            answer, response_type = '', 'fallback'
+            # Hadis yoksa cevap ayardaki mesajla değiştirileceği için LLM çağrılmaz
+            if hadith_dicts:
+                stream = AnswerStream(question, hadith_dicts, True, language or 'tr')
+                first_token = True
+                async for kind, text in stream:
+                    if kind == 'reset':
+                        yield _sse('reset', {})
+                        continue
+                    if first_token:
+                        ask_stream_latency.get('first_token').record((time.perf_counter() - started) * 1000)
+                        first_token = False
+                    yield _sse('token', {'text': text})
+                answer, response_type = stream.answer, stream.response_type
+            llm_ms = (time.perf_counter() - llm_started) * 1000
+            reply = await _finalize_ask_answer(question, language, source_filter, hadith_dicts, answer, response_type, llm_ms)
+            if cacheable and reply.response_type not in _UNCACHED_RESPONSE_TYPES:
+                await answer_cache.store(question, language, source_filter, reply, generation)
+        if flight is not None:
+            ask_single_flight.finish(key, flight, reply)
+        outcome['reply'] = reply
+        yield _sse('done', {
+            'answer': reply.answer, 'sources': reply.sources, 'response_type': reply.response_type, **(done_extra or {}),
+        })
+        ask_stream_latency.get('total').record((time.perf_counter() - started) * 1000)
+    except Exception:
+        logging.exception("Akışlı cevap HATASI")
+        ask_stream_latency.get('total').record((time.perf_counter() - started) * 1000, error=True)
+        yield _sse('error', {'detail': 'Cevap üretilemedi, lütfen tekrar deneyin.'})
+    finally:
+        # Sonuç üretilmeden çıkıldıysa (hata, bağlantı kesildi) bekleyenler işi kendileri yürütür
+        if flight is not None and not flight.done():
+            ask_single_flight.finish(key, flight, error=SingleFlightAborted())
+
+
+def _sse_response(events: AsyncIterator[str], on_close, headers: Optional[dict] = None) -> StreamingResponse:
+    # Proxy tamponlaması kapatılır; on_close akış kapandıktan sonra çalışır (geçmiş/mesaj kayıtları)
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **(headers or {})},
+        background=BackgroundTask(on_close),
+    )
+
+
+@app.post("/api/ask/stream")
+async def ask_ai_stream(request: AskRequest, current_user: User = Depends(get_current_user_optional)):
+    """/api/ask'in SSE karşılığı: kaynaklar aramadan hemen sonra, cevap sağlayıcı ürettikçe gelir."""
+    canned = ask_pre_router.route(request.question, request.language)
+    if canned is None:
+        await _check_daily_limit(current_user)
+    outcome: dict = {}
+
+    async def _persist():
+        # Hazır cevaplar (selamlaşma/netleştirme) geçmişe yazılmaz, /api/ask ile aynı
+        if canned is None and outcome.get('reply') is not None and current_user:
+            await _save_question_history(current_user.id, request.question, outcome['reply'])
+
+    return _sse_response(
+        _stream_ask_events(request.question, request.language, request.source_filter, outcome, canned=canned),
+        _persist,
+    )
 
 @app.get("/api/sources", response_model=List[SourceItem])
 def get_sources():
@@ -545,39 +758,34 @@ async def chat_with_session(request: ChatRequest, current_user: User = Depends(g
     # Mevcut ask_ai fonksiyonunu kullan
     ask_request = AskRequest(question=request.question, source_filter=request.source_filter, language=request.language or 'tr')
     
-    # Kullanıcı varsa normal ask_ai'yi çağır, yoksa session tabanlı işlem yap
+    # Kullanıcı varsa normal ask_ai'yi çağır (ön yönlendirme orada), yoksa session tabanlı işlem yap
+    canned = None if current_user else ask_pre_router.route(request.question, request.language)
     if current_user:
         response = await ask_ai(ask_request, current_user)
+    elif canned is not None:
+        # Selamlaşma veya çok kısa sorularda arama/LLM yapılmadan yönlendir
+        response = AskResponse(answer=canned.answer, sources=[])
     else:
         # Anonim kullanıcı için Ultimate RAG + akıllı fallback
-        # Tek kelime veya çok kısa sorularda yönlendir
-        if len([w for w in request.question.strip().split() if w]) < 2:
+        hadith_dicts = await search_hadiths_ultimate(
+            request.question, top_k=3, source_filter=request.source_filter, language=request.language
+        )
+        answer, used_fallback, response_type = await generate_ai_response_with_fallback(
+            request.question,
+            hadith_dicts,
+            True,
+            request.language or 'tr'
+        )
+        # Hadis bulunamadığında ayardan okunabilir bir fallback mesajı göster
+        if not hadith_dicts:
             lang = (request.language or 'tr').lower()
-            answer = (
-                "Sorunuzu daha açık yazar mısınız?" if lang == 'tr' else (
-                    "Please clarify your question." if lang == 'en' else "يرجى توضيح سؤالك."
+            default_msg = (
+                'Bu konuda güvenilir hadis kaynağı bulunamadı. Lütfen sorunuzu farklı şekilde ifade edin.' if lang == 'tr' else (
+                    'No reliable hadith source was found on this topic. Please try rephrasing your question.' if lang == 'en' else 'لم يتم العثور على مصدر حديث موثوق في هذا الموضوع. يرجى إعادة صياغة سؤالك.'
                 )
             )
-            sources = []
-            response = AskResponse(answer=answer, sources=sources)
-        else:
-            hadith_dicts = await search_hadiths_ultimate(request.question, top_k=3)
-            answer, used_fallback, response_type = generate_ai_response_with_fallback(
-                request.question,
-                hadith_dicts,
-                True,
-                request.language or 'tr'
-            )
-            # Hadis bulunamadığında ayardan okunabilir bir fallback mesajı göster
-            if not hadith_dicts:
-                lang = (request.language or 'tr').lower()
-                default_msg = (
-                    'Bu konuda güvenilir hadis kaynağı bulunamadı. Lütfen sorunuzu farklı şekilde ifade edin.' if lang == 'tr' else (
-                        'No reliable hadith source was found on this topic. Please try rephrasing your question.' if lang == 'en' else 'لم يتم العثور على مصدر حديث موثوق في هذا الموضوع. يرجى إعادة صياغة سؤالك.'
-                    )
-                )
-                answer = await get_setting('ai_no_hadith_message', default_msg)
-            # Kaynakları hazırla (UI için sade gösterim)
+            answer = await get_setting('ai_no_hadith_message', default_msg)
+        # Kaynakları hazırla (UI için sade gösterim)
         sources = []
         for h in hadith_dicts:
             base = f"{h['full_reference']} - {h['text'][:60]}" if h.get('full_reference') else f"{h.get('source','')} - {h.get('reference','')}"
@@ -632,10 +840,24 @@ async def chat_with_session(request: ChatRequest, current_user: User = Depends(g
 
             response = AskResponse(answer=answer, sources=sources)
     # Session'a mesajları kaydet
+    await _save_chat_messages(
+        request.session_token, current_user, request.question, response.answer,
+        [{"type": s.type, "name": s.name} for s in response.sources],
+    )
+    
+    return ChatResponse(
+        answer=response.answer,
+        sources=response.sources,
+        session_token=request.session_token
+    )
+
+
+async def _save_chat_messages(session_token: str, current_user: Optional[User], question: str, answer: str, sources: List[dict]) -> None:
+    """Kullanıcı sorusunu ve AI cevabını session'a kaydeder; session yoksa oluşturur."""
     async with AsyncSessionLocal() as session:
         # Session'ı bul veya oluştur
         result = await session.execute(
-            select(ChatSession).where(ChatSession.session_token == request.session_token)
+            select(ChatSession).where(ChatSession.session_token == session_token)
         )
         chat_session = result.scalar_one_or_none()
         
@@ -643,7 +865,7 @@ async def chat_with_session(request: ChatRequest, current_user: User = Depends(g
             # Varsayılan autoincrement ile oluştur
             chat_session = ChatSession(
                 user_id=current_user.id if current_user else None,
-                session_token=request.session_token
+                session_token=session_token
             )
             session.add(chat_session)
             await session.commit()
@@ -653,7 +875,7 @@ async def chat_with_session(request: ChatRequest, current_user: User = Depends(g
         user_message = ChatMessage(
             session_id=chat_session.id,
             message_type="user",
-            content=request.question
+            content=question
         )
         session.add(user_message)
         
@@ -661,26 +883,63 @@ async def chat_with_session(request: ChatRequest, current_user: User = Depends(g
         ai_message = ChatMessage(
             session_id=chat_session.id,
             message_type="assistant",
-            content=response.answer,
-            sources=json.dumps([{"type": s.type, "name": s.name} for s in response.sources])
+            content=answer,
+            sources=json.dumps(sources)
         )
         session.add(ai_message)
         await session.commit()
-    
-    return ChatResponse(
-        answer=response.answer,
-        sources=response.sources,
-        session_token=request.session_token
+
+
+@app.post("/api/chat/stream")
+async def chat_with_session_stream(request: ChatRequest, current_user: User = Depends(get_current_user_optional)):
+    """/api/chat'in SSE karşılığı; mesajlar (ve giriş yapmış kullanıcının geçmişi) akış kapanınca kaydedilir."""
+    session_token = request.session_token or str(uuid.uuid4())
+    canned = ask_pre_router.route(request.question, request.language)
+    if canned is None:
+        await _check_daily_limit(current_user)
+    outcome: dict = {}
+
+    async def _persist():
+        reply = outcome.get('reply')
+        if reply is None:
+            return
+        # Sohbet dökümü eksiksiz kalsın diye hazır cevaplar da session'a yazılır; geçmişe yazılmaz
+        if current_user and canned is None:
+            await _save_question_history(current_user.id, request.question, reply)
+        try:
+            await _save_chat_messages(session_token, current_user, request.question, reply.answer, reply.sources)
+        except Exception:
+            logging.exception("Sohbet mesajı kaydı HATASI")
+
+    return _sse_response(
+        _stream_ask_events(
+            request.question, request.language or 'tr', request.source_filter, outcome,
+            done_extra={'session_token': session_token}, canned=canned,
+        ),
+        _persist,
+        headers={"X-Session-Token": session_token},
     )
 
 @app.get("/api/hadith_search")
-async def hadith_search(q: str = Query(..., description="Aranacak metin"), top_k: int = 3) -> Any:
-    results = await search_hadiths(q, top_k=top_k)
+async def hadith_search(
+    q: str = Query(..., description="Aranacak metin"),
+    top_k: int = 3,
+    source: Optional[str] = Query(None, description="Kaynak filtresi (virgülle birden fazla: Buhari,Müslim)"),
+    category: Optional[str] = Query(None, description="Kategori filtresi"),
+    language: Optional[str] = Query(None, description="Dil filtresi (tr, en, ar)"),
+    authenticity: Optional[str] = Query(None, description="Sahihlik filtresi (sahih, hasen...)"),
+    query_language: Optional[str] = Query(None, description="Sorgu dili (tr, en, ar); boşsa tespit edilir"),
+    language_mode: Optional[str] = Query(None, description="route: sorgu dilinin indeksi, all: tüm dil indeksleri"),
+) -> Any:
+    filters = parse_filters(source=source, category=category, language=language, authenticity=authenticity)
+    results = await search_hadiths(
+        q, top_k=top_k, filters=filters, language=query_language, language_mode=language_mode,
+    )
     def _clean_val(v: str) -> str:
         v = (v or '').strip()
         return '' if not v or v.lower() == 'none' else v
     out = []
-    for h in results:
+    for h, score in results:
         src = _clean_val(getattr(h, 'source', None))
         kitap = _clean_val(getattr(h, 'kitap', None))
         bab = _clean_val(getattr(h, 'bab', None))
@@ -698,7 +957,8 @@ async def hadith_search(q: str = Query(..., description="Aranacak metin"), top_k
             "source": src,
             "reference": ref,
             "category": getattr(h, 'category', None),
-            "language": getattr(h, 'language', None)
+            "language": getattr(h, 'language', None),
+            "score": score
         })
     return out
 
@@ -1153,6 +1413,7 @@ async def upload_hadiths(file: UploadFile = File(...), current_user: User = Depe
 
         skipped = []
         eklenen = 0
+        added_hadiths = []
         async with AsyncSessionLocal() as session:
             for idx, item in enumerate(items, 1):
                 try:
@@ -1185,11 +1446,19 @@ async def upload_hadiths(file: UploadFile = File(...), current_user: User = Depe
                         language=language,
                     )
                     session.add(hadith)
+                    added_hadiths.append(hadith)
                     eklenen += 1
                 except Exception as e:
                     print(f"ATLANIYOR (satır {idx}): HATA: {e}\n{traceback.format_exc()}")
                     skipped.append({"row": idx, "reason": str(e)})
             await session.commit()
+        # Metin indeksi yeniden kurulmadan güncellenir
+        hadith_bm25.add_hadiths(added_hadiths)
+        hadith_filters.add_hadiths(added_hadiths)
+        # Daha önce embed edilmiş metinler sağlayıcıya gitmeden doldurulur
+        await apply_cached_embeddings(added_hadiths)
+        # Eski hadis kümesiyle üretilmiş cevaplar artık geçersiz
+        await answer_cache.invalidate()
         print(f'JSON yükleme tamamlandı. Eklenen: {eklenen}, Atlanan: {len(skipped)}')
         return {"status": "ok", "added": eklenen, "skipped": len(skipped), "skipped_details": skipped}
 
@@ -1251,8 +1520,9 @@ async def upload_hadiths(file: UploadFile = File(...), current_user: User = Depe
                     reference=row.get('reference'),
                     category=row.get('category'),
                     language=row.get('language'),
-                    embedding=row.get('embedding'),
                     created_at=created_at,
+                    # CSV'deki virgüllü embedding, embedding_model sütunu da varsa binary formata çevrilerek saklanır
+                    **supplied_embedding_columns(row.get('embedding'), row.get('embedding_model')),
                 )
                 session.add(hadith)
                 new_hadiths.append(hadith)
@@ -1263,22 +1533,83 @@ async def upload_hadiths(file: UploadFile = File(...), current_user: User = Depe
                 skipped.append({"row": idx, "reason": str(e)})
                 atlanan += 1
         await session.commit()
+    hadith_bm25.add_hadiths(new_hadiths)
+    hadith_filters.add_hadiths(new_hadiths)
+    await apply_cached_embeddings(new_hadiths)
+    await answer_cache.invalidate()
     print(f'CSV yükleme tamamlandı. Eklenen: {eklenen}, Atlanan: {atlanan}')
     return {"status": "ok", "added": len(new_hadiths), "skipped": len(skipped), "skipped_details": skipped}
 
 @app.post("/admin/update_embeddings")
 async def update_embeddings(current_user: User = Depends(get_current_user)):
+    """Her embedding dili için backfill işini kuyruğa alır ve iş id'lerini hemen döner (ilerleme: /admin/jobs/{id})."""
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Yetkisiz erişim")
-    from embedding_utils import update_hadith_embeddings
     try:
-        updated_count = await update_hadith_embeddings()
-        logging.info(f"Embedding güncelleme tamamlandı: {updated_count} kayıt güncellendi")
-        return {"status": "ok", "updated_count": updated_count}
+        jobs = await embedding_jobs.enqueue_languages()
+        logging.info(f"Embedding güncelleme işleri kuyruğa alındı: {[job.id for job in jobs]}")
+        return {"status": "queued", "job_id": jobs[0].id, "jobs": {job.language: job.id for job in jobs}}
     except Exception as e:
         logging.exception("Admin embedding güncelleme HATASI")
         raise HTTPException(status_code=500, detail="Embedding güncelleme hatası")
 
+@app.get("/admin/jobs/{job_id}")
+async def get_job_status(job_id: int, current_user: User = Depends(get_current_user)):
+    """Arka plan işinin ilerlemesi: işlenen/başarısız/kalan, hız ve tahmini bitiş süresi."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Yetkisiz erişim")
+    job_status = await embedding_jobs.status(job_id)
+    if job_status is None:
+        raise HTTPException(status_code=404, detail="İş bulunamadı")
+    return job_status
+
+@app.get("/admin/embedding_models")
+async def embedding_models_status(current_user: User = Depends(get_current_user)):
+    """Sunulan/hedef embedding modeli, model başına satır sayısı ve hedef modelin kapsaması."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Yetkisiz erişim")
+    return await embedding_versions.status()
+
+@app.post("/admin/embedding_models/reembed")
+async def start_embedding_reembed(model: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    """Yeni model için yeniden embedding işini başlatır; sorgular geçişe kadar eski modelle cevaplanır."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Yetkisiz erişim")
+    try:
+        jobs = await embedding_versions.start_reembed(model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "queued", "model": jobs[0].model, "jobs": {job.language: job.id for job in jobs}}
+
+@app.post("/admin/embedding_models/cutover")
+async def cutover_embedding_model(model: Optional[str] = None, force: bool = False, current_user: User = Depends(get_current_user)):
+    """Kapsama %100 ise sunulan modeli yeni modele atomik olarak geçirir (force ile eksik kapsama kabul edilir)."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Yetkisiz erişim")
+    model = model or embedding_versions.target_model()
+    if not model:
+        raise HTTPException(status_code=400, detail="Hedef model belirtilmedi")
+    try:
+        return await embedding_versions.cutover(model, force=force)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/admin/rebuild_embedding_snapshot")
+async def rebuild_embedding_snapshot(current_user: User = Depends(get_current_user)):
+    """Embedding snapshot'ını DB'den yeniden yazar ve CURRENT işaretçisini atomik olarak değiştirir.
+
+    Diğer worker'lar yeni sürümü EMBEDDING_SNAPSHOT_CHECK_SECONDS içinde mmap ile açar.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Yetkisiz erişim")
+    try:
+        manifest = await hadith_index.rebuild_snapshot()
+        logging.info(f"Embedding snapshot yeniden oluşturuldu: {manifest.get('version')}")
+        return {"status": "ok", "manifest": manifest}
+    except Exception:
+        logging.exception("Embedding snapshot oluşturma HATASI")
+        raise HTTPException(status_code=500, detail="Embedding snapshot oluşturma hatası")
+
 @app.get("/admin/embedding_status")
 async def embedding_status(current_user: User = Depends(get_current_user)):
     if not current_user.is_admin:
@@ -1286,14 +1617,102 @@ async def embedding_status(current_user: User = Depends(get_current_user)):
     from sqlalchemy import func
     async with AsyncSessionLocal() as session:
         total = (await session.execute(select(func.count(Hadith.id)))).scalar_one()
-        with_emb = (await session.execute(select(func.count(Hadith.id)).where(Hadith.embedding.isnot(None)))).scalar_one()
+        binary = (await session.execute(select(func.count(Hadith.id)).where(Hadith.embedding_vec.isnot(None)))).scalar_one()
+        text_only = (await session.execute(
+            select(func.count(Hadith.id)).where(
+                Hadith.embedding_vec.is_(None) & Hadith.embedding.isnot(None) & (Hadith.embedding != '')
+            )
+        )).scalar_one()
+        model_rows = (await session.execute(
+            select(Hadith.embedding_model, Hadith.embedding_dim, func.count(Hadith.id))
+            .where(Hadith.embedding_vec.isnot(None))
+            .group_by(Hadith.embedding_model, Hadith.embedding_dim)
+        )).all()
+        with_emb = binary + text_only
         without_emb = total - with_emb
         return {
             "total_hadiths": total,
             "with_embedding": with_emb,
             "without_embedding": without_emb,
+            "by_format": {
+                "binary_float32": binary,
+                "text": text_only,
+                "none": without_emb,
+            },
+            "by_model": [
+                {"model": m or "unknown", "dim": d, "count": c} for m, d, c in model_rows
+            ],
+            "index": hadith_index.stats(),
+            "language_indexes": {
+                lang: index.stats() for lang, index in language_indexes.items() if index is not hadith_index
+            },
+            "lexical_index": hadith_bm25.stats(),
+            "filter_index": hadith_filters.stats(),
+            "query_cache": query_embedding_cache.stats(),
+            "content_cache": embedding_content_cache.stats(),
+            "providers": embedding_providers.stats(),
+            "rate_limits": outbound_scheduler.stats(),
         }
 
+@app.get("/admin/search_metrics")
+async def search_metrics(current_user: User = Depends(get_current_user)):
+    """Hadis aramasının aşama başına (embedding, vektör, metin, birleştirme) gecikme istatistikleri."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Yetkisiz erişim")
+    return {
+        "mode": HADITH_SEARCH_MODE,
+        "lexical_engine": HADITH_LEXICAL_ENGINE,
+        "fusion": HADITH_FUSION_METHOD,
+        "stages": search_latency.snapshot(),
+        "answer_cache": answer_cache.stats(),
+        "llm_clients": llm_clients.stats(),
+        "llm_hedging": llm_hedging.stats(),
+        "single_flight": ask_single_flight.stats(),
+        "pre_router": ask_pre_router.stats(),
+        "ask_stream": ask_stream_latency.snapshot(),
+    }
+
+@app.post("/admin/answer_cache/invalidate")
+async def invalidate_answer_cache(current_user: User = Depends(get_current_user)):
+    """Anlamsal cevap önbelleğini tüm worker'larda temizler (ör. prompt/model değişikliğinden sonra)."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Yetkisiz erişim")
+    await answer_cache.invalidate()
+    return {"status": "ok", "answer_cache": answer_cache.stats()}
+
+@app.get("/admin/provider_health")
+async def provider_health(current_user: User = Depends(get_current_user)):
+    """LLM ve embedding sağlayıcılarının devre kesici durumu, hata/gecikme oranları ve limitleri."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Yetkisiz erişim")
+    latency = llm_hedging.latency.snapshot()
+    http = llm_clients.stats()
+    limits = outbound_scheduler.stats()
+    llm = {
+        name: {
+            "circuit": circuit_breakers.get(name).snapshot(),
+            "first_token_latency": latency.get(f"{name}/stream"),
+            "completion_latency": latency.get(f"{name}/complete"),
+            "http": http.get(name),
+            "rate_limit": limits.get(name),
+        }
+        for name in LLM_PROVIDERS
+    }
+    return {"llm": llm, "embedding": embedding_providers.stats()["providers"]}
+
+@app.get("/admin/ann_recall")
+async def ann_recall(nprobe: str = "1,2,4,8,16,32", top_k: int = 10, sample: int = 200, current_user: User = Depends(get_current_user)):
+    """ANN motorunun tam aramaya göre nprobe başına recall@k ve gecikme raporu."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Yetkisiz erişim")
+    try:
+        nprobe_values = [int(x) for x in nprobe.split(',') if x.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Geçersiz nprobe listesi")
+    await hadith_index.ensure_loaded()
+    # Rapor CPU yoğun; event loop'u bloklamamak için thread'de çalıştır
+    return await asyncio.to_thread(hadith_index.recall_report, nprobe_values, top_k, sample)
+
 @app.post("/admin/import_tr_json")
 async def admin_import_tr_json(current_user: User = Depends(get_current_user)):
     """hadiths_tr.json dosyasını veritabanına import eder."""
@@ -1304,6 +1723,7 @@ async def admin_import_tr_json(current_user: User = Depends(get_current_user)):
         tr_path = os.path.join(backend_dir, "hadiths_tr.json")
         from import_hadiths import import_hadiths
         inserted = await import_hadiths(tr_path)
+        await answer_cache.invalidate()
         return {"status": "ok", "inserted": inserted}
     except Exception as e:
         logging.exception("Admin TR JSON import HATASI")
@@ -1321,6 +1741,7 @@ async def admin_import_ar_json(current_user: User = Depends(get_current_user)):
             raise HTTPException(status_code=404, detail="AR JSON bulunamadı")
         from import_hadiths import _merge_language_json
         count = await _merge_language_json(ar_path, lang='ar')
+        await answer_cache.invalidate()
         return {"status": "ok", "processed": count}
     except HTTPException:
         raise
@@ -1340,6 +1761,7 @@ async def admin_import_en_json(current_user: User = Depends(get_current_user)):
             raise HTTPException(status_code=404, detail="EN JSON bulunamadı")
         from import_hadiths import _merge_language_json
         count = await _merge_language_json(en_path, lang='en')
+        await answer_cache.invalidate()
         return {"status": "ok", "processed": count}
     except HTTPException:
         raise
@@ -1359,6 +1781,7 @@ async def admin_import_all_json(current_user: User = Depends(get_current_user)):
         en_path = os.path.join(backend_dir, "hadiths_en.json")
         from import_hadiths import import_hadiths_all
         processed = await import_hadiths_all(tr_path, ar_path=ar_path, en_path=en_path)
+        await answer_cache.invalidate()
         return {"status": "ok", "processed": processed}
     except Exception:
         logging.exception("Admin ALL JSON import HATASI")
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, Float, DateTime, func, Boolean, UniqueConstraint
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, Float, DateTime, func, Boolean, UniqueConstraint, LargeBinary, Computed, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from database import Base
 
 class User(Base):
@@ -72,6 +73,16 @@ class UserJourneyProgress(Base):
     completed_step = Column(Integer, default=0)  # Kaç adım tamamlandı
     completed_at = Column(DateTime, nullable=True)
 
+# Hadis tam metin vektörü: Türkçe metin A, İngilizce metin ve kaynak B, Arapça metin ve referans C ağırlıklı
+HADITH_SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('turkish'::regconfig, coalesce(turkish_text, '')), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(kitap, '') || ' ' || coalesce(bab, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(english_text, '')), 'B') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(source, '')), 'B') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(arabic_text, '')), 'C') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(reference, '')), 'C')"
+)
+
 class Hadith(Base):
     __tablename__ = 'hadiths'
     id = Column(Integer, primary_key=True, index=True)
@@ -92,8 +103,17 @@ class Hadith(Base):
     reference = Column(String, nullable=True)          # Kitap, bab, hadis no vs.
     category = Column(String, nullable=True)           # Konu/kategori (örn. Namaz, Oruç)
     language = Column(String, default='tr')            # Dil
-    embedding = Column(Text, nullable=True)            # Vektör embedding (opsiyonel)
+    embedding = Column(Text, nullable=True)            # Eski format: virgülle ayrılmış embedding (opsiyonel)
+    embedding_vec = Column(LargeBinary, nullable=True) # float32 ham bayt embedding (little-endian)
+    embedding_dim = Column(Integer, nullable=True)     # Embedding boyutu
+    embedding_model = Column(String, nullable=True)    # Embedding'i üreten model adı
     created_at = Column(DateTime, server_default=func.now())
+    # PostgreSQL tam metin araması için üretilen (generated) sütun; varsayılan sorgularda yüklenmez
+    search_vector = deferred(Column(TSVECTOR, Computed(HADITH_SEARCH_VECTOR_SQL, persisted=True)))
+
+    __table_args__ = (
+        Index('ix_hadiths_search_vector', 'search_vector', postgresql_using='gin'),
+    )
 
 class ChatSession(Base):
     __tablename__ = 'chat_sessions'
@@ -225,3 +245,46 @@ class Reciter(Base):
     id = Column(String, primary_key=True, index=True)
     name = Column(String, nullable=False)
     description = Column(Text, nullable=True)
+
+class BackgroundJob(Base):
+    """Uzun süren arka plan işleri (ör. embedding backfill) ve kaldığı yer bilgisi."""
+    __tablename__ = 'background_jobs'
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False, index=True)      # İş türü (örn. 'embedding_backfill')
+    model = Column(String, nullable=True)                  # Yeniden embedding işinde hedef model
+    language = Column(String(8), nullable=False, default='tr', server_default='tr')  # Embed edilen metnin dili
+    status = Column(String, nullable=False, default='pending')  # 'pending' | 'running' | 'completed' | 'failed'
+    last_id = Column(Integer, nullable=False, default=0)   # Checkpoint: bu id'ye kadar işlendi
+    total = Column(Integer, nullable=True)                 # Başlangıçta işlenecek satır sayısı
+    processed = Column(Integer, nullable=False, default=0) # Başarıyla işlenen satır
+    failed = Column(Integer, nullable=False, default=0)    # Başarısız satır
+    run_processed = Column(Integer, nullable=False, default=0)  # Son başlatmada hazır olan (processed + failed); hız hesabı için
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    started_at = Column(DateTime, nullable=True)           # Son başlatma/devam zamanı
+    heartbeat_at = Column(DateTime, nullable=True)         # Çalışan worker'ın son canlılık sinyali (checkpoint veya zamanlayıcı)
+    finished_at = Column(DateTime, nullable=True)
+
+class EmbeddingCache(Base):
+    """Metin içeriğine göre embedding önbelleği: aynı metin aynı modelle bir kez embed edilir."""
+    __tablename__ = 'embedding_cache'
+    text_hash = Column(String(64), primary_key=True)       # Normalize metnin sha256 özeti (hex)
+    model = Column(String, primary_key=True)               # Embedding'i üreten model adı
+    dim = Column(Integer, primary_key=True)                # Embedding boyutu
+    embedding_vec = Column(LargeBinary, nullable=False)    # float32 ham bayt embedding (little-endian)
+    created_at = Column(DateTime, server_default=func.now())
+
+class HadithEmbedding(Base):
+    """Model sürümü ve metin dili başına hadis embedding'leri; yeni modele geçişte eski model sunulmaya devam eder.
+
+    Hadith.embedding_vec sunulan (serving) modelin Türkçe kopyasıdır; geçiş tamamlanınca buradan atomik olarak güncellenir.
+    İngilizce/Arapça metinlerin embedding'leri yalnızca bu tabloda tutulur.
+    """
+    __tablename__ = 'hadith_embeddings'
+    hadith_id = Column(Integer, ForeignKey('hadiths.id', ondelete='CASCADE'), primary_key=True)
+    model = Column(String, primary_key=True)               # Embedding'i üreten model adı
+    language = Column(String(8), primary_key=True, default='tr', server_default='tr')  # 'tr' | 'en' | 'ar'
+    dim = Column(Integer, nullable=False)                  # Embedding boyutu
+    embedding_vec = Column(LargeBinary, nullable=False)    # float32 ham bayt embedding (little-endian)
+    created_at = Column(DateTime, server_default=func.now())
+    __table_args__ = (Index('ix_hadith_embeddings_model_language_hadith', 'model', 'language', 'hadith_id'),)
@@ -0,0 +1,278 @@
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+import httpx
+import requests
+
+T = TypeVar('T')
+
+# Öncelikler: canlı soru trafiği arka plan işlerinden (embedding backfill) önce sıraya alınır
+FOREGROUND = 0
+BACKGROUND = 1
+
+# Sağlayıcı başına dakikalık istek/token limitleri; 0 limitsiz demektir (örn. RATE_LIMIT_OPENAI_RPM=500)
+RATE_LIMITED_PROVIDERS = ('openai', 'claude', 'gemini')
+PROVIDER_RATE_LIMITS: Dict[str, Tuple[int, int]] = {
+    name: (
+        int(os.getenv(f'RATE_LIMIT_{name.upper()}_RPM') or 0),
+        int(os.getenv(f'RATE_LIMIT_{name.upper()}_TPM') or 0),
+    )
+    for name in RATE_LIMITED_PROVIDERS
+}
+# Arka plan işleri kovanın bu oranını canlı trafiğe bırakır
+OUTBOUND_FOREGROUND_RESERVE = float(os.getenv('OUTBOUND_FOREGROUND_RESERVE') or 0.2)
+# Yeniden deneme: tam jitter'lı üstel bekleme; Retry-After başlığı varsa ona uyulur
+OUTBOUND_MAX_RETRIES = int(os.getenv('OUTBOUND_MAX_RETRIES') or 5)
+OUTBOUND_FOREGROUND_RETRIES = int(os.getenv('OUTBOUND_FOREGROUND_RETRIES') or 1)
+OUTBOUND_BACKOFF_BASE_MS = float(os.getenv('OUTBOUND_BACKOFF_BASE_MS') or 500)
+OUTBOUND_BACKOFF_MAX_SECONDS = float(os.getenv('OUTBOUND_BACKOFF_MAX_SECONDS') or 60)
+# Canlı istek limit/Retry-After için en fazla bu kadar bekler; fazlasında hata döner (yedek modele düşülür)
+OUTBOUND_FOREGROUND_MAX_WAIT_SECONDS = float(os.getenv('OUTBOUND_FOREGROUND_MAX_WAIT_SECONDS') or 5)
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+_POLL_SECONDS = 0.05
+
+
+class RateLimitedError(Exception):
+    """Sağlayıcı limiti nedeniyle istek izin verilen süre içinde gönderilemedi."""
+
+
+def estimate_tokens(*texts: str) -> int:
+    """Kaba token tahmini (~4 karakter/token); kovadan düşülecek miktar için yeterli."""
+    return sum(len(t or '') for t in texts) // 4 + 1
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    """Retry-After başlığı (saniye veya HTTP tarihi); yoksa/okunamazsa None."""
+    value = (headers or {}).get('Retry-After') or (headers or {}).get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def backoff_delay(attempt: int, base_ms: float = OUTBOUND_BACKOFF_BASE_MS, cap: float = OUTBOUND_BACKOFF_MAX_SECONDS) -> float:
+    """Tam jitter'lı üstel bekleme (sn): [0, min(cap, base * 2^attempt)] aralığında rastgele."""
+    return random.uniform(0, min(cap, base_ms / 1000 * (2 ** attempt)))
+
+
+def classify_error(exc: BaseException) -> Tuple[bool, Optional[int], Optional[float]]:
+    """(yeniden denenebilir mi, HTTP durum kodu, Retry-After sn) üçlüsü."""
+    response = None
+    if isinstance(exc, httpx.HTTPStatusError):
+        response = exc.response
+    elif isinstance(exc, requests.HTTPError):
+        response = exc.response
+    if response is not None:
+        status = response.status_code
+        return status in RETRYABLE_STATUS, status, retry_after_seconds(response.headers)
+    if isinstance(exc, (httpx.TransportError, requests.ConnectionError, requests.Timeout)):
+        return True, None, None
+    return False, None, None
+
+
+class TokenBucket:
+    """Dakikalık kapasiteyle dolan kova; kapasite 0 ise limitsiz."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        if self.capacity <= 0:
+            return
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, reserve: float = 0.0) -> float:
+        """amount alınabilmesi için beklenecek süre; kovanın `reserve` oranı dokunulmaz kalır."""
+        if self.capacity <= 0:
+            return 0.0
+        amount = min(amount, self.capacity * (1.0 - reserve))
+        need = amount + self.capacity * reserve
+        if self.level >= need:
+            return 0.0
+        return (need - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.capacity > 0:
+            self.level -= min(amount, self.capacity)
+
+
+class ProviderLimiter:
+    """Bir sağlayıcının istek ve token kovaları, 429 sonrası ortak duraklama ve öncelik sırası.
+
+    Bekleyen canlı istek varken arka plan istekleri kovadan alamaz; ayrıca kovanın
+    OUTBOUND_FOREGROUND_RESERVE oranı her zaman canlı trafiğe bırakılır.
+    """
+
+    def __init__(self, name: str, rpm: int = 0, tpm: int = 0):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._foreground_waiting = 0
+        self.granted = {FOREGROUND: 0, BACKGROUND: 0}
+        self.wait_ms = {FOREGROUND: 0.0, BACKGROUND: 0.0}
+        self.throttled = 0
+        self.retries = 0
+        self.gave_up = 0
+
+    def pause(self, seconds: float) -> None:
+        """Sağlayıcı 429 döndüğünde tüm çağıranlar bu süre boyunca bekler."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _try_acquire(self, tokens: int, priority: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            if priority != FOREGROUND and self._foreground_waiting:
+                return _POLL_SECONDS
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            reserve = OUTBOUND_FOREGROUND_RESERVE if priority != FOREGROUND else 0.0
+            wait = max(self.requests.wait_time(1, reserve), self.tokens.wait_time(tokens, reserve))
+            if wait > 0:
+                return wait
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            return 0.0
+
+    def _start_wait(self, priority: int, delta: int) -> None:
+        if priority == FOREGROUND:
+            with self._lock:
+                self._foreground_waiting += delta
+
+    def _granted(self, priority: int, waited: float) -> None:
+        with self._lock:
+            self.granted[priority] += 1
+            self.wait_ms[priority] += waited * 1000
+
+    def _check_timeout(self, started: float, wait: float, timeout: Optional[float]) -> None:
+        if timeout is not None and time.monotonic() - started + wait > timeout:
+            with self._lock:
+                self.gave_up += 1
+            raise RateLimitedError(f"{self.name} limiti: {wait:.1f} sn beklemek gerekiyor")
+
+    async def acquire(self, tokens: int = 0, priority: int = FOREGROUND, timeout: Optional[float] = None) -> float:
+        """Kovadan izin alınana kadar bekler; beklenen süreyi (sn) döner."""
+        started = time.monotonic()
+        wait = self._try_acquire(tokens, priority)
+        if not wait:
+            self._granted(priority, 0.0)
+            return 0.0
+        self._start_wait(priority, 1)
+        try:
+            while wait:
+                self._check_timeout(started, wait, timeout)
+                await asyncio.sleep(min(wait, 1.0))
+                wait = self._try_acquire(tokens, priority)
+        finally:
+            self._start_wait(priority, -1)
+        waited = time.monotonic() - started
+        self._granted(priority, waited)
+        return waited
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'rpm': int(self.requests.capacity),
+                'tpm': int(self.tokens.capacity),
+                'granted': {'foreground': self.granted[FOREGROUND], 'background': self.granted[BACKGROUND]},
+                'avg_wait_ms': {
+                    'foreground': round(self.wait_ms[FOREGROUND] / max(self.granted[FOREGROUND], 1), 2),
+                    'background': round(self.wait_ms[BACKGROUND] / max(self.granted[BACKGROUND], 1), 2),
+                },
+                'paused_for_seconds': round(max(0.0, self._paused_until - time.monotonic()), 2),
+                'throttled': self.throttled,
+                'retries': self.retries,
+                'gave_up': self.gave_up,
+            }
+
+
+class OutboundScheduler:
+    """Dış sağlayıcı çağrıları için ortak zamanlayıcı: limit, öncelik ve yeniden deneme.
+
+    429 alındığında sağlayıcının tüm çağıranları Retry-After (yoksa jitter'lı bekleme) kadar
+    duraklatılır; 5xx ve bağlantı hatalarında yalnızca ilgili çağrı beklenip yeniden denenir.
+    Canlı istekler kısa bekler ve az denenir; aşınca hata fırlatıp yedek sağlayıcıya bırakır.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[int, int]]] = None):
+        self.limits = dict(PROVIDER_RATE_LIMITS if limits is None else limits)
+        self._limiters: Dict[str, ProviderLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, name: str) -> ProviderLimiter:
+        with self._lock:
+            limiter = self._limiters.get(name)
+            if limiter is None:
+                rpm, tpm = self.limits.get(name, (0, 0))
+                limiter = self._limiters[name] = ProviderLimiter(name, rpm, tpm)
+            return limiter
+
+    def _retry_delay(self, limiter: ProviderLimiter, exc: BaseException, attempt: int, priority: int) -> Optional[float]:
+        """Yeniden denenecekse beklenecek süre; denenmeyecekse None."""
+        retryable, status, retry_after = classify_error(exc)
+        if not retryable:
+            return None
+        delay = retry_after if retry_after is not None else backoff_delay(attempt)
+        if status == 429:
+            # Limit sağlayıcı genelinde: bu çağrı vazgeçse de diğer çağıranlar aynı süre bekler
+            with limiter._lock:
+                limiter.throttled += 1
+            limiter.pause(delay)
+        max_retries = OUTBOUND_FOREGROUND_RETRIES if priority == FOREGROUND else OUTBOUND_MAX_RETRIES
+        if attempt >= max_retries or (priority == FOREGROUND and delay > OUTBOUND_FOREGROUND_MAX_WAIT_SECONDS):
+            return None
+        with limiter._lock:
+            limiter.retries += 1
+        # 429'da bekleme duraklama üzerinden acquire içinde yapılır
+        return 0.0 if status == 429 else delay
+
+    def _timeout(self, priority: int) -> Optional[float]:
+        return OUTBOUND_FOREGROUND_MAX_WAIT_SECONDS if priority == FOREGROUND else None
+
+    async def call(self, name: str, fn: Callable[[], Awaitable[T]], tokens: int = 0, priority: int = FOREGROUND) -> T:
+        limiter = self.limiter(name)
+        attempt = 0
+        while True:
+            await limiter.acquire(tokens, priority, self._timeout(priority))
+            try:
+                return await fn()
+            except Exception as e:
+                delay = self._retry_delay(limiter, e, attempt, priority)
+                if delay is None:
+                    raise
+                print(f"[OUTBOUND] {name} yeniden denenecek ({attempt + 1}): {e}")
+                attempt += 1
+                if delay:
+                    await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {name: limiter.stats() for name, limiter in sorted(limiters.items())}
+
+
+# Global instance
+outbound_scheduler = OutboundScheduler()
@@ -0,0 +1,135 @@
+import os
+import threading
+from typing import Dict, Optional
+
+from answer_cache import CachedAnswer
+
+try:
+    from ai_models.hadis_model import HADIS_KEYWORDS, RELIGIOUS_TERMS
+except Exception:
+    HADIS_KEYWORDS, RELIGIOUS_TERMS = (), ()
+
+# Selamlaşma ve tek kelimelik sorular arama/LLM'e gitmeden hazır cevapla döner
+PRE_ROUTER_ENABLED = (os.getenv('PRE_ROUTER_ENABLED') or 'true').strip().lower() in {'1', 'true', 'yes'}
+# Bu sayıdan az kelimeli sorular netleştirme cevabı alır
+PRE_ROUTER_MIN_WORDS = int(os.getenv('PRE_ROUTER_MIN_WORDS') or 2)
+
+# Dil başına selamlaşma kalıpları (normalize edilmiş: küçük harf, tek boşluk, sondaki noktalama yok)
+GREETINGS: Dict[str, frozenset] = {
+    'tr': frozenset({
+        'selam', 'merhaba', 'merhabalar', 'sa', 'selamünaleyküm', 'selamun aleyküm', 'selamün aleyküm',
+        'selamun aleykum', 'selamın aleyküm', 'esselamü aleyküm', 'aleyküm selam', 'günaydın', 'iyi akşamlar',
+    }),
+    'en': frozenset({
+        'hello', 'hi', 'hey', 'salam', 'salaam', 'assalamu alaikum', 'asalamu alaikum',
+        'good morning', 'good evening',
+    }),
+    'ar': frozenset({
+        'السلام عليكم', 'السلام عليكم ورحمة الله', 'السلام عليكم ورحمة الله وبركاته', 'مرحبا', 'أهلا', 'اهلا',
+    }),
+}
+# Selamlaşma hangi dilde yazıldıysa yazılsın tanınır; cevap istek dilinde verilir
+_ALL_GREETINGS = frozenset().union(*GREETINGS.values())
+# HadisAI'nin hadis/dini terim listeleri: tek kelimelik soru bir konu adıysa konuya özel netleştirme istenir
+_TOPIC_TERMS = frozenset(HADIS_KEYWORDS) | frozenset(RELIGIOUS_TERMS)
+_TRAILING_PUNCTUATION = ' \t\n.,;:!?¿¡؟،…'
+
+GREETING_REPLIES = {
+    'tr': "Merhaba! Size nasıl yardımcı olabilirim?",
+    'en': "Hello! How can I help you?",
+    'ar': "مرحبًا! كيف يمكنني مساعدتك؟",
+}
+CLARIFY_REPLIES = {
+    'tr': "Sorunuzu daha açık yazar mısınız?",
+    'en': "Please clarify your question.",
+    'ar': "يرجى توضيح سؤالك.",
+}
+TOPIC_CLARIFY_REPLIES = {
+    'tr': "“{topic}” hakkında neyi öğrenmek istersiniz? Sorunuzu daha açık yazar mısınız?",
+    'en': "What would you like to know about “{topic}”? Please clarify your question.",
+    'ar': "ماذا تريد أن تعرف عن «{topic}»؟ يرجى توضيح سؤالك.",
+}
+
+
+def reply_language(language: Optional[str]) -> str:
+    lang = (language or 'tr').strip().lower()
+    return lang if lang in CLARIFY_REPLIES else 'tr'
+
+
+def normalize_question(question: str) -> str:
+    # casefold 'İ'yi 'i̇' (noktalı birleşik) yapar; Türkçe büyük İ düz 'i' sayılır
+    return ' '.join((question or '').replace('İ', 'i').casefold().split()).strip(_TRAILING_PUNCTUATION)
+
+
+class AskPreRouter:
+    """Soru cevaplama hattının önündeki ucuz sınıflandırma aşaması.
+
+    Selamlaşmalar (dil başına önceden derlenmiş kümeler) ve PRE_ROUTER_MIN_WORDS'ten kısa sorular
+    G/Ç yapmadan hazır cevap alır; sorgu embedding'i, vektör/metin araması ve LLM tamamlaması
+    yapılmaz. Tek kelime HadisAI'nin konu terimlerinden biriyse netleştirme o konuya göre sorulur.
+    Atlanan ücretli çağrılar (embedding, LLM) sayılır.
+    """
+
+    def __init__(self, enabled: bool = PRE_ROUTER_ENABLED, min_words: int = PRE_ROUTER_MIN_WORDS):
+        self.enabled = enabled
+        self.min_words = min_words
+        self.checked = 0
+        self.routes: Dict[str, int] = {}
+        self.saved_embedding_calls = 0
+        self.saved_llm_calls = 0
+        self._lock = threading.Lock()
+
+    def classify(self, question: str, language: Optional[str]) -> Optional[CachedAnswer]:
+        """Hazır cevap (response_type 'greeting' veya 'clarify') ya da hattan geçecekse None."""
+        text = normalize_question(question)
+        lang = reply_language(language)
+        if text in _ALL_GREETINGS:
+            response_type, answer = 'greeting', GREETING_REPLIES[lang]
+        elif len(text.split()) < self.min_words:
+            response_type = 'clarify'
+            if text in _TOPIC_TERMS:
+                answer = TOPIC_CLARIFY_REPLIES[lang].format(topic=text)
+            else:
+                answer = CLARIFY_REPLIES[lang]
+        else:
+            return None
+        return CachedAnswer(
+            question=question,
+            answer=answer,
+            sources=[],
+            response_type=response_type,
+            hadith_id=None,
+            llm_ms=0.0,
+        )
+
+    def route(self, question: str, language: Optional[str]) -> Optional[CachedAnswer]:
+        """classify + sayaçlar; kapalıysa her soru hattan geçer."""
+        if not self.enabled:
+            return None
+        reply = self.classify(question, language)
+        with self._lock:
+            self.checked += 1
+            if reply is not None:
+                self.routes[reply.response_type] = self.routes.get(reply.response_type, 0) + 1
+                # Her atlanan soru: bir sorgu embedding'i (önbellek + arama) ve bir LLM tamamlaması
+                self.saved_embedding_calls += 1
+                self.saved_llm_calls += 1
+        return reply
+
+    def stats(self) -> Dict:
+        with self._lock:
+            routed = sum(self.routes.values())
+            return {
+                'enabled': self.enabled,
+                'checked': self.checked,
+                'routed': routed,
+                'routed_rate': round(routed / self.checked, 4) if self.checked else 0.0,
+                'routes': dict(sorted(self.routes.items())),
+                'saved_embedding_calls': self.saved_embedding_calls,
+                'saved_llm_calls': self.saved_llm_calls,
+                'saved_paid_calls': self.saved_embedding_calls + self.saved_llm_calls,
+            }
+
+
+# Global instance: /api/ask, /api/chat ve akışlı karşılıkları
+ask_pre_router = AskPreRouter()
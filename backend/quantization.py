@@ -0,0 +1,234 @@
+import os
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from ann_index import top_k_positions
+
+# Nicemlenmiş (quantized) indeks ayarları
+HADITH_INDEX_QUANTIZATION = (os.getenv('HADITH_INDEX_QUANTIZATION') or 'none').strip().lower()  # 'none' | 'int8' | 'pq'
+HADITH_PQ_M = int(os.getenv('HADITH_PQ_M') or 0)                     # Alt uzay sayısı; 0 → boyut/4 (~16x küçülme)
+HADITH_QUANT_RERANK = int(os.getenv('HADITH_QUANT_RERANK') or 10)    # top_k * bu kadar aday tam hassasiyetle yeniden skorlanır
+# Kodlar parça parça açılarak skorlanır; geçici bellek kullanımı bu satır sayısıyla sınırlı kalır
+_SCORE_CHUNK_ROWS = 16384
+_PQ_CODEBOOK_SIZE = 256
+_PQ_TRAIN_SAMPLES = 10000
+_PQ_KMEANS_ITERATIONS = 8
+
+
+class Int8Quantizer:
+    """Boyut başına ölçekli simetrik int8 nicemleme (float32'ye göre 4x küçülme)."""
+
+    kind = 'int8'
+
+    def __init__(self, scale: np.ndarray, codes: np.ndarray):
+        self.scale = scale
+        self.codes = codes
+
+    @classmethod
+    def train(cls, matrix: np.ndarray) -> 'Int8Quantizer':
+        scale = np.abs(matrix).max(axis=0) / 127.0 if matrix.shape[0] else np.ones(matrix.shape[1])
+        scale = np.where(scale == 0.0, 1.0, scale).astype(np.float32)
+        quantizer = cls(scale, np.empty(matrix.shape, dtype=np.int8))
+        for start in range(0, matrix.shape[0], _SCORE_CHUNK_ROWS):
+            quantizer.codes[start:start + _SCORE_CHUNK_ROWS] = quantizer.encode(matrix[start:start + _SCORE_CHUNK_ROWS])
+        return quantizer
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        # Eğitimde görülen aralığın dışına taşan değerler kırpılır
+        return np.clip(np.rint(vectors / self.scale), -127, 127).astype(np.int8)
+
+    def _score_codes(self, codes: np.ndarray, q: np.ndarray) -> np.ndarray:
+        # Asimetrik: sorgu tam hassasiyette, yalnızca vektörler nicemli
+        return codes.astype(np.float32) @ (q * self.scale)
+
+    def with_codes(self, codes: np.ndarray) -> 'Int8Quantizer':
+        return Int8Quantizer(self.scale, codes)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {'quant_scale': self.scale, 'quant_codes': self.codes}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'Int8Quantizer':
+        return cls(np.asarray(arrays['quant_scale']), arrays['quant_codes'])
+
+    def score(self, q: np.ndarray, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """Sorgunun tüm (veya verilen pozisyondaki) nicemli vektörlerle yaklaşık iç çarpımı."""
+        return _chunked_score(self, q, positions)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes + self.scale.nbytes)
+
+
+class ProductQuantizer:
+    """Ürün nicemleme (PQ): vektör m alt uzaya bölünür, her alt vektör 256'lık kod
+    kitabında bir bayta kodlanır. Skorlama asimetrik uzaklık hesabıyla (ADC) yapılır.
+    """
+
+    kind = 'pq'
+
+    def __init__(self, codebooks: np.ndarray, codes: np.ndarray):
+        self.codebooks = codebooks      # (m, 256, dsub)
+        self.codes = codes              # (n, m) uint8
+
+    @property
+    def m(self) -> int:
+        return int(self.codebooks.shape[0])
+
+    @classmethod
+    def train(cls, matrix: np.ndarray, m: int = 0, seed: int = 0) -> 'ProductQuantizer':
+        n, dim = matrix.shape
+        m = m or max(1, dim // 4)
+        while dim % m:
+            m -= 1
+        dsub = dim // m
+        rng = np.random.default_rng(seed)
+        sample = matrix[rng.choice(n, size=min(n, _PQ_TRAIN_SAMPLES), replace=False)] if n > _PQ_TRAIN_SAMPLES else np.asarray(matrix)
+        ks = min(_PQ_CODEBOOK_SIZE, sample.shape[0])
+        codebooks = np.zeros((m, _PQ_CODEBOOK_SIZE, dsub), dtype=np.float32)
+        for j in range(m):
+            sub = sample[:, j * dsub:(j + 1) * dsub]
+            centroids = sub[rng.choice(sub.shape[0], size=ks, replace=False)].copy()
+            for _ in range(_PQ_KMEANS_ITERATIONS):
+                assign = _nearest(sub, centroids)
+                # Tek-sıcak (one-hot) çarpımla küme toplamları; np.add.at'ten çok daha hızlı
+                onehot = np.zeros((ks, sub.shape[0]), dtype=np.float32)
+                onehot[assign, np.arange(sub.shape[0])] = 1.0
+                sums = onehot @ sub
+                counts = np.bincount(assign, minlength=ks)[:, None]
+                centroids = np.where(counts > 0, sums / np.maximum(counts, 1), centroids).astype(np.float32)
+            codebooks[j, :ks] = centroids
+            # Kullanılmayan kod kitabı girdileri hiçbir zaman seçilmesin diye uzağa itilir
+            if ks < _PQ_CODEBOOK_SIZE:
+                codebooks[j, ks:] = 1e6
+        quantizer = cls(codebooks, np.empty((n, m), dtype=np.uint8))
+        for start in range(0, n, _SCORE_CHUNK_ROWS):
+            quantizer.codes[start:start + _SCORE_CHUNK_ROWS] = quantizer.encode(matrix[start:start + _SCORE_CHUNK_ROWS])
+        return quantizer
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        dsub = self.codebooks.shape[2]
+        codes = np.empty((vectors.shape[0], self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = _nearest(vectors[:, j * dsub:(j + 1) * dsub], self.codebooks[j])
+        return codes
+
+    def _score_codes(self, codes: np.ndarray, q: np.ndarray) -> np.ndarray:
+        # ADC: sorgu alt vektörlerinin her kod kitabı girdisiyle iç çarpım tablosu
+        table = np.einsum('mkd,md->mk', self.codebooks, q.reshape(self.m, -1))
+        return table[np.arange(self.m), codes].sum(axis=1)
+
+    def with_codes(self, codes: np.ndarray) -> 'ProductQuantizer':
+        return ProductQuantizer(self.codebooks, codes)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {'quant_codebooks': self.codebooks, 'quant_codes': self.codes}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'ProductQuantizer':
+        return cls(np.asarray(arrays['quant_codebooks']), arrays['quant_codes'])
+
+    def score(self, q: np.ndarray, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        return _chunked_score(self, q, positions)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes + self.codebooks.nbytes)
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    # ||v - c||^2 = ||v||^2 - 2 v.c + ||c||^2; ||v||^2 sıralamayı etkilemez
+    dists = (centroids * centroids).sum(axis=1) - 2.0 * (vectors @ centroids.T)
+    return np.argmin(dists, axis=1)
+
+
+def _chunked_score(quantizer, q: np.ndarray, positions: Optional[np.ndarray]) -> np.ndarray:
+    codes = quantizer.codes
+    total = codes.shape[0] if positions is None else positions.shape[0]
+    out = np.empty(total, dtype=np.float32)
+    for start in range(0, total, _SCORE_CHUNK_ROWS):
+        end = min(start + _SCORE_CHUNK_ROWS, total)
+        chunk = codes[start:end] if positions is None else codes[positions[start:end]]
+        out[start:end] = quantizer._score_codes(chunk, q)
+    return out
+
+
+def merge_rows(quantizer, keep: np.ndarray, vectors: np.ndarray):
+    """keep maskesi False olan satırları çıkarıp yeni vektörleri mevcut kod kitabıyla kodlayarak
+    sona ekler (delta birleştirmede yeniden eğitim gerekmez)."""
+    codes = np.concatenate([np.asarray(quantizer.codes)[keep], quantizer.encode(vectors)])
+    return quantizer.with_codes(codes)
+
+
+QUANTIZERS = {'int8': Int8Quantizer, 'pq': ProductQuantizer}
+
+
+def build_quantizer(matrix: np.ndarray, kind: str = HADITH_INDEX_QUANTIZATION, arrays: Optional[Dict[str, np.ndarray]] = None):
+    """Ayara göre nicemleyiciyi kurar ('none' veya boş matriste None).
+
+    arrays: snapshot'tan gelen kaydedilmiş kodlar verilirse eğitim atlanır.
+    """
+    cls = QUANTIZERS.get(kind)
+    if cls is None or not matrix.shape[0]:
+        return None
+    if arrays and 'quant_codes' in arrays and arrays['quant_codes'].shape[0] == matrix.shape[0]:
+        return cls.from_arrays(arrays)
+    started = time.perf_counter()
+    quantizer = cls.train(matrix, HADITH_PQ_M) if kind == 'pq' else cls.train(matrix)
+    print(f"[QUANT] {kind} nicemleme kuruldu: {matrix.shape[0]} satır, {quantizer.nbytes / 1e6:.1f} MB, {time.perf_counter() - started:.1f}s")
+    return quantizer
+
+
+def rerank(matrix: np.ndarray, q: np.ndarray, positions: np.ndarray, top_k: int):
+    """Nicemli skorla seçilen adayları tam hassasiyetli vektörlerle yeniden skorlar."""
+    if not positions.shape[0]:
+        return positions, np.empty(0, dtype=np.float32)
+    order = np.argsort(positions)
+    sorted_pos = positions[order]
+    # mmap'te sıralı erişim daha az sayfa okur
+    scores = np.asarray(matrix[sorted_pos]) @ q
+    top = top_k_positions(scores, top_k)
+    return sorted_pos[top], scores[top]
+
+
+def quantization_report(
+    matrix: np.ndarray,
+    quantizer,
+    top_k: int = 10,
+    sample: int = 200,
+    rerank_factors: Sequence[int] = (1, 5, 10, 20),
+    seed: int = 0,
+) -> Dict:
+    """Nicemli aramanın tam aramaya göre recall@k değerini yeniden skorlama çarpanı başına ölçer."""
+    rng = np.random.default_rng(seed)
+    n = matrix.shape[0]
+    picks = rng.choice(n, size=min(sample, n), replace=False)
+    queries = np.asarray(matrix[np.sort(picks)]) + rng.normal(scale=0.01, size=(picks.shape[0], matrix.shape[1])).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    exact = [set(top_k_positions(np.asarray(matrix @ q), top_k).tolist()) for q in queries]
+    rows = []
+    for factor in rerank_factors:
+        started = time.perf_counter()
+        hits = 0
+        for q, truth in zip(queries, exact):
+            cand = top_k_positions(quantizer.score(q), top_k * factor)
+            pos, _ = rerank(matrix, q, cand, top_k)
+            hits += len(truth.intersection(pos.tolist()))
+        rows.append({
+            'rerank_factor': int(factor),
+            'recall_at_k': round(hits / max(len(queries) * top_k, 1), 4),
+            'avg_latency_ms': round((time.perf_counter() - started) * 1000 / len(queries), 3),
+        })
+    full_bytes = int(n * matrix.shape[1] * 4)
+    return {
+        'kind': quantizer.kind,
+        'rows': int(n),
+        'top_k': top_k,
+        'queries': int(len(queries)),
+        'code_bytes': quantizer.nbytes,
+        'float32_bytes': full_bytes,
+        'compression': round(full_bytes / max(quantizer.nbytes, 1), 2),
+        'results': rows,
+    }
@@ -0,0 +1,63 @@
+"""Bellek içi BM25 indeksinin sorgu gecikmesini sentetik korpusta ölçen benchmark.
+
+--docs adet, her biri --doc-words rastgele kelimeden oluşan doküman --vocab kelimelik
+sözlükten üretilir; indeks kurulduktan sonra --queries adet iki kelimelik sorgu çalıştırılıp
+p50/p95/p99 raporlanır. --budget-ms verilirse p95 bu sınırı aşınca çıkış kodu 1 olur.
+
+Kullanım (backend klasöründen):
+    python scripts/benchmark_bm25.py --docs 5000 --queries 500 --budget-ms 5
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bm25_index import HadithBM25Index
+from latency_stats import LatencyStats
+
+
+def run(docs: int, vocab: int, doc_words: int, queries: int, top_k: int, seed: int) -> LatencyStats:
+    rng = np.random.default_rng(seed)
+    words = [f"kelime{i}" for i in range(vocab)]
+    corpus = [{'turkish_text': " ".join(rng.choice(words, size=doc_words))} for _ in range(docs)]
+    index = HadithBM25Index()
+    started = time.perf_counter()
+    index.build(list(range(docs)), corpus)
+    print(f"İndeks kuruldu: {docs} doküman, {time.perf_counter() - started:.2f} sn, {index.stats()['bytes'] / 1e6:.1f} MB")
+
+    texts = [" ".join(rng.choice(words, size=2)) for _ in range(queries)]
+    index.search(texts[0], top_k=top_k)  # ısınma
+    stats = LatencyStats(window=max(queries, 1))
+    for text in texts:
+        started = time.perf_counter()
+        index.search(text, top_k=top_k)
+        stats.record((time.perf_counter() - started) * 1000)
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--docs', type=int, default=5000, help='Doküman sayısı')
+    parser.add_argument('--vocab', type=int, default=2000, help='Sözlük büyüklüğü')
+    parser.add_argument('--doc-words', type=int, default=40, help='Doküman başına kelime')
+    parser.add_argument('--queries', type=int, default=500, help='Ölçülen sorgu sayısı')
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--budget-ms', type=float, default=None, help='p95 bu değeri aşarsa hata kodu')
+    args = parser.parse_args()
+    snap = run(args.docs, args.vocab, args.doc_words, args.queries, args.top_k, args.seed).snapshot()
+    print(
+        f"BM25 sorgu n={snap['count']} p50={snap['p50_ms']:.3f} ms p95={snap['p95_ms']:.3f} ms "
+        f"p99={snap['p99_ms']:.3f} ms max={snap['max_ms']:.3f} ms"
+    )
+    if args.budget_ms is not None and snap['p95_ms'] > args.budget_ms:
+        print(f"p95 bütçeyi ({args.budget_ms} ms) aştı")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""LLM çağrıları sürerken ilgisiz uç noktaların gecikmesini ölçen eşzamanlılık benchmark'ı.
+
+Sağlayıcı uç noktası yerine her tamamlamayı --llm-delay saniye bekleten sahte bir transport
+kullanılır; gerçek API'ye istek atılmaz. Önce yük yokken, sonra --calls adet LLM çağrısı
+uçuştayken uygulamanın --probe-path uç noktası ölçülür ve p50/p95/p99 karşılaştırılır.
+--blocking eski senkron istemciyi taklit eder (bekleme event loop'u bloklar).
+
+Kullanım (backend klasöründen):
+    python scripts/benchmark_llm_concurrency.py --calls 50 --llm-delay 2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Sahte sağlayıcıyla çalışılır; limitler ve birincil model benchmark için sabitlenir
+os.environ['OPENAI_API_KEY'] = 'benchmark'
+os.environ['PRIMARY_AI_MODEL'] = 'openai'
+os.environ['FALLBACK_AI_MODEL'] = 'openai'
+os.environ['RATE_LIMIT_OPENAI_RPM'] = '0'
+os.environ['RATE_LIMIT_OPENAI_TPM'] = '0'
+
+import httpx
+
+import ultimate_rag_main
+from latency_stats import LatencyStats
+from llm_clients import LLMClientPool
+from main import app
+
+HADITHS = [
+    {'id': 1, 'source': 'Buhârî', 'reference': 'İman 1', 'text': 'Ameller niyetlere göredir.'},
+]
+
+
+def _fake_transport(delay: float, blocking: bool) -> httpx.MockTransport:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if blocking:
+            time.sleep(delay)
+        else:
+            await asyncio.sleep(delay)
+        return httpx.Response(200, json={'choices': [{'message': {'content': 'Benchmark cevabı'}}]})
+
+    return httpx.MockTransport(handler)
+
+
+async def _probe(client: httpx.AsyncClient, path: str, stats: LatencyStats, stop: asyncio.Event, interval: float) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        error = False
+        try:
+            (await client.get(path)).raise_for_status()
+        except Exception:
+            error = True
+        stats.record((time.perf_counter() - started) * 1000, error=error)
+        await asyncio.sleep(interval)
+
+
+async def _measure(client: httpx.AsyncClient, path: str, interval: float, work=None, duration: float = 0.0) -> LatencyStats:
+    stats = LatencyStats(window=100000)
+    stop = asyncio.Event()
+    prober = asyncio.create_task(_probe(client, path, stats, stop, interval))
+    if work is not None:
+        await work
+    else:
+        await asyncio.sleep(duration)
+    stop.set()
+    await prober
+    return stats
+
+
+def _row(label: str, stats: LatencyStats) -> str:
+    snap = stats.snapshot()
+    if 'p50_ms' not in snap:
+        return f"{label:<12} ölçüm yok"
+    return (
+        f"{label:<12} n={snap['count']:<5} hata={snap['errors']:<3} p50={snap['p50_ms']:>8.2f} ms "
+        f"p95={snap['p95_ms']:>8.2f} ms p99={snap['p99_ms']:>8.2f} ms max={snap['max_ms']:>8.2f} ms"
+    )
+
+
+async def run(calls: int, llm_delay: float, probe_path: str, interval: float, blocking: bool) -> None:
+    # Benchmark'ta yerel Hadis AI devre dışı: her çağrı LLM sağlayıcısına gider
+    ultimate_rag_main._HADIS_AI_AVAILABLE = False
+    ultimate_rag_main.llm_clients = LLMClientPool(transport=_fake_transport(llm_delay, blocking))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://benchmark') as client:
+        await client.get(probe_path)  # ısınma
+        baseline = await _measure(client, probe_path, interval, duration=max(llm_delay, 1.0))
+
+        async def _load():
+            await asyncio.sleep(interval)  # yük başlamadan önce ilk ölçüm alınsın
+            started = time.perf_counter()
+            results = await asyncio.gather(*[
+                ultimate_rag_main.generate_ai_response_with_fallback(f"Soru {i}: niyet nedir?", HADITHS)
+                for i in range(calls)
+            ])
+            elapsed = time.perf_counter() - started
+            ok = sum(1 for _, _, kind in results if kind == 'openai')
+            print(f"{calls} LLM çağrısı {elapsed:.2f} sn'de bitti ({ok} başarılı, çağrı başı {llm_delay:.2f} sn)")
+
+        loaded = await _measure(client, probe_path, interval, work=_load())
+    await ultimate_rag_main.llm_clients.aclose()
+
+    print(f"Uç nokta: GET {probe_path} ({'bloklayan' if blocking else 'async'} LLM istemcisi)")
+    print(_row('yüksüz', baseline))
+    print(_row('yük altında', loaded))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=50, help='Eşzamanlı LLM çağrısı sayısı')
+    parser.add_argument('--llm-delay', type=float, default=2.0, help='Sahte tamamlama süresi (sn)')
+    parser.add_argument('--probe-path', default='/health', help='Ölçülen ilgisiz uç nokta')
+    parser.add_argument('--interval', type=float, default=0.01, help='Ölçüm istekleri arası bekleme (sn)')
+    parser.add_argument('--blocking', action='store_true', help='Eski senkron istemciyi taklit et')
+    args = parser.parse_args()
+    asyncio.run(run(args.calls, args.llm_delay, args.probe_path, args.interval, args.blocking))
+
+
+if __name__ == '__main__':
+    main()
@@ -14,7 +14,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from database import AsyncSessionLocal
 from models import Hadith, Setting
-from embedding_utils import update_hadith_embeddings
+from embedding_jobs import embedding_jobs
+from answer_cache import answer_cache
 # Not: import_hadiths modülü her ortamda bulunmayabilir. Üst düzeyde
 # import etmek yerine, JSON dosyaları mevcutsa fonksiyon içinde deniyoruz.
 
@@ -104,8 +105,12 @@ async def _is_init_already_done(session: AsyncSession) -> bool:
     return result.scalars().first() is not None
 
 
-async def run():
-    """Migrate + seed + embedding güncelleme akışı."""
+async def run(wait_embeddings: bool = False):
+    """Migrate + seed + embedding güncelleme akışı.
+
+    Embedding güncellemesi /admin/update_embeddings ile aynı arka plan işine devredilir;
+    wait_embeddings=True ise (komut satırından çalıştırma) iş bitene kadar beklenir.
+    """
     # Migration (senkron Alembic çağrısı)
     run_alembic_upgrade_head()
 
@@ -119,10 +124,16 @@ async def run():
             return
 
         seeded = await _seed_hadiths_if_empty(force=force_flag)
+        if seeded:
+            await answer_cache.invalidate()
 
-        # Embedding güncellemesi: Önce OpenAI, yoksa Gemini (embedding_utils içinde)
+        # Embedding güncellemesi: Önce OpenAI, yoksa Gemini (embedding_utils içinde).
+        # Aktif bir iş varsa yenisi açılmaz, o iş checkpoint'inden devam eder.
         try:
-            await update_hadith_embeddings()
+            jobs = await embedding_jobs.enqueue_languages()
+            if wait_embeddings:
+                for job in jobs:
+                    await embedding_jobs.wait(job.id)
         except Exception as e:
             print("Embedding güncelleme sırasında hata:", e)
 
@@ -131,4 +142,4 @@ async def run():
 
 
 if __name__ == "__main__":
-    asyncio.run(run())
+    asyncio.run(run(wait_embeddings=True))
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+class SingleFlightAborted(Exception):
+    """Ortak işi yürüten çağıran sonuç üretmeden ayrıldı (ör. akış istemcisi bağlantıyı kesti)."""
+
+
+def ask_flight_key(question: str, language: Optional[str], source_filter: Optional[str]) -> Tuple[str, str, str]:
+    """Aynı cevabı alacak soruların anahtarı: büyük/küçük harf ve boşluk farkları yok sayılır.
+
+    Noktalama korunur (ör. 'niyet nedir?' ile 'niyet nedir' ayrı iştir).
+    """
+    # casefold 'İ'yi 'i̇' (noktalı birleşik) yapar; Türkçe büyük İ düz 'i' sayılır
+    return (
+        ' '.join((question or '').replace('İ', 'i').casefold().split()),
+        (language or 'tr').strip().lower(),
+        (source_filter or 'all').strip().lower(),
+    )
+
+
+class SingleFlight:
+    """Aynı anahtarla eşzamanlı gelen istekleri tek bir işte birleştirir (single-flight).
+
+    İlk gelen işi başlatır; iş sürerken gelen kopyalar aynı future'ı bekler ve aynı sonucu
+    (veya hatayı) alır. İş çağıranlardan bağımsız bir görevde yürür; ilk çağıranın isteği iptal
+    olsa da bekleyenler sonucu alır. Anahtar iş bitince bırakılır (sonuç önbelleğe alınmaz).
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+        self.aborted = 0
+
+    def join(self, key: Hashable) -> Optional[asyncio.Future]:
+        """Süren iş varsa future'ını döner ve çağıranı bekleyen olarak sayar."""
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self.followers += 1
+            return future
+
+    def begin(self, key: Hashable) -> Optional[asyncio.Future]:
+        """Anahtar boşsa yeni iş kaydeder ve future'ını döner; başka iş sürüyorsa None."""
+        with self._lock:
+            if key in self._flights:
+                return None
+            future = self._flights[key] = asyncio.get_running_loop().create_future()
+            self.leaders += 1
+            return future
+
+    def finish(self, key: Hashable, future: asyncio.Future, result=None, error: Optional[BaseException] = None) -> None:
+        """İşin sonucunu (veya hatasını) bekleyenlere iletir ve anahtarı bırakır."""
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+            if isinstance(error, SingleFlightAborted):
+                self.aborted += 1
+        if future.done():
+            return
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+            # Bekleyen yoksa "exception was never retrieved" uyarısı basılmasın
+            future.exception()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """(sonuç, paylaşıldı mı): süren iş varsa onu bekler, yoksa fn'i ortak iş olarak başlatır."""
+        while True:
+            future = self.join(key)
+            if future is None:
+                future = self.begin(key)
+                if future is None:
+                    continue
+                task = asyncio.create_task(fn())
+                task.add_done_callback(lambda t, f=future: self._settle(key, f, t))
+                return await asyncio.shield(future), False
+            try:
+                return await asyncio.shield(future), True
+            except SingleFlightAborted:
+                # Lider sonuç üretmeden ayrıldı; iş yeniden (gerekirse bu çağıranla) başlatılır
+                continue
+
+    def _settle(self, key: Hashable, future: asyncio.Future, task: asyncio.Task) -> None:
+        if task.cancelled():
+            self.finish(key, future, error=SingleFlightAborted())
+        elif task.exception() is not None:
+            self.finish(key, future, error=task.exception())
+        else:
+            self.finish(key, future, task.result())
+
+    def stats(self) -> Dict:
+        with self._lock:
+            in_flight = len(self._flights)
+        total = self.leaders + self.followers
+        return {
+            'in_flight': in_flight,
+            'leaders': self.leaders,
+            'followers': self.followers,
+            'aborted': self.aborted,
+            'coalesced_rate': round(self.followers / total, 4) if total else 0.0,
+        }
+
+
+# Global instance: /api/ask (ve akışlı karşılığı) için arama + cevap üretimi
+ask_single_flight = SingleFlight()
@@ -0,0 +1,47 @@
+import asyncio
+
+import numpy as np
+
+import answer_cache as answer_cache_module
+from answer_cache import CachedAnswer, SemanticAnswerCache
+
+
+def _answer(text, llm_ms=800.0):
+    return CachedAnswer(question=text, answer=f"cevap: {text}", sources=[], response_type="openai", hadith_id=1, llm_ms=llm_ms)
+
+
+def test_similar_questions_hit_within_partition_and_clear_invalidates(monkeypatch):
+    vectors = {
+        "oruçluyken misvak": [1.0, 0.0, 0.0],
+        "oruç tutarken misvak kullanmak": [0.99, 0.05, 0.0],
+        "zekat kimlere verilir": [0.0, 1.0, 0.0],
+    }
+
+    async def fake_embedding(text):
+        return np.asarray(vectors[text], dtype=np.float32)
+
+    async def no_version_check(self):
+        return None
+
+    monkeypatch.setattr(answer_cache_module, "generate_embedding", fake_embedding)
+    monkeypatch.setattr(SemanticAnswerCache, "_check_data_version", no_version_check)
+    cache = SemanticAnswerCache(maxsize=8, ttl=60, threshold=0.95, enabled=True)
+
+    async def run():
+        assert await cache.store("oruçluyken misvak", "tr", "all", _answer("oruçluyken misvak"))
+        hit = await cache.lookup("oruç tutarken misvak kullanmak", "tr", "all")
+        other_filter = await cache.lookup("oruç tutarken misvak kullanmak", "tr", "quran")
+        unrelated = await cache.lookup("zekat kimlere verilir", "tr", "all")
+        generation = cache.generation
+        cache.clear()
+        stale_store = await cache.store("oruçluyken misvak", "tr", "all", _answer("oruçluyken misvak"), generation)
+        after_clear = await cache.lookup("oruç tutarken misvak kullanmak", "tr", "all")
+        return hit, other_filter, unrelated, stale_store, after_clear
+
+    hit, other_filter, unrelated, stale_store, after_clear = asyncio.run(run())
+    assert hit is not None and hit.answer == "cevap: oruçluyken misvak"
+    assert other_filter is None and unrelated is None
+    # Temizlemeden önce başlamış üretimin cevabı saklanmaz
+    assert stale_store is False and after_clear is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["lookups"] == 4 and stats["saved_llm_ms"] == 800.0
@@ -0,0 +1,117 @@
+import asyncio
+
+import numpy as np
+
+import hadith_data_version
+from bm25_index import HadithBM25Index, preprocess
+
+
+def _doc(tr, kitap=None, source="Buhari"):
+    return {"turkish_text": tr, "kitap": kitap, "source": source}
+
+
+def test_preprocess_drops_stopwords_and_punctuation():
+    assert preprocess("Oruç ve misvak hakkında hadis, lütfen!") == ["oruç", "ve", "misvak"]
+    assert preprocess("  ") == []
+
+
+def test_bm25_ranks_field_weighted_and_prefix_matches():
+    index = HadithBM25Index()
+    index.build(
+        [1, 2, 3, 4],
+        [
+            _doc("Oruçlu iken misvak kullanmak", kitap="Savm"),
+            _doc("Namaz kılmadan önce abdest alınır", kitap="Namaz"),
+            _doc("Namazı vaktinde kılmak en faziletli ameldir"),
+            _doc("Zekat malın temizliğidir"),
+        ],
+    )
+    ids, scores = index.search("misvak", top_k=3)
+    assert ids.tolist() == [1]
+    # Kitap alanı daha ağır; "namazı" önek genişletmesiyle bulunur
+    ids, scores = index.search("namaz", top_k=3)
+    assert ids.tolist() == [2, 3]
+    assert np.all(np.diff(scores) <= 0)
+    assert len(index.search("hadis", top_k=3)[0]) == 0
+
+
+def test_bm25_incremental_add_replaces_and_compacts():
+    index = HadithBM25Index()
+    index.build([1, 2], [_doc("sabır imanın yarısıdır"), _doc("temizlik imanın yarısıdır")])
+    index.add([2, 7], [_doc("şükür nimetin artmasıdır"), _doc("sabırlı olanlara müjde")])
+    assert len(index) == 3
+    assert index.search("temizlik", top_k=3)[0].tolist() == []
+    assert set(index.search("sabır", top_k=3)[0].tolist()) == {1, 7}
+    index.compact()
+    assert index.stats()["delta_documents"] == 0
+    assert index.search("şükür", top_k=3)[0].tolist() == [2]
+    assert set(index.search("sabır", top_k=3)[0].tolist()) == {1, 7}
+
+
+def test_bm25_reuploads_do_not_skew_idf_or_average_length():
+    docs = [_doc("sabır imanın yarısıdır"), _doc("temizlik imanın yarısıdır"), _doc("şükür nimetin artmasıdır")]
+    index = HadithBM25Index()
+    index.build([1, 2, 3], docs)
+    # Aynı dokümanların tekrar tekrar yüklenmesi df'i şişirmemeli
+    for _ in range(4):
+        index.add([1, 2], docs[:2])
+    fresh = HadithBM25Index()
+    fresh.build([1, 2, 3], docs)
+    for query in ("imanın", "sabır", "şükür"):
+        ids, scores = index.search(query, top_k=3)
+        fresh_ids, fresh_scores = fresh.search(query, top_k=3)
+        assert sorted(ids.tolist()) == sorted(fresh_ids.tolist())
+        assert np.allclose(np.sort(scores), np.sort(fresh_scores))
+    # Ortalama uzunluk yalnızca canlı dokümanlar üzerinden güncellenir
+    index.add([3, 4], [_doc("bir iki üç dört beş altı yedi sekiz"), _doc("kısa")])
+    grown = HadithBM25Index()
+    grown.build([1, 2, 3, 4], docs[:2] + [_doc("bir iki üç dört beş altı yedi sekiz"), _doc("kısa")])
+    assert np.allclose(index._state.avg_len, grown._state.avg_len)
+    index.compact()
+    assert np.allclose(index._state.avg_len, grown._state.avg_len)
+
+
+def test_bm25_rebuilds_when_hadith_data_version_changes(monkeypatch):
+    versions = ["v1"]
+    tables = [([1], [_doc("sabır imanın yarısıdır")]), ([1, 2], [_doc("sabır imanın yarısıdır"), _doc("şükür nimeti artırır")])]
+
+    async def fake_version():
+        return versions[0]
+
+    async def fake_docs(self):
+        return tables.pop(0)
+
+    monkeypatch.setattr(hadith_data_version, "read_hadith_data_version", fake_version)
+    monkeypatch.setattr(HadithBM25Index, "_fetch_docs", fake_docs)
+    index = HadithBM25Index()
+    index.data_version.check_seconds = 0
+
+    async def run():
+        await index.ensure_loaded()
+        assert index.search("şükür", top_k=3)[0].tolist() == []
+        versions[0] = "v2"
+        await index.ensure_loaded()
+        await index._reload_task
+
+    asyncio.run(run())
+    assert index.search("şükür", top_k=3)[0].tolist() == [2]
+    assert index.stats()["reloads"] == 1
+
+
+def test_bm25_top_k_matches_full_ranking_on_medium_corpus():
+    # Gecikme ölçümü: scripts/benchmark_bm25.py
+    rng = np.random.default_rng(0)
+    words = [f"kelime{i}" for i in range(2000)]
+    docs = [_doc(" ".join(rng.choice(words, size=40))) for _ in range(5000)]
+    index = HadithBM25Index()
+    index.build(list(range(5000)), docs)
+    ids, scores = index.search("kelime12 kelime345", top_k=10)
+    all_ids, all_scores = index.search("kelime12 kelime345", top_k=5000)
+    assert len(ids) == 10
+    assert np.all(np.diff(scores) <= 0)
+    np.testing.assert_allclose(scores, all_scores[:10], rtol=1e-6)
+    # Eşleşmeyen doküman dönmez (önek genişletmesi: kelime12 → kelime120...)
+    assert all(
+        any(w.startswith(("kelime12", "kelime345")) for w in docs[i]["turkish_text"].split())
+        for i in all_ids.tolist()
+    )
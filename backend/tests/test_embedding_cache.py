@@ -0,0 +1,85 @@
+import asyncio
+
+import numpy as np
+
+import embedding_utils
+import ttl_cache
+from ttl_cache import LRUTTLCache
+
+
+def test_lru_ttl_cache_evicts_and_expires(monkeypatch):
+    cache = LRUTTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # "b" en az kullanılan
+    assert cache.get("b") is None
+    assert cache.stats()["evictions"] == 1
+    real = ttl_cache.time.monotonic
+    monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: real() + 11)
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_generate_embedding_is_cached_per_normalized_question(monkeypatch):
+    calls = []
+
+    async def fake_embed(text):
+        calls.append(text)
+        return np.ones(4, dtype=np.float32), "test-model"
+
+    async def no_rows(texts, models, dim=None):
+        return [None] * len(texts)
+
+    async def fake_store(texts, vectors, model):
+        return 0
+
+    monkeypatch.setattr(embedding_utils, "embed_text", fake_embed)
+    monkeypatch.setattr(embedding_utils.embedding_content_cache, "lookup", no_rows)
+    monkeypatch.setattr(embedding_utils.embedding_content_cache, "store", fake_store)
+    monkeypatch.setattr(embedding_utils, "_embedding_models", lambda: ["test-model"])
+    monkeypatch.setattr(embedding_utils, "query_embedding_cache", LRUTTLCache(8, 60))
+    first = asyncio.run(embedding_utils.generate_embedding("Namaz nedir?"))
+    second = asyncio.run(embedding_utils.generate_embedding("  namaz   NEDIR "))
+    assert len(calls) == 1
+    assert second is first and not second.flags.writeable
+    assert embedding_utils.query_embedding_cache.stats()["hits"] == 1
+
+
+def test_embed_texts_cached_only_sends_unique_misses(monkeypatch):
+    from embedding_cache import embedding_content_cache, text_hash
+
+    assert text_hash(" Namaz  dinin\tdireğidir ") == text_hash("Namaz dinin direğidir")
+    stored = {text_hash("önbellekte"): (np.full(3, 7.0, dtype=np.float32), "test-model")}
+    sent = []
+
+    async def fake_lookup(texts, models, dim=None):
+        return [stored.get(text_hash(t)) for t in texts]
+
+    async def fake_store(texts, vectors, model):
+        for t, v in zip(texts, vectors):
+            stored[text_hash(t)] = (v, model)
+        return len(texts)
+
+    async def fake_embed_texts(texts, model=None):
+        sent.append(list(texts))
+        return [np.full(3, float(i), dtype=np.float32) for i in range(len(texts))], "test-model"
+
+    monkeypatch.setattr(embedding_content_cache, "lookup", fake_lookup)
+    monkeypatch.setattr(embedding_content_cache, "store", fake_store)
+    monkeypatch.setattr(embedding_utils, "embed_texts", fake_embed_texts)
+    results = asyncio.run(embedding_utils.embed_texts_cached(["yeni", "önbellekte", "yeni ", "başka"]))
+    assert sent == [["yeni", "başka"]]
+    assert [float(vec[0]) for vec, _ in results] == [0.0, 7.0, 0.0, 1.0]
+    assert text_hash("başka") in stored
+
+
+def test_supplied_embedding_is_kept_only_with_its_model():
+    supplied_embedding_columns = embedding_utils.supplied_embedding_columns
+    # Modeli bilinmeyen CSV vektörü sunulan modelle karşılaştırılmamalı: hiç yazılmaz
+    assert supplied_embedding_columns("0.1,0.2,0.3", None) == {}
+    assert supplied_embedding_columns("0.1,0.2,0.3", " ") == {}
+    assert supplied_embedding_columns("0.1,0.2,0.3", float("nan")) == {}
+    columns = supplied_embedding_columns("0.1,0.2,0.3", " text-embedding-3-small ")
+    assert columns["embedding_model"] == "text-embedding-3-small"
+    assert columns["embedding_dim"] == 3
@@ -0,0 +1,150 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, func
+
+import embedding_utils
+from database import AsyncSessionLocal, engine
+from embedding_jobs import EMBEDDING_BACKFILL_JOB, EMBEDDING_JOB_STALE_SECONDS, EmbeddingJobRunner, job_progress
+from models import BackgroundJob
+
+
+class _MemoryRunner(EmbeddingJobRunner):
+    """İş satırlarını DB yerine sözlükte tutar; checkpoint/heartbeat/bitiş yazımları kaydedilir."""
+
+    def __init__(self, jobs, **kwargs):
+        super().__init__(**kwargs)
+        self.jobs = jobs
+        self.heartbeats = 0
+
+    async def _claim(self, job_id):
+        job = self.jobs[job_id]
+        job.status = 'running'
+        return BackgroundJob(id=job.id, kind=job.kind, model=job.model, language=job.language, last_id=job.last_id)
+
+    async def _write_checkpoint(self, job_id, watermark, ok, failed):
+        job = self.jobs[job_id]
+        job.last_id, job.processed, job.failed = watermark, job.processed + ok, job.failed + failed
+
+    async def _heartbeat(self, job_id):
+        self.heartbeats += 1
+
+    async def _finish(self, job_id, status, error):
+        self.jobs[job_id].status, self.jobs[job_id].error = status, error
+
+
+def _job(job_id=1, last_id=0):
+    return BackgroundJob(id=job_id, kind=EMBEDDING_BACKFILL_JOB, model=None, language='tr', status='pending', last_id=last_id, processed=0, failed=0)
+
+
+def test_checkpoint_never_goes_back_and_restart_resumes_from_watermark(monkeypatch):
+    jobs = {1: _job()}
+    runner = _MemoryRunner(jobs, heartbeat_seconds=60)
+    calls = []
+
+    async def update(start_after_id, on_progress, model, language):
+        calls.append(start_after_id)
+        if len(calls) == 1:
+            await on_progress(100, 90, 10)
+            # Eşzamanlı partilerden geç gelen eski watermark checkpoint'i geri almaz
+            await on_progress(60, 5, 0)
+            await asyncio.Event().wait()
+        await on_progress(150, 50, 0)
+        raise RuntimeError("sağlayıcı hatası")
+
+    monkeypatch.setattr(embedding_utils, "update_hadith_embeddings", update)
+
+    async def run():
+        assert await runner.start(1)
+        await asyncio.sleep(0.01)
+        # Worker çöktü: iş 'running' ve son checkpoint'te kalır
+        runner._tasks[1].cancel()
+        await asyncio.gather(runner._tasks[1], return_exceptions=True)
+        assert (jobs[1].status, jobs[1].last_id, jobs[1].processed, jobs[1].failed) == ('running', 100, 95, 10)
+        # İkinci başlatma saklanan watermark'tan devam eder
+        assert await runner.start(1)
+        await runner.wait(1)
+
+    asyncio.run(run())
+    assert calls == [0, 100]
+    assert (jobs[1].status, jobs[1].error, jobs[1].last_id) == ('failed', 'sağlayıcı hatası', 150)
+
+
+def test_heartbeat_is_written_while_a_batch_is_slow(monkeypatch):
+    jobs = {1: _job()}
+    runner = _MemoryRunner(jobs, heartbeat_seconds=0.01)
+
+    async def slow_update(start_after_id, on_progress, model, language):
+        # Checkpoint'siz uzun parti (ör. sağlayıcı geri çekilmesi)
+        await asyncio.sleep(0.08)
+        await on_progress(10, 10, 0)
+        return 10
+
+    monkeypatch.setattr(embedding_utils, "update_hadith_embeddings", slow_update)
+
+    async def run():
+        await runner.start(1)
+        await runner.wait(1)
+        beats = runner.heartbeats
+        await asyncio.sleep(0.03)
+        return beats
+
+    beats = asyncio.run(run())
+    assert beats >= 3
+    # İş bitince zamanlayıcı durur
+    assert runner.heartbeats == beats
+    assert jobs[1].status == 'completed'
+
+
+def test_job_progress_throughput_and_eta():
+    started = datetime(2026, 1, 1, 12, 0, 0)
+    job = BackgroundJob(
+        status='running', processed=700, failed=100, run_processed=300,
+        started_at=started, heartbeat_at=started + timedelta(seconds=50),
+    )
+    # Bu başlatmada 500 satır / 50 sn = 10 satır/sn; 1200 kalan → 120 sn
+    assert job_progress(job, 1200) == (10.0, 120.0)
+    job.status = 'completed'
+    assert job_progress(job, 0) == (10.0, None)
+    assert job_progress(BackgroundJob(status='pending', processed=0, failed=0, run_processed=0), 50) == (None, None)
+
+
+def test_claim_steals_only_stale_running_jobs():
+    """Gerçek Postgres'te sahiplenme ve greatest checkpoint'i (DATABASE_URL erişilemezse atlanır)."""
+
+    async def run():
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(BackgroundJob.__table__.create, checkfirst=True)
+        except Exception as e:
+            pytest.skip(f"Postgres erişilemiyor: {e}")
+        runner = EmbeddingJobRunner()
+        async with AsyncSessionLocal() as session:
+            # Zamanlar sahiplenme sorgusuyla aynı saatten (DB now()) alınır
+            fresh = BackgroundJob(kind='test_job', status='running', last_id=40, heartbeat_at=func.now())
+            stale = BackgroundJob(
+                kind='test_job', status='running', last_id=40,
+                heartbeat_at=func.now() - timedelta(seconds=EMBEDDING_JOB_STALE_SECONDS + 60),
+            )
+            pending = BackgroundJob(kind='test_job', status='pending', last_id=0)
+            session.add_all([fresh, stale, pending])
+            await session.commit()
+        try:
+            assert await runner._claim(fresh.id) is None
+            claimed = await runner._claim(stale.id)
+            assert claimed is not None and claimed.status == 'running' and claimed.last_id == 40
+            assert (await runner._claim(pending.id)).status == 'running'
+            # Yeni sahiplenilen iş artık taze; ikinci worker alamaz
+            assert await runner._claim(stale.id) is None
+            await runner._write_checkpoint(stale.id, 90, 5, 0)
+            await runner._write_checkpoint(stale.id, 70, 5, 0)
+            async with AsyncSessionLocal() as session:
+                job = await session.get(BackgroundJob, stale.id)
+                assert (job.last_id, job.processed) == (90, 10)
+        finally:
+            async with AsyncSessionLocal() as session:
+                await session.execute(delete(BackgroundJob).where(BackgroundJob.kind == 'test_job'))
+                await session.commit()
+
+    asyncio.run(run())
@@ -0,0 +1,134 @@
+import asyncio
+import json
+
+import httpx
+import numpy as np
+import pytest
+
+from embedding_providers import (
+    EmbeddingProvider,
+    EmbeddingProviderPool,
+    GeminiEmbeddingProvider,
+    OpenAIEmbeddingProvider,
+)
+
+
+def _pool(handler, hedge_delay_ms=50):
+    return EmbeddingProviderPool(
+        [OpenAIEmbeddingProvider("k1", "openai-model"), GeminiEmbeddingProvider("k2", "gemini-model")],
+        hedge_delay_ms=hedge_delay_ms,
+        transport=httpx.MockTransport(handler),
+    )
+
+
+def test_openai_batch_keeps_input_order_on_shared_client():
+    calls = []
+
+    async def handler(request):
+        payload = json.loads(request.content)
+        calls.append(payload["input"])
+        # API sırayı garanti etmez; index alanına göre sıralanmalı
+        data = [{"index": i, "embedding": [float(i)] * 3} for i in range(len(payload["input"]))]
+        return httpx.Response(200, json={"data": list(reversed(data))})
+
+    pool = _pool(handler)
+
+    async def run():
+        first = await pool.embed(["a", "b", "c"], hedge=False)
+        client = pool._client
+        await pool.embed(["d"], hedge=False)
+        assert pool._client is client
+        await pool.aclose()
+        return first
+
+    vectors, model = asyncio.run(run())
+    assert calls == [["a", "b", "c"], ["d"]]
+    assert model == "openai-model"
+    assert [float(v[0]) for v in vectors] == [0.0, 1.0, 2.0]
+    assert pool.stats()["providers"]["openai"]["successes"] == 2
+
+
+def test_provider_without_embed_fails_at_construction():
+    class HalfProvider(EmbeddingProvider):
+        name = 'half'
+
+    with pytest.raises(TypeError):
+        HalfProvider("k", "model")
+
+
+def test_slow_primary_is_hedged_and_failures_mark_provider_unhealthy():
+    async def slow_openai(request):
+        if "openai" in request.url.host:
+            await asyncio.sleep(1)
+            return httpx.Response(200, json={"data": [{"index": 0, "embedding": [1.0, 0.0]}]})
+        return httpx.Response(200, json={"embeddings": [{"values": [0.0, 1.0]}]})
+
+    pool = _pool(slow_openai)
+    vectors, model = asyncio.run(pool.embed(["soru"]))
+    assert model == "gemini-model" and pool.hedges == 1 and pool.hedge_wins == 1
+
+    async def failing_openai(request):
+        if "openai" in request.url.host:
+            return httpx.Response(500)
+        return httpx.Response(200, json={"embeddings": [{"values": [0.0, 1.0]}]})
+
+    pool = _pool(failing_openai, hedge_delay_ms=10_000)
+    for _ in range(3):
+        _, model = asyncio.run(pool.embed(["soru"]))
+        assert model == "gemini-model"
+    assert not pool.providers[0].health.healthy
+    assert [p.name for p in pool.ordered()] == ["gemini", "openai"]
+
+
+def test_micro_batcher_coalesces_concurrent_queries_into_one_pass():
+    from local_embedding import MicroBatcher
+
+    passes = []
+
+    def encode(texts):
+        passes.append(list(texts))
+        return np.asarray([[float(len(t)), 1.0] for t in texts], dtype=np.float32)
+
+    batcher = MicroBatcher(encode, max_batch=8, wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(*(batcher.embed([q]) for q in ["a", "bb", "ccc"]))
+
+    results = asyncio.run(run())
+    assert passes == [["a", "bb", "ccc"]]
+    assert [float(r[0][0]) for r in results] == [1.0, 2.0, 3.0]
+    assert batcher.stats()["avg_batch"] == 3.0
+
+
+def test_index_rejects_vectors_from_another_model():
+    from hadith_index import HadithEmbeddingIndex
+
+    index = HadithEmbeddingIndex(engine="flat", snapshot_dir="/nonexistent", model="local-model")
+    index.build([1], [np.ones(4, dtype=np.float32)])
+    assert index.add([2], [np.ones(4, dtype=np.float32)], model="text-embedding-3-small") == 0
+    assert index.add([3], [np.ones(4, dtype=np.float32)], model="local-model") == 1
+    assert sorted(index.ids.tolist()) == [1, 3]
+
+
+def test_adopt_switches_serving_model_and_rejects_old_vectors():
+    from hadith_index import HadithEmbeddingIndex
+
+    serving = HadithEmbeddingIndex(engine="flat", snapshot_dir="/nonexistent", model=None)
+    serving._serving_model = "old-model"
+    serving.build([1, 2], [np.ones(3, dtype=np.float32)] * 2)
+    new = HadithEmbeddingIndex(engine="flat", snapshot_dir="/nonexistent", model="new-model", source="versions")
+    new.build([1, 2, 3], [np.ones(5, dtype=np.float32)] * 3)
+
+    serving.adopt(new)
+    assert serving.model == "new-model" and serving.dim == 5 and len(serving) == 3
+    # Geçişten sonra eski modelle gelen vektörler indekse karışmaz
+    assert serving.add([4], [np.ones(3, dtype=np.float32)], model="old-model") == 0
+
+
+def test_cosine_similarity_rejects_dimension_mismatch():
+    import pytest
+    from vector_search import cosine_similarity
+
+    assert abs(cosine_similarity([1.0, 0.0], [1.0, 0.0]) - 1.0) < 1e-9
+    with pytest.raises(ValueError):
+        cosine_similarity([1.0, 0.0, 0.0], [1.0, 0.0])
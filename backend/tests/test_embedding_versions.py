@@ -0,0 +1,61 @@
+import asyncio
+
+import numpy as np
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import embedding_versions as versions
+from database import engine
+from hadith_index import HadithEmbeddingIndex, decode_embedding, hadith_index, language_indexes
+from models import Hadith, HadithEmbedding
+
+
+def test_cutover_serves_turkish_vector_when_other_languages_exist(monkeypatch):
+    """Gerçek Postgres'te geçiş (DATABASE_URL erişilemezse atlanır); tüm yazımlar geri alınır."""
+
+    async def noop(*args, **kwargs):
+        return 0
+
+    async def run():
+        try:
+            conn = await engine.connect()
+        except Exception as e:
+            pytest.skip(f"Postgres erişilemiyor: {e}")
+        trans = await conn.begin()
+        try:
+            # Geçişin commit'leri savepoint olur; dış transaction sonunda geri alınır
+            monkeypatch.setattr(
+                versions, 'AsyncSessionLocal',
+                lambda: AsyncSession(bind=conn, join_transaction_mode='create_savepoint', expire_on_commit=False),
+            )
+            monkeypatch.setattr(HadithEmbeddingIndex, 'load', noop)
+            monkeypatch.setattr(hadith_index, 'adopt', lambda other: None)
+            monkeypatch.setattr(hadith_index, 'rebuild_snapshot', noop)
+            monkeypatch.setattr(hadith_index, 'resolve_model', lambda: noop())
+            monkeypatch.setattr(versions, 'language_indexes', {lang: hadith_index for lang in language_indexes})
+
+            vectors = {lang: np.full(4, value, dtype=np.float32) for lang, value in (('en', 2.0), ('tr', 1.0), ('ar', 3.0))}
+            async with versions.AsyncSessionLocal() as session:
+                hadith = Hadith(source='test', turkish_text='metin', english_text='text', arabic_text='نص')
+                session.add(hadith)
+                await session.flush()
+                session.add_all([
+                    HadithEmbedding(hadith_id=hadith.id, model='test-model', language=lang, dim=4, embedding_vec=vec.tobytes())
+                    for lang, vec in vectors.items()
+                ])
+                await session.commit()
+
+            await versions.embedding_versions.cutover('test-model', force=True)
+
+            async with versions.AsyncSessionLocal() as session:
+                row = (await session.execute(
+                    select(Hadith.embedding_vec, Hadith.embedding_dim, Hadith.embedding_model).where(Hadith.id == hadith.id)
+                )).one()
+            assert decode_embedding(row.embedding_vec, row.embedding_dim).tolist() == vectors['tr'].tolist()
+            assert row.embedding_model == 'test-model'
+        finally:
+            await trans.rollback()
+            await conn.close()
+
+    asyncio.run(run())
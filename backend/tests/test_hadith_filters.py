@@ -0,0 +1,88 @@
+import asyncio
+
+import numpy as np
+from types import SimpleNamespace
+
+import hadith_data_version
+from hadith_filters import HadithAttributeIndex, parse_filters
+from hadith_index import HadithEmbeddingIndex
+from ultimate_rag_main import ask_filters
+
+
+def _row(hadith_id, source, language="tr", category=None, authenticity=None, texts=("tr",)):
+    return HadithAttributeIndex._row_values(
+        hadith_id,
+        {"source": source, "category": category, "language": language, "authenticity": authenticity},
+        {lang: lang in texts for lang in ("tr", "en", "ar")},
+    )
+
+
+def test_parse_filters_and_ask_mapping():
+    assert parse_filters(source=" Buhari, Müslim ,", language=None) == {"source": ["buhari", "müslim"]}
+    assert ask_filters("all", "tr") == {"language": ["tr"]}
+    assert ask_filters("Buhari", None) == {"source": ["buhari"]}
+
+
+def test_allowed_ids_intersects_fields_and_counts_text_languages():
+    index = HadithAttributeIndex()
+    index.build([
+        _row(1, "Buhari", authenticity="Sahih"),
+        _row(2, "Müslim", authenticity="Sahih", texts=("tr", "en")),
+        _row(3, "Buhari", language="ar", texts=("ar",)),
+        _row(4, "Tirmizi", authenticity="Hasen"),
+    ])
+    assert index.allowed_ids(None) is None
+    assert index.allowed_ids(parse_filters(source="buhari")).tolist() == [1, 3]
+    assert index.allowed_ids(parse_filters(source="Buhari,Müslim", authenticity="sahih")).tolist() == [1, 2]
+    # İngilizce metni olan satır language='tr' olsa da 'en' filtresine girer
+    assert index.allowed_ids(parse_filters(language="en")).tolist() == [2]
+    assert index.allowed_ids(parse_filters(source="yok")).tolist() == []
+    index.add_hadiths([SimpleNamespace(id=9, source="Buhari", category=None, language="tr", authenticity=None, turkish_text="x", english_text=None, arabic_text=None)])
+    assert index.allowed_ids(parse_filters(source="buhari")).tolist() == [1, 3, 9]
+
+
+def test_filtered_vector_search_scores_only_allowed_rows():
+    rng = np.random.default_rng(4)
+    vectors = [rng.normal(size=8).astype(np.float32) for _ in range(200)]
+    index = HadithEmbeddingIndex()
+    index.build(list(range(1000, 1200)), vectors)
+    allowed = np.arange(1000, 1200, 3, dtype=np.int64)
+    ids, scores = index.search(vectors[0], top_k=5, allowed_ids=allowed)
+    assert set(ids.tolist()) <= set(allowed.tolist())
+    exact = index.search(vectors[0], top_k=200)
+    expected = [i for i in exact[0].tolist() if i in set(allowed.tolist())][:5]
+    assert ids.tolist() == expected
+    # Delta'daki güncellemeler de filtreye tabi
+    index.add([1003, 1004], [vectors[0], vectors[0]])
+    ids, _ = index.search(vectors[0], top_k=2, allowed_ids=allowed)
+    assert ids.tolist()[:2] == [1000, 1003] or ids.tolist()[:2] == [1003, 1000]
+    assert 1004 not in ids.tolist()
+
+
+def test_filter_sets_reload_when_data_version_changes(monkeypatch):
+    versions = ["v1"]
+    tables = [[_row(1, "Buhari")], [_row(1, "Buhari"), _row(2, "Buhari", language="en", texts=("tr", "en"))]]
+
+    async def fake_version():
+        return versions[0]
+
+    async def fake_rows(self):
+        return tables.pop(0)
+
+    monkeypatch.setattr(hadith_data_version, "read_hadith_data_version", fake_version)
+    monkeypatch.setattr(HadithAttributeIndex, "_fetch_rows", fake_rows)
+    index = HadithAttributeIndex()
+    index.data_version.check_seconds = 0
+
+    async def run():
+        await index.ensure_loaded()
+        assert index.allowed_ids(parse_filters(language="en")).tolist() == []
+        # Aynı sürümde yeniden yükleme yok; başka worker import edince arka planda yenilenir
+        assert not await index.maybe_reload()
+        versions[0] = "v2"
+        await index.ensure_loaded()
+        await index._reload_task
+
+    asyncio.run(run())
+    assert index.allowed_ids(parse_filters(language="en")).tolist() == [2]
+    assert index.stats()["data_version"] == "v2" and index.reloads == 1
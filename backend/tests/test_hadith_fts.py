@@ -0,0 +1,8 @@
+from hadith_fts import build_tsquery_text
+
+
+def test_tsquery_text_is_sanitized_or_query():
+    assert build_tsquery_text("Oruç ve misvak hakkında!") == "oruç:* | ve | misvak:*"
+    # tsquery operatörleri kullanıcı girdisinden sızmaz
+    assert build_tsquery_text("namaz&(abdest):*") == "namaz:* | abdest:*"
+    assert build_tsquery_text("hadis nedir?") == ""
@@ -0,0 +1,175 @@
+import numpy as np
+from hadith_index import HadithEmbeddingIndex, parse_embedding, encode_embedding, decode_embedding
+
+
+def test_parse_embedding_text():
+    vec = parse_embedding("0.1, 0.2,0.3,")
+    assert vec.dtype == np.float32
+    assert vec.shape == (3,)
+    assert parse_embedding("") is None
+    assert parse_embedding("a,b") is None
+
+
+def test_binary_roundtrip_without_copy():
+    blob = encode_embedding("0.5,-1.25,2")
+    assert len(blob) == 12
+    vec = decode_embedding(blob, dim=3)
+    assert vec.tolist() == [0.5, -1.25, 2.0]
+    assert not vec.flags.owndata
+    assert decode_embedding(blob, dim=4) is None
+    assert decode_embedding(b"\x00" * 5) is None
+
+
+def test_search_returns_top_k_sorted():
+    rng = np.random.default_rng(0)
+    vectors = [rng.normal(size=8).astype(np.float32) for _ in range(50)]
+    index = HadithEmbeddingIndex()
+    index.build(list(range(100, 150)), vectors)
+    ids, scores = index.search(vectors[7], top_k=5)
+    assert ids[0] == 107
+    assert len(ids) == 5
+    assert np.all(np.diff(scores) <= 0)
+    # Brute-force ile aynı sonuç
+    mat = np.vstack(vectors)
+    mat /= np.linalg.norm(mat, axis=1, keepdims=True)
+    q = vectors[7] / np.linalg.norm(vectors[7])
+    expected = np.argsort(-(mat @ q))[:5] + 100
+    assert list(ids) == list(expected)
+
+
+def test_add_replaces_existing_ids():
+    index = HadithEmbeddingIndex()
+    index.build([1, 2], [np.array([1.0, 0.0], dtype=np.float32), np.array([0.0, 1.0], dtype=np.float32)])
+    index.add([2, 3], [np.array([1.0, 1.0], dtype=np.float32), np.array([-1.0, 0.0], dtype=np.float32)])
+    assert len(index) == 3
+    scores = index.score_ids([0.0, 1.0], [2, 3])
+    assert abs(scores[2] - np.sqrt(0.5)) < 1e-5
+    assert abs(scores[3]) < 1e-6
+    # Boyutu farklı sorgu sessizce boş döner
+    ids, _ = index.search([1.0, 0.0, 0.0], top_k=3)
+    assert len(ids) == 0
+
+
+def test_ivf_engine_recall_and_incremental_insert(monkeypatch):
+    import ann_index
+    monkeypatch.setattr(ann_index, "HADITH_ANN_MIN_ROWS", 100)
+    rng = np.random.default_rng(1)
+    vectors = [rng.normal(size=16).astype(np.float32) for _ in range(2000)]
+    index = HadithEmbeddingIndex(engine="ivf")
+    index.build(list(range(2000)), vectors)
+    assert index.ann is not None
+    report = index.recall_report([1, index.ann.nlist], top_k=5, sample=50)
+    # Tüm kümeler taranınca sonuç tam aramayla aynı olmalı
+    assert report["results"][-1]["recall_at_k"] == 1.0
+    new_vec = rng.normal(size=16).astype(np.float32)
+    index.add([5000, 3], [new_vec, new_vec])
+    assert len(index) == 2001
+    ids, _ = index.search(new_vec, top_k=2, nprobe=index.ann.nlist)
+    assert set(ids.tolist()) == {5000, 3}
+
+
+def test_snapshot_roundtrip_is_mmapped(tmp_path):
+    import embedding_snapshot
+    rng = np.random.default_rng(2)
+    source = HadithEmbeddingIndex()
+    source.build([5, 9, 12], [rng.normal(size=4).astype(np.float32) for _ in range(3)])
+    ids, matrix = source.export()
+    manifest = embedding_snapshot.write_snapshot(ids, matrix, "test-model", base_dir=str(tmp_path))
+    assert manifest["row_count"] == 3 and manifest["max_hadith_id"] == 12
+    assert embedding_snapshot.current_version(str(tmp_path)) == manifest["version"]
+    opened_manifest, snap_ids, snap_matrix, ivf, quant = embedding_snapshot.open_snapshot(base_dir=str(tmp_path))
+    assert isinstance(snap_matrix, np.memmap) and ivf is None and quant is None
+    index = HadithEmbeddingIndex(snapshot_dir=str(tmp_path))
+    index.set_base(snap_ids, snap_matrix, opened_manifest["version"])
+    # Delta segmente eklenen güncelleme ana segmentteki eski vektörü gölgeler
+    index.add([9], [matrix[0]])
+    assert len(index) == 3
+    found, scores = index.search(matrix[0], top_k=2)
+    assert set(found.tolist()) == {5, 9}
+    assert index.stats()["mmap"] is True
+
+
+def test_quantized_modes_rerank_and_shrink_memory(tmp_path):
+    import embedding_snapshot
+    rng = np.random.default_rng(3)
+    # Kümelenmiş veri: gerçek embedding'ler gibi düzgün dağılmaz
+    centers = rng.normal(size=(20, 32))
+    vectors = [(centers[i % 20] + 0.3 * rng.normal(size=32)).astype(np.float32) for i in range(1000)]
+    for kind, min_ratio in (("int8", 3.9), ("pq", 10.0)):
+        index = HadithEmbeddingIndex(quantization=kind)
+        index.build(list(range(1000)), vectors)
+        stats = index.stats()
+        assert stats["quantization"] == kind
+        # Kod kitabı sabit maliyettir; oran satır başı kodlar üzerinden ölçülür
+        assert stats["float32_bytes"] / index.quant.codes.nbytes >= min_ratio
+        report = index.recall_report([], top_k=5, sample=50)["quantization"]
+        assert report["results"][-1]["recall_at_k"] >= 0.9
+        # Dönen skorlar tam hassasiyetli yeniden skorlamadan gelir
+        ids, scores = index.search(vectors[42], top_k=3)
+        assert ids[0] == 42
+        exact_ids, exact_scores = index.search(vectors[42], top_k=3, exact=True)
+        assert abs(scores[0] - exact_scores[0]) < 1e-6
+        # Delta birleştirme kodları yeniden eğitmeden günceller
+        index.add([42], [vectors[7]])
+        index.compact()
+        assert index.quant.codes.shape[0] == 1000
+        assert index.search(vectors[7], top_k=2)[0].tolist() in ([7, 42], [42, 7])
+    ids, matrix = index.export()
+    embedding_snapshot.write_snapshot(ids, matrix, "m", base_dir=str(tmp_path), quant=("pq", index.quant.to_arrays()))
+    *_, quant = embedding_snapshot.open_snapshot(base_dir=str(tmp_path))
+    assert isinstance(quant["quant_codes"], np.memmap)
+
+
+def test_delta_search_over_fetches_only_shadowed_base_rows():
+    rng = np.random.default_rng(7)
+    vectors = rng.normal(size=(300, 8)).astype(np.float32)
+    index = HadithEmbeddingIndex()
+    index.build(list(range(200)), list(vectors[:200]))
+    # 50 yeni satır + 5 ana segment satırının güncellemesi: yalnızca güncellenenler gölgelenir
+    updated = rng.normal(size=(5, 8)).astype(np.float32)
+    index.add(list(range(200, 250)) + [0, 1, 2, 3, 4], list(vectors[200:250]) + list(updated))
+    assert index._state.shadowed == 5
+    current = np.vstack([updated, vectors[5:250]])
+    current_ids = np.asarray([0, 1, 2, 3, 4] + list(range(5, 250)))
+    current = current / np.linalg.norm(current, axis=1, keepdims=True)
+    for q in rng.normal(size=(20, 8)).astype(np.float32):
+        ids, _ = index.search(q, top_k=10)
+        expected = current_ids[np.argsort(-(current @ (q / np.linalg.norm(q))))[:10]]
+        assert ids.tolist() == expected.tolist()
+
+
+def test_delta_compaction_runs_off_the_request_path(monkeypatch):
+    import asyncio
+    import hadith_index as hi
+    monkeypatch.setattr(hi, "HADITH_INDEX_DELTA_MAX", 10)
+    rng = np.random.default_rng(11)
+    vectors = rng.normal(size=(60, 8)).astype(np.float32)
+
+    async def run():
+        # Sunulan kopya: birleştirme heap'te değil, yeni snapshot yazılarak yapılır
+        served = HadithEmbeddingIndex()
+        served.build(list(range(30)), list(vectors[:30]))
+        rebuilt = []
+
+        async def rebuild_snapshot():
+            rebuilt.append(len(served))
+
+        monkeypatch.setattr(served, "rebuild_snapshot", rebuild_snapshot)
+        served.add(list(range(30, 45)), list(vectors[30:45]))
+        assert served._state.delta_ids.shape[0] == 15
+        await served._compact_task
+        assert rebuilt == [45]
+
+        # Sürüm indeksi: thread'de birleştirilir, bu sırada eklenen satırlar delta'da kalır
+        index = HadithEmbeddingIndex(source="versions")
+        index.build(list(range(30)), list(vectors[:30]))
+        index.add(list(range(30, 45)), list(vectors[30:45]))
+        await asyncio.sleep(0)
+        index.add([0, 50], [vectors[59], vectors[50]])
+        await index._compact_task
+        st = index._state
+        assert st.ids.shape[0] == 45 and sorted(st.delta_ids.tolist()) == [0, 50]
+        assert len(index) == 46
+        assert index.search(vectors[59], top_k=1)[0].tolist() == [0]
+
+    asyncio.run(run())
@@ -0,0 +1,142 @@
+import asyncio
+import json
+
+import httpx
+
+import ultimate_rag_main
+from circuit_breaker import CircuitBreakerRegistry
+from llm_clients import LLMClientPool
+
+
+def test_generation_runs_concurrently_on_pooled_client_and_falls_back(monkeypatch):
+    in_flight = {"now": 0, "max": 0}
+
+    async def handler(request):
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.05)
+        in_flight["now"] -= 1
+        if request.url.host == "api.anthropic.com":
+            return httpx.Response(500)
+        question = json.loads(request.content)["messages"][1]["content"].split("\n")[0]
+        return httpx.Response(200, json={"choices": [{"message": {"content": f"cevap {question}"}}]})
+
+    pool = LLMClientPool(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(ultimate_rag_main, "llm_clients", pool)
+    monkeypatch.setattr(ultimate_rag_main, "_HADIS_AI_AVAILABLE", False)
+    monkeypatch.setattr(ultimate_rag_main, "circuit_breakers", CircuitBreakerRegistry())
+    monkeypatch.setenv("PRIMARY_AI_MODEL", "claude")
+    monkeypatch.setenv("FALLBACK_AI_MODEL", "openai")
+    monkeypatch.setenv("CLAUDE_API_KEY", "k1")
+    monkeypatch.setenv("OPENAI_API_KEY", "k2")
+
+    async def run():
+        results = await asyncio.gather(*[
+            ultimate_rag_main.generate_ai_response_with_fallback(f"soru {i}", []) for i in range(5)
+        ])
+        await pool.aclose()
+        return results
+
+    results = asyncio.run(run())
+    # Claude 5xx verince yedek OpenAI kullanılır; çağrılar aynı anda uçuşta olur
+    assert [kind for _, _, kind in results] == ["openai"] * 5
+    assert results[0][0] == "cevap Question: soru 0"
+    assert in_flight["max"] >= 5
+    assert pool.stats()["openai"]["requests"] == 5 and pool.stats()["openai"]["in_flight"] == 0
+
+
+def test_ask_stream_sends_sources_before_tokens_and_final_answer_last(monkeypatch):
+    import main
+
+    hadiths = [{"id": 7, "source": "Buhârî", "reference": "İman 1", "text": "Ameller niyetlere göredir.", "score": 0.9}]
+
+    async def fake_search(question, top_k=3, source_filter=None, language=None):
+        return hadiths
+
+    async def handler(request):
+        if request.url.host == "api.anthropic.com":
+            # İlk parçadan sonra kopan akış: istemci 'reset' alır, yedek sağlayıcı baştan yazar
+            body = (
+                'data: {"type": "content_block_delta", "delta": {"text": "Yarım"}}\n\n'
+                'data: {"type": "error", "error": {"type": "overloaded_error"}}\n\n'
+            )
+        else:
+            body = "".join(
+                f'data: {json.dumps({"choices": [{"delta": {"content": part}}]})}\n\n' for part in ["Niyet ", "esastır."]
+            ) + "data: [DONE]\n\n"
+        return httpx.Response(200, content=body.encode(), headers={"content-type": "text/event-stream"})
+
+    pool = LLMClientPool(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(ultimate_rag_main, "llm_clients", pool)
+    monkeypatch.setattr(ultimate_rag_main, "_HADIS_AI_AVAILABLE", False)
+    monkeypatch.setattr(ultimate_rag_main, "circuit_breakers", CircuitBreakerRegistry())
+    monkeypatch.setattr(main, "search_hadiths_ultimate", fake_search)
+    monkeypatch.setattr(main.answer_cache, "enabled", False)
+    monkeypatch.setenv("PRIMARY_AI_MODEL", "claude")
+    monkeypatch.setenv("FALLBACK_AI_MODEL", "openai")
+    monkeypatch.setenv("CLAUDE_API_KEY", "k1")
+    monkeypatch.setenv("OPENAI_API_KEY", "k2")
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            resp = await client.post("/api/ask/stream", json={"question": "niyet neden önemlidir", "language": "tr"})
+        await pool.aclose()
+        return resp
+
+    resp = asyncio.run(run())
+    assert resp.status_code == 200 and resp.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in resp.text.strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    kinds = [kind for kind, _ in events]
+    assert kinds == ["sources", "token", "reset", "token", "token", "done"]
+    assert "Buhârî" in events[0][1]["sources"][0]["name"]
+    done = events[-1][1]
+    # Giriş cümlesi ve kaynak filtreleme akışın sonunda uygulanır
+    assert done["answer"] == "Hadis kaynaklarına göre: Niyet esastır."
+    assert done["response_type"] == "openai"
+
+
+def test_open_circuit_skips_provider_until_half_open_probe_succeeds(monkeypatch):
+    calls = []
+
+    async def handler(request):
+        calls.append(request.url.host)
+        if request.url.host == "api.anthropic.com" and len(calls) <= 2:
+            return httpx.Response(503)
+        if request.url.host == "api.anthropic.com":
+            return httpx.Response(200, json={"content": [{"type": "text", "text": "claude cevabı"}]})
+        return httpx.Response(200, json={"choices": [{"message": {"content": "openai cevabı"}}]})
+
+    breakers = CircuitBreakerRegistry()
+    breakers.get("claude").min_requests = 2
+    breakers.get("claude").open_seconds = 0.05
+    pool = LLMClientPool(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(ultimate_rag_main, "llm_clients", pool)
+    monkeypatch.setattr(ultimate_rag_main, "circuit_breakers", breakers)
+    monkeypatch.setattr(ultimate_rag_main, "_HADIS_AI_AVAILABLE", False)
+    monkeypatch.setenv("PRIMARY_AI_MODEL", "claude")
+    monkeypatch.setenv("FALLBACK_AI_MODEL", "openai")
+    monkeypatch.setenv("CLAUDE_API_KEY", "k1")
+    monkeypatch.setenv("OPENAI_API_KEY", "k2")
+
+    async def run():
+        generate = ultimate_rag_main.generate_ai_response_with_fallback
+        # İlk istek: Claude 503 (zamanlayıcı bir kez yeniden dener) -> pencerede 2 hata, devre açılır
+        first = await generate("soru", [])
+        assert breakers.get("claude").state == "open"
+        hosts_before = len(calls)
+        skipped = await generate("soru", [])
+        assert calls[hosts_before:] == ["api.openai.com"]
+        await asyncio.sleep(0.06)
+        # Bekleme bitti: yarı açık deneme başarılı, devre kapanır
+        recovered = await generate("soru", [])
+        await pool.aclose()
+        return first, skipped, recovered
+
+    first, skipped, recovered = asyncio.run(run())
+    assert first[2] == "openai" and skipped[2] == "openai"
+    assert recovered == ("claude cevabı", True, "claude")
+    assert breakers.get("claude").state == "closed" and breakers.get("claude").opens == 1
@@ -0,0 +1,43 @@
+import asyncio
+
+from llm_hedging import LLMHedgePolicy
+
+
+def test_slow_primary_is_hedged_and_loser_cancelled():
+    policy = LLMHedgePolicy(default_delay_ms=30, min_delay_ms=10, max_delay_ms=1000, min_samples=3)
+    cancelled = []
+
+    async def start(name):
+        try:
+            await asyncio.sleep(0.5 if name == "openai" else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(name)
+            raise
+        return f"cevap-{name}"
+
+    result, winner, remaining = asyncio.run(policy.race("openai", "claude", start))
+    assert (result, winner) == ("cevap-claude", "claude")
+    # İptal edilen birincil, yedek sonradan koparsa sırayla denenebilir
+    assert cancelled == ["openai"] and remaining == ["openai"]
+    pair = policy.stats()["pairs"]["openai->claude"]
+    assert pair["hedges"] == 1 and pair["fallback_wins"] == 1 and pair["hedge_rate"] == 1.0
+
+
+def test_fast_primary_is_not_hedged_and_delay_follows_percentile():
+    policy = LLMHedgePolicy(percentile=50, default_delay_ms=30, min_delay_ms=10, max_delay_ms=1000, min_samples=3)
+    started = []
+
+    async def start(name):
+        started.append(name)
+        return None if name == "claude" else "tamam"
+
+    result, winner, remaining = asyncio.run(policy.race("openai", "claude", start))
+    assert (result, winner, started, remaining) == ("tamam", "openai", ["openai"], ["claude"])
+    for ms in (100, 200, 300):
+        policy.record("openai", ms)
+    assert policy.delay_ms("openai") == 200
+    # Akışlı çağrıların ilk parça süreleri akışsız tam cevap sürelerinden ayrı pencerede
+    for ms in (20, 40, 60):
+        policy.record("openai", ms, streaming=True)
+    assert policy.delay_ms("openai", streaming=True) == 40 and policy.delay_ms("openai") == 200
+    assert policy.stats()["pairs"]["openai->claude"]["hedges"] == 0
@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+import httpx
+
+import outbound_scheduler
+from outbound_scheduler import BACKGROUND, FOREGROUND, OutboundScheduler, ProviderLimiter, retry_after_seconds
+
+
+def _status_error(status, headers=None):
+    request = httpx.Request("POST", "https://api.example.test/v1")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    return httpx.HTTPStatusError(str(status), request=request, response=response)
+
+
+def test_429_pauses_provider_for_retry_after_then_retries():
+    scheduler = OutboundScheduler({"openai": (0, 0)})
+    calls = []
+
+    async def fn():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise _status_error(429, {"Retry-After": "0.2"})
+        return "ok"
+
+    assert asyncio.run(scheduler.call("openai", fn, priority=BACKGROUND)) == "ok"
+    assert calls[1] - calls[0] >= 0.19
+    stats = scheduler.stats()["openai"]
+    assert stats["throttled"] == 1 and stats["retries"] == 1
+    assert retry_after_seconds({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0.0
+
+    # İstemci hataları yeniden denenmez
+    async def bad_request():
+        raise _status_error(400)
+
+    try:
+        asyncio.run(scheduler.call("openai", bad_request))
+        assert False, "400 yeniden denenmemeli"
+    except httpx.HTTPStatusError:
+        pass
+    assert scheduler.stats()["openai"]["retries"] == 1
+
+
+def test_foreground_requests_overtake_waiting_background_jobs(monkeypatch):
+    monkeypatch.setattr(outbound_scheduler, "OUTBOUND_FOREGROUND_RESERVE", 0.0)
+    limiter = ProviderLimiter("openai", rpm=600)
+    limiter.requests.level = 0.0
+    order = []
+
+    async def acquire(label, priority, delay):
+        await asyncio.sleep(delay)
+        await limiter.acquire(priority=priority)
+        order.append(label)
+
+    async def run():
+        await asyncio.gather(acquire("backfill", BACKGROUND, 0.0), acquire("ask", FOREGROUND, 0.01))
+
+    asyncio.run(run())
+    assert order == ["ask", "backfill"]
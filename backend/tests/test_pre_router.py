@@ -0,0 +1,24 @@
+from pre_router import AskPreRouter, CLARIFY_REPLIES, GREETING_REPLIES
+
+
+def test_greetings_and_short_questions_skip_the_pipeline():
+    router = AskPreRouter()
+
+    greeting = router.route("  Selamün Aleyküm! ", "tr")
+    assert greeting.response_type == 'greeting' and greeting.answer == GREETING_REPLIES['tr']
+    # Selamlaşma başka dilde yazılsa da tanınır; cevap istek dilinde verilir
+    assert router.route("السلام عليكم", "en").answer == GREETING_REPLIES['en']
+
+    clarify = router.route("neden?", "ar")
+    assert clarify.response_type == 'clarify' and clarify.answer == CLARIFY_REPLIES['ar']
+    # HadisAI konu terimi tek başına sorulursa netleştirme o konuya göre istenir
+    topic = router.route("NAMAZ", "tr")
+    assert topic.response_type == 'clarify' and '“namaz”' in topic.answer
+
+    assert router.route("Selam, namaz nasıl kılınır?", "tr") is None
+    stats = router.stats()
+    assert stats['checked'] == 5 and stats['routes'] == {'clarify': 2, 'greeting': 2}
+    assert stats['saved_paid_calls'] == 8
+
+    disabled = AskPreRouter(enabled=False)
+    assert disabled.route("selam", "tr") is None and disabled.stats()['checked'] == 0
@@ -0,0 +1,27 @@
+from vector_search import reciprocal_rank_fusion, weighted_score_fusion
+
+
+def test_rank_fusion_prefers_documents_found_by_both_engines():
+    fused = reciprocal_rank_fusion({"vector": [1, 2, 3], "lexical": [3, 4]})
+    assert fused[0][0] == 3
+    assert [i for i, _ in fused][:2] == [3, 1] and len(fused) == 4
+    fused = weighted_score_fusion(
+        {"vector": ([1, 2, 3], [0.9, 0.8, 0.1]), "lexical": ([2, 5], [7.0, 1.0])},
+        {"vector": 0.5, "lexical": 0.5},
+    )
+    assert fused[0][0] == 2
+
+
+def test_query_language_routing_and_cross_language_merge():
+    from vector_search import detect_query_language, merge_language_results, route_query_language
+
+    assert detect_query_language("ما هو الإحسان") == "ar"
+    assert detect_query_language("What did the prophet say about prayer?") == "en"
+    assert detect_query_language("namaz hakkında hadis") == "tr"
+    # Arap harfli sorgu bildirilen dilden bağımsız olarak Arapça indekse gider
+    assert route_query_language("ما هو الإحسان", declared="tr") == "ar"
+    assert route_query_language("What is ihsan?", declared=None) == "en"
+    assert route_query_language("What is ihsan?", declared="tr") == "tr"
+
+    ids, scores = merge_language_results([([1, 2], [0.9, 0.5]), ([2, 3], [0.95, 0.4])], top_k=2)
+    assert ids == [2, 1] and scores == [0.95, 0.9]
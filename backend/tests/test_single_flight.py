@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight, SingleFlightAborted, ask_flight_key
+
+
+def test_concurrent_duplicates_share_one_call_and_errors():
+    flight = SingleFlight()
+    calls = []
+
+    async def answer(question):
+        calls.append(question)
+        await asyncio.sleep(0.02)
+        if question == "hata":
+            raise RuntimeError("sağlayıcı hatası")
+        return f"cevap: {question}"
+
+    async def ask(question, language="tr", source_filter="all"):
+        key = ask_flight_key(question, language, source_filter)
+        return await flight.do(key, lambda: answer(question))
+
+    async def run():
+        results = await asyncio.gather(
+            ask("Niyet nedir?"), ask("  niyet   NEDİR? "), ask("niyet nedir?", source_filter="quran"),
+        )
+        errors = await asyncio.gather(ask("hata"), ask("hata"), return_exceptions=True)
+        return results, errors
+
+    results, errors = asyncio.run(run())
+    assert [shared for _, shared in results] == [False, True, False]
+    assert results[0][0] == results[1][0]
+    # Farklı kaynak filtresi ayrı iş; hata tüm bekleyenlere iletilir ve tek çağrı yapılır
+    assert calls == ["Niyet nedir?", "niyet nedir?", "hata"]
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    stats = flight.stats()
+    assert stats["leaders"] == 3 and stats["followers"] == 2 and stats["in_flight"] == 0
+
+
+def test_follower_takes_over_when_leader_aborts():
+    flight = SingleFlight()
+    key = ask_flight_key("soru", "tr", "all")
+
+    async def run():
+        leader = flight.begin(key)
+        follower = asyncio.create_task(flight.do(key, lambda: asyncio.sleep(0, result="yeni cevap")))
+        await asyncio.sleep(0)
+        flight.finish(key, leader, error=SingleFlightAborted())
+        return await follower
+
+    assert asyncio.run(run()) == ("yeni cevap", False)
+    assert flight.stats()["aborted"] == 1
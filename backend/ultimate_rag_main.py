@@ -1,23 +1,48 @@
 import os
 import asyncio
-from typing import List, Dict, Tuple
+import time
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 
 # Proje içi modüller
-from vector_search import search_hadiths, cosine_similarity
-from embedding_utils import generate_embedding
+from vector_search import search_hadiths
+from hadith_filters import GENERIC_SOURCE_FILTERS, parse_filters
 try:
     from ai_models.hadis_model import hadis_ai_model
     _HADIS_AI_AVAILABLE = True
 except Exception:
     _HADIS_AI_AVAILABLE = False
 
-import requests
 import json
 
+import httpx
 
-async def search_hadiths_ultimate(question: str, top_k: int = 3) -> List[Dict]:
+from circuit_breaker import circuit_breakers
+from llm_clients import llm_clients
+from llm_hedging import llm_hedging
+from outbound_scheduler import estimate_tokens, outbound_scheduler
+
+
+def ask_filters(source_filter: Optional[str] = None, language: Optional[str] = None) -> Dict[str, List[str]]:
+    """AskRequest alanlarını hadis arama filtresine çevirir.
+
+    source_filter 'all'/'hadis'/'quran' dışındaysa hadis kaynağı (örn. 'Buhari') kabul edilir.
+    """
+    source = None if (source_filter or '').strip().lower() in GENERIC_SOURCE_FILTERS else source_filter
+    return parse_filters(source=source, language=language)
+
+
+async def search_hadiths_ultimate(
+    question: str,
+    top_k: int = 3,
+    source_filter: Optional[str] = None,
+    language: Optional[str] = None,
+) -> List[Dict]:
     """Vektör araması ile ilgili hadisleri bulur ve dict liste döndürür.
 
+    source_filter/language verilirse arama bu alt kümeyle sınırlanır; dil filtresiyle
+    sonuç çıkmazsa dil bir tercih sayılıp filtre olmadan tekrar aranır. Vektör aramasında
+    language ayrıca o dilin metin embedding'lerinin aranmasını sağlar.
+
     Dönen her öğe aşağıdaki anahtarları içerir:
     - id
     - text (turkish_text öncelikli)
@@ -25,16 +50,14 @@ async def search_hadiths_ultimate(question: str, top_k: int = 3) -> List[Dict]:
     - reference
     - full_reference (source + reference)
     """
-    results = await search_hadiths(question, top_k=top_k)
-    # Sorgu embedding'i (varsa) ile puan hesaplamak için hazırla
-    query_emb = generate_embedding(question)
-    if isinstance(query_emb, str):
-        try:
-            query_emb = [float(x) for x in query_emb.split(',') if x.strip()]
-        except Exception:
-            query_emb = None
+    filters = ask_filters(source_filter, language)
+    # Skorlar arama katmanından gelir; soru ikinci kez embed edilmez
+    results = await search_hadiths(question, top_k=top_k, filters=filters, language=language)
+    if not results and 'language' in filters:
+        filters.pop('language')
+        results = await search_hadiths(question, top_k=top_k, filters=filters, language=language)
     hadith_dicts: List[Dict] = []
-    for h in results:
+    for h, score_val in results:
         text = (
             getattr(h, 'turkish_text', None)
             or getattr(h, 'english_text', None)
@@ -43,15 +66,6 @@ async def search_hadiths_ultimate(question: str, top_k: int = 3) -> List[Dict]:
         )
         source = getattr(h, 'source', '')
         reference = getattr(h, 'reference', '')
-        # Skor: embedding mevcutsa kosinüs benzerliği
-        score_val = None
-        try:
-            emb_str = getattr(h, 'embedding', None)
-            if emb_str and query_emb:
-                emb_vec = [float(x) for x in emb_str.split(',') if x.strip()]
-                score_val = float(cosine_similarity(query_emb, emb_vec))
-        except Exception:
-            score_val = None
 
         hadith_dicts.append({
             'id': getattr(h, 'id', None),
@@ -75,7 +89,34 @@ def _build_hadith_context(hadith_dicts: List[Dict]) -> str:
     return "\n".join(lines)
 
 
-def _call_gemini(question: str, hadith_context: str, language: str = 'tr') -> str:
+async def _post_checked(provider: str, url: str, **kwargs) -> httpx.Response:
+    """Sağlayıcının paylaşılan async istemcisiyle POST; zamanlayıcı 429/5xx'te Retry-After'a uyarak yeniden dener.
+
+    Her deneme sağlayıcının devre kesicisinden geçer; devre açıksa istek atılmadan CircuitOpenError fırlar.
+    """
+    return await circuit_breakers.get(provider).call(lambda: llm_clients.post(provider, url, **kwargs))
+
+
+async def _open_stream_checked(provider: str, url: str, **kwargs) -> httpx.Response:
+    """Akışlı POST'un devre kesicili hali; süre ilk başlıklar gelene kadar ölçülür."""
+    return await circuit_breakers.get(provider).call(lambda: llm_clients.open_stream(provider, url, **kwargs))
+
+
+async def _sse_events(resp: httpx.Response) -> AsyncIterator[Dict]:
+    """Sağlayıcının SSE akışındaki 'data:' satırlarını JSON olarak döner."""
+    async for line in resp.aiter_lines():
+        if not line.startswith('data:'):
+            continue
+        data = line[5:].strip()
+        if not data or data == '[DONE]':
+            continue
+        try:
+            yield json.loads(data)
+        except ValueError:
+            continue
+
+
+async def _call_gemini(question: str, hadith_context: str, language: str = 'tr') -> str:
     """Gemini HTTP API çağrısı (opsiyonel).
 
     Ortam değişkenlerinden URL ve API key okur. Yapılandırılmamışsa özel bir işaret döner.
@@ -94,7 +135,11 @@ def _call_gemini(question: str, hadith_context: str, language: str = 'tr') -> st
             'Authorization': f'Bearer {api_key}',
             'Content-Type': 'application/json'
         }
-        resp = requests.post(url, json=payload, headers=headers, timeout=30)
+        resp = await outbound_scheduler.call(
+            'gemini',
+            lambda: _post_checked('gemini', url, json=payload, headers=headers),
+            tokens=estimate_tokens(question, hadith_context),
+        )
         if resp.status_code != 200:
             return "__GEMINI_ERROR__"
         data = resp.json()
@@ -102,8 +147,8 @@ def _call_gemini(question: str, hadith_context: str, language: str = 'tr') -> st
     except Exception:
         return "__GEMINI_ERROR__"
 
-def _call_openai(question: str, hadith_context: str, language: str = 'tr') -> str:
-    """OpenAI Chat Completions çağrısı (HTTP üzerinden).
+def _openai_request(question: str, hadith_context: str, language: str = 'tr') -> Optional[Tuple[str, Dict, Dict, int]]:
+    """OpenAI Chat Completions isteği: (url, headers, body, tahmini token). Anahtar yoksa None.
 
     Gerekli ortam değişkenleri: OPENAI_API_KEY, OPENAI_MODEL, OPENAI_MAX_TOKENS, TEMPERATURE
     """
@@ -112,51 +157,63 @@ def _call_openai(question: str, hadith_context: str, language: str = 'tr') -> st
     max_tokens = int(os.getenv('OPENAI_MAX_TOKENS') or 1500)
     temperature = float(os.getenv('TEMPERATURE') or 0.7)
     if not api_key:
+        return None
+    url = 'https://api.openai.com/v1/chat/completions'
+    headers = {
+        'Authorization': f'Bearer {api_key}',
+        'Content-Type': 'application/json'
+    }
+    lang = (language or 'tr').lower()
+    if lang == 'en':
+        system_prompt = (
+            "Answer only using the Qur'an, Kutub al-Sittah and reputable fiqh sources. "
+            "Always include precise sources at the end (book name and hadith number if available; for fiqh, scholar name and work). "
+            "Do not add personal opinions."
+        )
+        answer_lang_directive = "Respond in English."
+    elif lang == 'ar':
+        system_prompt = (
+            "أجب فقط باستخدام القرآن وكتب الستّة ومصادر الفقه المعتبرة. "
+            "اذكر مصادر دقيقة في نهاية الإجابة (اسم الكتاب ورقم الحديث إن وُجد، وللفقه اسم العالم وكتابه). "
+            "لا تُضِف آراءً شخصية."
+        )
+        answer_lang_directive = "أجب باللغة العربية."
+    else:
+        system_prompt = (
+            "Sadece Kur'an, Kütüb-i Sitte ve muteber fıkıh kaynaklarından cevap ver. "
+            "Kaynakları her zaman somut ve net yaz (kitap adı ve hadis numarası varsa ekle; fıkıh için âlim adı ve eseri). "
+            "Kişisel yorum ekleme."
+        )
+        answer_lang_directive = "Cevabı Türkçe ver."
+    user_text = (
+        f"Question: {question}\n\n"
+        f"Context (hadith excerpts):\n{hadith_context}\n\n"
+        "Use the context above to produce a reliable, sourced answer. "
+        f"{answer_lang_directive}"
+    )
+    body = {
+        'model': model,
+        'temperature': temperature,
+        'max_tokens': max_tokens,
+        'messages': [
+            {'role': 'system', 'content': system_prompt},
+            {'role': 'user', 'content': user_text},
+        ]
+    }
+    return url, headers, body, estimate_tokens(system_prompt, user_text) + max_tokens
+
+async def _call_openai(question: str, hadith_context: str, language: str = 'tr') -> str:
+    """OpenAI Chat Completions çağrısı (HTTP üzerinden)."""
+    request = _openai_request(question, hadith_context, language)
+    if request is None:
         return "__OPENAI_NOT_CONFIGURED__"
+    url, headers, body, tokens = request
     try:
-        url = 'https://api.openai.com/v1/chat/completions'
-        headers = {
-            'Authorization': f'Bearer {api_key}',
-            'Content-Type': 'application/json'
-        }
-        lang = (language or 'tr').lower()
-        if lang == 'en':
-            system_prompt = (
-                "Answer only using the Qur'an, Kutub al-Sittah and reputable fiqh sources. "
-                "Always include precise sources at the end (book name and hadith number if available; for fiqh, scholar name and work). "
-                "Do not add personal opinions."
-            )
-            answer_lang_directive = "Respond in English."
-        elif lang == 'ar':
-            system_prompt = (
-                "أجب فقط باستخدام القرآن وكتب الستّة ومصادر الفقه المعتبرة. "
-                "اذكر مصادر دقيقة في نهاية الإجابة (اسم الكتاب ورقم الحديث إن وُجد، وللفقه اسم العالم وكتابه). "
-                "لا تُضِف آراءً شخصية."
-            )
-            answer_lang_directive = "أجب باللغة العربية."
-        else:
-            system_prompt = (
-                "Sadece Kur'an, Kütüb-i Sitte ve muteber fıkıh kaynaklarından cevap ver. "
-                "Kaynakları her zaman somut ve net yaz (kitap adı ve hadis numarası varsa ekle; fıkıh için âlim adı ve eseri). "
-                "Kişisel yorum ekleme."
-            )
-            answer_lang_directive = "Cevabı Türkçe ver."
-        user_text = (
-            f"Question: {question}\n\n"
-            f"Context (hadith excerpts):\n{hadith_context}\n\n"
-            "Use the context above to produce a reliable, sourced answer. "
-            f"{answer_lang_directive}"
+        resp = await outbound_scheduler.call(
+            'openai',
+            lambda: _post_checked('openai', url, headers=headers, content=json.dumps(body)),
+            tokens=tokens,
         )
-        body = {
-            'model': model,
-            'temperature': temperature,
-            'max_tokens': max_tokens,
-            'messages': [
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': user_text},
-            ]
-        }
-        resp = requests.post(url, headers=headers, data=json.dumps(body), timeout=30)
         if resp.status_code != 200:
             return "__OPENAI_ERROR__"
         data = resp.json()
@@ -167,8 +224,34 @@ def _call_openai(question: str, hadith_context: str, language: str = 'tr') -> st
     except Exception:
         return "__OPENAI_ERROR__"
 
-def _call_claude(question: str, hadith_context: str, language: str = 'tr') -> str:
-    """Anthropic Claude Messages API çağrısı.
+async def _stream_openai(question: str, hadith_context: str, language: str = 'tr') -> AsyncIterator[str]:
+    """OpenAI cevabını sağlayıcı ürettikçe parça parça döner; hata durumunda istisna fırlatır."""
+    request = _openai_request(question, hadith_context, language)
+    if request is None:
+        raise RuntimeError("__OPENAI_NOT_CONFIGURED__")
+    url, headers, body, tokens = request
+    body = dict(body, stream=True)
+    # Yeniden deneme yalnızca ilk bayttan önce yapılır; akış başladıktan sonra kopma fallback'e düşer
+    resp = await outbound_scheduler.call(
+        'openai',
+        lambda: _open_stream_checked('openai', url, headers=headers, content=json.dumps(body)),
+        tokens=tokens,
+    )
+    try:
+        async for event in _sse_events(resp):
+            choices = event.get('choices') or []
+            delta = (choices[0].get('delta') or {}).get('content') if choices else None
+            if delta:
+                yield delta
+    except Exception as e:
+        # Akış ortasında kopma da sağlayıcı hatası sayılır
+        circuit_breakers.get('openai').record_error(e)
+        raise
+    finally:
+        await llm_clients.close_stream('openai', resp)
+
+def _claude_request(question: str, hadith_context: str, language: str = 'tr') -> Optional[Tuple[str, Dict, Dict, int]]:
+    """Anthropic Claude Messages isteği: (url, headers, body, tahmini token). Anahtar yoksa None.
 
     Gerekli ortam değişkenleri: CLAUDE_API_KEY, CLAUDE_MODEL, CLAUDE_MAX_TOKENS, TEMPERATURE
     """
@@ -177,55 +260,67 @@ def _call_claude(question: str, hadith_context: str, language: str = 'tr') -> st
     max_tokens = int(os.getenv('CLAUDE_MAX_TOKENS') or 1500)
     temperature = float(os.getenv('TEMPERATURE') or 0.7)
     if not api_key:
+        return None
+    url = 'https://api.anthropic.com/v1/messages'
+    headers = {
+        'x-api-key': api_key,
+        'anthropic-version': '2023-06-01',
+        'content-type': 'application/json'
+    }
+    lang = (language or 'tr').lower()
+    if lang == 'en':
+        system_prompt = (
+            "Answer only using the Qur'an, Kutub al-Sittah and reputable fiqh sources. "
+            "Always include sources at the end. Do not add personal opinions."
+        )
+        answer_lang_directive = "Respond in English."
+    elif lang == 'ar':
+        system_prompt = (
+            "أجب فقط باستخدام القرآن وكتب الستّة ومصادر الفقه المعتبرة. "
+            "اذكر المصادر في نهاية كل إجابة. لا تُضِف آراءً شخصية."
+        )
+        answer_lang_directive = "أجب باللغة العربية."
+    else:
+        system_prompt = (
+            "Sadece Kur'an, Kütüb-i Sitte ve muteber fıkıh kaynaklarından cevap ver. "
+            "Her cevabın sonunda kaynak belirt. Kişisel yorum ekleme."
+        )
+        answer_lang_directive = "Cevabı Türkçe ver."
+    body = {
+        'model': model,
+        'max_tokens': max_tokens,
+        'temperature': temperature,
+        'system': system_prompt,
+        'messages': [
+            {
+                'role': 'user',
+                'content': [
+                    {
+                        'type': 'text',
+                        'text': (
+                            f"Question: {question}\n\nContext (hadith excerpts):\n{hadith_context}\n\n"
+                            "Use the context above to produce a reliable answer with precise sources. "
+                            f"{answer_lang_directive}"
+                        )
+                    }
+                ]
+            }
+        ]
+    }
+    return url, headers, body, estimate_tokens(system_prompt, question, hadith_context) + max_tokens
+
+async def _call_claude(question: str, hadith_context: str, language: str = 'tr') -> str:
+    """Anthropic Claude Messages API çağrısı."""
+    request = _claude_request(question, hadith_context, language)
+    if request is None:
         return "__CLAUDE_NOT_CONFIGURED__"
+    url, headers, body, tokens = request
     try:
-        url = 'https://api.anthropic.com/v1/messages'
-        headers = {
-            'x-api-key': api_key,
-            'anthropic-version': '2023-06-01',
-            'content-type': 'application/json'
-        }
-        lang = (language or 'tr').lower()
-        if lang == 'en':
-            system_prompt = (
-                "Answer only using the Qur'an, Kutub al-Sittah and reputable fiqh sources. "
-                "Always include sources at the end. Do not add personal opinions."
-            )
-            answer_lang_directive = "Respond in English."
-        elif lang == 'ar':
-            system_prompt = (
-                "أجب فقط باستخدام القرآن وكتب الستّة ومصادر الفقه المعتبرة. "
-                "اذكر المصادر في نهاية كل إجابة. لا تُضِف آراءً شخصية."
-            )
-            answer_lang_directive = "أجب باللغة العربية."
-        else:
-            system_prompt = (
-                "Sadece Kur'an, Kütüb-i Sitte ve muteber fıkıh kaynaklarından cevap ver. "
-                "Her cevabın sonunda kaynak belirt. Kişisel yorum ekleme."
-            )
-            answer_lang_directive = "Cevabı Türkçe ver."
-        body = {
-            'model': model,
-            'max_tokens': max_tokens,
-            'temperature': temperature,
-            'system': system_prompt,
-            'messages': [
-                {
-                    'role': 'user',
-                    'content': [
-                        {
-                            'type': 'text',
-                            'text': (
-                                f"Question: {question}\n\nContext (hadith excerpts):\n{hadith_context}\n\n"
-                                "Use the context above to produce a reliable answer with precise sources. "
-                                f"{answer_lang_directive}"
-                            )
-                        }
-                    ]
-                }
-            ]
-        }
-        resp = requests.post(url, headers=headers, data=json.dumps(body), timeout=30)
+        resp = await outbound_scheduler.call(
+            'claude',
+            lambda: _post_checked('claude', url, headers=headers, content=json.dumps(body)),
+            tokens=tokens,
+        )
         if resp.status_code != 200:
             return "__CLAUDE_ERROR__"
         data = resp.json()
@@ -237,8 +332,42 @@ def _call_claude(question: str, hadith_context: str, language: str = 'tr') -> st
     except Exception:
         return "__CLAUDE_ERROR__"
 
+async def _stream_claude(question: str, hadith_context: str, language: str = 'tr') -> AsyncIterator[str]:
+    """Claude cevabını content_block_delta olaylarından parça parça döner; hata durumunda istisna fırlatır."""
+    request = _claude_request(question, hadith_context, language)
+    if request is None:
+        raise RuntimeError("__CLAUDE_NOT_CONFIGURED__")
+    url, headers, body, tokens = request
+    body = dict(body, stream=True)
+    resp = await outbound_scheduler.call(
+        'claude',
+        lambda: _open_stream_checked('claude', url, headers=headers, content=json.dumps(body)),
+        tokens=tokens,
+    )
+    try:
+        async for event in _sse_events(resp):
+            kind = event.get('type')
+            if kind == 'error':
+                raise RuntimeError(f"__CLAUDE_ERROR__: {event.get('error')}")
+            if kind == 'content_block_delta':
+                delta = (event.get('delta') or {}).get('text')
+                if delta:
+                    yield delta
+    except Exception as e:
+        # Akış ortasında kopma da sağlayıcı hatası sayılır
+        circuit_breakers.get('claude').record_error(e)
+        raise
+    finally:
+        await llm_clients.close_stream('claude', resp)
+
 
-def generate_ai_response_with_fallback(question: str, hadith_dicts: List[Dict], enable_gemini_fallback: bool = True, language: str = 'tr') -> Tuple[str, bool, str]:
+_LLM_FAILURE_MARKERS = {
+    "__OPENAI_ERROR__", "__OPENAI_NOT_CONFIGURED__", "__CLAUDE_ERROR__", "__CLAUDE_NOT_CONFIGURED__",
+    "__GEMINI_ERROR__", "__GEMINI_NOT_CONFIGURED__", "__MODEL_NOT_CONFIGURED__", "__CIRCUIT_OPEN__",
+}
+
+
+async def generate_ai_response_with_fallback(question: str, hadith_dicts: List[Dict], enable_gemini_fallback: bool = True, language: str = 'tr') -> Tuple[str, bool, str]:
     """Önce yerel Hadis AI ile yanıt üretir, sonra PRIMARY/FALLBACK AI modeline göre düşer.
 
     Returns: (answer, used_fallback, response_type)
@@ -249,7 +378,8 @@ def generate_ai_response_with_fallback(question: str, hadith_dicts: List[Dict],
     # 1) Yerel Hadis AI (varsa ve güvenilir sonuç üretirse)
     if _HADIS_AI_AVAILABLE:
         try:
-            result = hadis_ai_model.generate_response(question, hadith_context)
+            # Yerel model CPU'da çalışır; event loop'u bloklamaması için thread'e alınır
+            result = await asyncio.to_thread(hadis_ai_model.generate_response, question, hadith_context)
             answer = result.get('answer') or ''
             confidence = float(result.get('confidence') or 0.0)
             if confidence >= 0.7 and answer:
@@ -262,31 +392,148 @@ def generate_ai_response_with_fallback(question: str, hadith_dicts: List[Dict],
     primary = (os.getenv('PRIMARY_AI_MODEL') or '').strip().lower() or 'openai'
     fallback = (os.getenv('FALLBACK_AI_MODEL') or '').strip().lower() or 'openai'
 
-    def _call_by_name(name: str) -> Tuple[str, str]:
+    async def _call_by_name(name: str) -> Tuple[str, str]:
+        # Devresi açık sağlayıcı bağlantı/zaman aşımı beklenmeden atlanır
+        if circuit_breakers.get(name).is_open:
+            return "__CIRCUIT_OPEN__", name
         if name == 'openai':
-            return _call_openai(question, hadith_context, language), 'openai'
+            return await _call_openai(question, hadith_context, language), 'openai'
         if name == 'claude':
-            return _call_claude(question, hadith_context, language), 'claude'
+            return await _call_claude(question, hadith_context, language), 'claude'
         if name == 'gemini' and enable_gemini_fallback:
-            return _call_gemini(question, hadith_context, language), 'gemini'
+            return await _call_gemini(question, hadith_context, language), 'gemini'
         # Tanınmayan isim -> yapılandırılmamış say
         return "__MODEL_NOT_CONFIGURED__", name or 'unknown'
 
-    # Önce PRIMARY
-    ans1, t1 = _call_by_name(primary)
-    if ans1 not in {"__OPENAI_ERROR__", "__OPENAI_NOT_CONFIGURED__", "__CLAUDE_ERROR__", "__CLAUDE_NOT_CONFIGURED__", "__GEMINI_ERROR__", "__GEMINI_NOT_CONFIGURED__", "__MODEL_NOT_CONFIGURED__"} and ans1:
-        return ans1, True, t1
+    async def _attempt(name: str) -> Optional[Tuple[str, str]]:
+        started = time.perf_counter()
+        ans, kind = await _call_by_name(name)
+        if not ans or ans in _LLM_FAILURE_MARKERS:
+            return None
+        llm_hedging.record(name, (time.perf_counter() - started) * 1000)
+        return ans, kind
 
-    # Sonra FALLBACK
-    ans2, t2 = _call_by_name(fallback)
-    if ans2 not in {"__OPENAI_ERROR__", "__OPENAI_NOT_CONFIGURED__", "__CLAUDE_ERROR__", "__CLAUDE_NOT_CONFIGURED__", "__GEMINI_ERROR__", "__GEMINI_NOT_CONFIGURED__", "__MODEL_NOT_CONFIGURED__"} and ans2:
-        return ans2, True, t2
+    # Önce PRIMARY; gecikirse FALLBACK paralel başlar (hedge), ilk başarılı cevap kullanılır.
+    # PRIMARY erken hata verirse FALLBACK sırayla denenir.
+    result, _, remaining = await llm_hedging.race(primary, fallback, _attempt)
+    if result is None:
+        for name in remaining:
+            result = await _attempt(name)
+            if result is not None:
+                break
+    if result is not None:
+        return result[0], True, result[1]
 
     # 3) Son çare: bulunan hadislerden derlenmiş yanıt
     if hadith_dicts:
         return _compose_answer_from_hadiths(question, hadith_dicts), True, 'hadis_compose'
     return "Sorunuzu daha açık yazar mısınız?", True, 'fallback'
 
+class AnswerStream:
+    """generate_ai_response_with_fallback'in akışlı karşılığı: aynı fallback zinciri, parça parça cevap.
+
+    Olaylar: ('delta', metin) ve ('reset', None). Sağlayıcı akışın ortasında koparsa o ana kadarki
+    metin geçersizdir ('reset') ve sıradaki sağlayıcının cevabı baştan gelir. Akış bitince answer,
+    used_fallback ve response_type dolar.
+    """
+
+    def __init__(self, question: str, hadith_dicts: List[Dict], enable_gemini_fallback: bool = True, language: str = 'tr'):
+        self.question = question
+        self.hadith_dicts = hadith_dicts
+        self.enable_gemini_fallback = enable_gemini_fallback
+        self.language = language
+        self.answer = ''
+        self.used_fallback = True
+        self.response_type = ''
+
+    def __aiter__(self) -> AsyncIterator[Tuple[str, Optional[str]]]:
+        return self._events()
+
+    def _provider_stream(self, name: str, hadith_context: str) -> Optional[AsyncIterator[str]]:
+        if circuit_breakers.get(name).is_open:
+            return None
+        if name == 'openai':
+            return _stream_openai(self.question, hadith_context, self.language)
+        if name == 'claude':
+            return _stream_claude(self.question, hadith_context, self.language)
+        if name == 'gemini' and self.enable_gemini_fallback:
+            return self._gemini_stream(hadith_context)
+        return None
+
+    async def _gemini_stream(self, hadith_context: str) -> AsyncIterator[str]:
+        # Gemini uç noktası akış desteklemez; cevap tek parça gelir
+        answer = await _call_gemini(self.question, hadith_context, self.language)
+        if answer in {"__GEMINI_ERROR__", "__GEMINI_NOT_CONFIGURED__"} or not answer:
+            raise RuntimeError(answer or "__GEMINI_ERROR__")
+        yield answer
+
+    async def _events(self) -> AsyncIterator[Tuple[str, Optional[str]]]:
+        hadith_context = _build_hadith_context(self.hadith_dicts)
+        if _HADIS_AI_AVAILABLE:
+            try:
+                result = await asyncio.to_thread(hadis_ai_model.generate_response, self.question, hadith_context)
+                answer = result.get('answer') or ''
+                if float(result.get('confidence') or 0.0) >= 0.7 and answer:
+                    self.answer, self.used_fallback, self.response_type = answer, False, 'hadis_ai'
+                    yield 'delta', answer
+                    return
+            except Exception:
+                pass
+
+        primary = (os.getenv('PRIMARY_AI_MODEL') or '').strip().lower() or 'openai'
+        fallback = (os.getenv('FALLBACK_AI_MODEL') or '').strip().lower() or 'openai'
+
+        async def _open(name: str) -> Optional[Tuple[str, AsyncIterator[str], str]]:
+            # Sağlayıcı ilk parçayı verene kadar bekler; hedge kararı ilk parçaya göre verilir
+            stream = self._provider_stream(name, hadith_context)
+            if stream is None:
+                return None
+            started = time.perf_counter()
+            try:
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                return None
+            except Exception as e:
+                print(f"[LLM] {name} akışı başarısız: {e}")
+                return None
+            llm_hedging.record(name, (time.perf_counter() - started) * 1000, streaming=True)
+            return name, stream, first
+
+        async def _discard(opened: Tuple[str, AsyncIterator[str], str]) -> None:
+            await opened[1].aclose()
+
+        opened, _, remaining = await llm_hedging.race(primary, fallback, _open, _discard, streaming=True)
+        while True:
+            if opened is None:
+                if not remaining:
+                    break
+                opened = await _open(remaining.pop(0))
+                continue
+            name, stream, first = opened
+            opened = None
+            parts = [first]
+            yield 'delta', first
+            try:
+                async for delta in stream:
+                    parts.append(delta)
+                    yield 'delta', delta
+            except Exception as e:
+                print(f"[LLM] {name} akışı başarısız: {e}")
+                yield 'reset', None
+                continue
+            finally:
+                await stream.aclose()
+            self.answer, self.response_type = ''.join(parts), name
+            return
+
+        # Son çare: bulunan hadislerden derlenmiş yanıt
+        if self.hadith_dicts:
+            self.answer, self.response_type = _compose_answer_from_hadiths(self.question, self.hadith_dicts), 'hadis_compose'
+        else:
+            self.answer, self.response_type = "Sorunuzu daha açık yazar mısınız?", 'fallback'
+        yield 'delta', self.answer
+
+
 def _compose_answer_from_hadiths(question: str, hadith_dicts: List[Dict], max_items: int = 3) -> str:
     """Gemini kapalı olduğunda veya yanıt veremediğinde, bulunan hadislerden
     anlaşılır ve kaynaklı bir cevap oluşturur."""
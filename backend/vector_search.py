@@ -1,12 +1,28 @@
 import asyncio
+import os
 import re
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import AsyncSessionLocal
 from models import Hadith
 from embedding_utils import generate_embedding
+from hadith_index import hadith_index, language_indexes
+from bm25_index import HADITH_LEXICAL_ENGINE, hadith_bm25, preprocess
+from hadith_fts import fts_search
+from hadith_filters import filter_clauses, hadith_filters
 from sqlalchemy import select, or_
+from sqlalchemy.orm import load_only
 import math
 import json
+from typing import Dict, List, Optional, Sequence, Tuple
+from latency_stats import LatencyRegistry
+
+# Arama sonuçlarında gösterim için yüklenen sütunlar (embedding yüklenmez)
+DISPLAY_COLUMNS = (
+    Hadith.id, Hadith.hadis_id, Hadith.kitap, Hadith.bab, Hadith.hadis_no,
+    Hadith.arabic_text, Hadith.turkish_text, Hadith.english_text,
+    Hadith.source, Hadith.reference, Hadith.category, Hadith.language,
+    Hadith.authenticity,
+)
 
 def simple_distance(a: str, b: str) -> int:
     # Dummy: hash stringlerinin farkı (gerçek projede cosine similarity vs. kullanılmalı)
@@ -16,142 +32,316 @@ def cosine_similarity(a, b):
     # Numpy olmadan kosinüs benzerliği
     if not a or not b:
         return 0.0
-    # Farklı uzunluklarda ise eşleşen kısmı kullan
-    length = min(len(a), len(b))
-    if length == 0:
-        return 0.0
-    dot = sum(a[i] * b[i] for i in range(length))
-    norm_a = math.sqrt(sum(x * x for x in a[:length]))
-    norm_b = math.sqrt(sum(x * x for x in b[:length]))
+    # Farklı modellerin vektörleri karşılaştırılamaz; kırpmak sessizce yanlış skor üretir
+    if len(a) != len(b):
+        raise ValueError(f"Embedding boyutları uyuşmuyor: {len(a)} != {len(b)}")
+    dot = sum(x * y for x, y in zip(a, b))
+    norm_a = math.sqrt(sum(x * x for x in a))
+    norm_b = math.sqrt(sum(x * x for x in b))
     if norm_a == 0.0 or norm_b == 0.0:
         return 0.0
     return float(dot / (norm_a * norm_b))
 
-async def search_hadiths(query: str, top_k: int = 3):
-    # Sorgu ön-işleme: durak kelimeleri ve gürültüyü temizleyip anahtar kelimeleri çıkar
-    def preprocess(q: str):
-        q = q.lower().strip()
-        q = re.sub(r"[\.,;:!\?\(\)\[\]\{\}\-]", " ", q)
-        parts = [p for p in q.split() if p]
-        stopwords = {
-            "ile", "ilgili", "hakkinda", "hakkında", "uzerine", "üzerine", "konusunda",
-            "nedir", "nasil", "nasıl", "lütfen", "lutfen", "ver", "verir", "misin", "misiniz",
-            "hadis", "hadisler", "ayet", "ayetler", "kaynak", "kaynaklar", "bu", "konu", "konuda",
-        }
-        tokens = [t for t in parts if t not in stopwords]
-        # Çok genel isteklerde anahtar kelimeyi koru
-        if not tokens and any(w in parts for w in ("namaz", "oruç", "zekat", "hac")):
-            tokens = [w for w in parts if w in ("namaz", "oruç", "zekat", "hac")]
-        seen = set()
-        dedup = []
-        for t in tokens:
-            if t not in seen:
-                seen.add(t)
-                dedup.append(t)
-        return dedup
+async def load_display_hadiths(session: AsyncSession, ids):
+    """Verilen id sırasını koruyarak hadislerin yalnızca gösterim sütunlarını yükler."""
+    ids = [int(i) for i in ids]
+    if not ids:
+        return []
+    result = await session.execute(
+        select(Hadith).options(load_only(*DISPLAY_COLUMNS)).where(Hadith.id.in_(ids))
+    )
+    by_id = {h.id: h for h in result.scalars().all()}
+    return [by_id[i] for i in ids if i in by_id]
 
-    tokens = preprocess(query)
-    query_emb = generate_embedding(query)
-    if isinstance(query_emb, str):
-        query_emb = [float(x) for x in query_emb.split(",") if x.strip()]
-
-    async with AsyncSessionLocal() as session:
-        # Geçerli embedding’i olanları al (None veya boş olmayanlar)
-        hadiths_with_emb = (await session.execute(
-            select(Hadith).where((Hadith.embedding != None) & (Hadith.embedding != ""))
-        )).scalars().all()
-
-        # Embedding’ler ve sorgu embedding’i varsa vektör benzerliği kullan
-        if hadiths_with_emb and query_emb:
-            scored = []
-            for h in hadiths_with_emb:
+# Arama modu: 'vector' (embedding yoksa metne düşer), 'lexical' veya 'hybrid' (ikisi birlikte, RRF ile birleştirilir)
+HADITH_SEARCH_MODE = (os.getenv('HADITH_SEARCH_MODE') or 'vector').strip().lower()
+# Hibrit birleştirme: 'rrf' (reciprocal rank fusion) veya 'weighted' (min-max normalize skor toplamı)
+HADITH_FUSION_METHOD = (os.getenv('HADITH_FUSION_METHOD') or 'rrf').strip().lower()
+HADITH_RRF_K = int(os.getenv('HADITH_RRF_K') or 60)
+HADITH_HYBRID_VECTOR_WEIGHT = float(os.getenv('HADITH_HYBRID_VECTOR_WEIGHT') or 0.5)
+# Hibrit modda her motordan top_k * bu kadar aday alınır
+HADITH_HYBRID_DEPTH = int(os.getenv('HADITH_HYBRID_DEPTH') or 5)
+
+# Vektör aramasında sorgu dili: 'route' (bildirilen/tespit edilen dilin indeksi) veya
+# 'all' (tüm dil indeksleri eşzamanlı aranır, hadis başına en yüksek skorla birleştirilir)
+HADITH_VECTOR_LANGUAGE_MODE = (os.getenv('HADITH_VECTOR_LANGUAGE_MODE') or 'route').strip().lower()
+
+_ARABIC_SCRIPT_RE = re.compile(r'[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF]')
+_TURKISH_LETTERS = set('çğıöşüÇĞİÖŞÜ')
+_ENGLISH_HINTS = {
+    'the', 'what', 'is', 'are', 'how', 'why', 'does', 'do', 'did', 'who', 'which', 'when',
+    'about', 'of', 'and', 'in', 'to', 'prophet', 'say', 'said', 'pray', 'prayer',
+}
+_TURKISH_HINTS = {
+    've', 'bir', 'ne', 'nedir', 'nasil', 'mi', 'mu', 'hakkinda', 'icin', 'ile', 'hadis',
+    'peygamber', 'namaz', 'oruc', 'hangi', 'neden', 'var', 'midir',
+}
+
+# Arama aşamalarının gecikme istatistikleri (/admin/search_metrics)
+search_latency = LatencyRegistry()
+
+
+def reciprocal_rank_fusion(rankings: Dict[str, Sequence[int]], k: int = HADITH_RRF_K, weights: Optional[Dict[str, float]] = None) -> List[Tuple[int, float]]:
+    """Motor başına sıralı id listelerini RRF ile birleştirir: skor = Σ w / (k + sıra)."""
+    fused: Dict[int, float] = {}
+    for engine, ids in rankings.items():
+        w = (weights or {}).get(engine, 1.0)
+        for rank, hadith_id in enumerate(ids, 1):
+            fused[hadith_id] = fused.get(hadith_id, 0.0) + w / (k + rank)
+    return sorted(fused.items(), key=lambda x: x[1], reverse=True)
+
+
+def weighted_score_fusion(results: Dict[str, Tuple[Sequence[int], Sequence[float]]], weights: Dict[str, float]) -> List[Tuple[int, float]]:
+    """Her motorun skorlarını [0, 1] aralığına min-max normalize edip ağırlıklı toplar."""
+    fused: Dict[int, float] = {}
+    for engine, (ids, scores) in results.items():
+        if not len(ids):
+            continue
+        lo, hi = min(scores), max(scores)
+        span = (hi - lo) or 1.0
+        w = weights.get(engine, 1.0)
+        for hadith_id, score in zip(ids, scores):
+            norm = (score - lo) / span if hi != lo else 1.0
+            fused[hadith_id] = fused.get(hadith_id, 0.0) + w * norm
+    return sorted(fused.items(), key=lambda x: x[1], reverse=True)
+
+
+def detect_query_language(text: str) -> str:
+    """Sorgu dilini kaba sezgiyle tahmin eder: Arap harfleri → 'ar', Türkçe harf/kelime → 'tr', İngilizce kelime → 'en'."""
+    if _ARABIC_SCRIPT_RE.search(text or ''):
+        return 'ar'
+    if any(ch in _TURKISH_LETTERS for ch in text or ''):
+        return 'tr'
+    words = set(re.findall(r"[a-z]+", (text or '').casefold()))
+    return 'en' if len(words & _ENGLISH_HINTS) > len(words & _TURKISH_HINTS) else 'tr'
+
+
+def route_query_language(text: str, declared: Optional[str] = None) -> str:
+    """Aranacak dil indeksi: Arap harfli sorgu her zaman 'ar'; yoksa bildirilen dil, o da yoksa tespit edilen."""
+    detected = detect_query_language(text)
+    declared = (declared or '').strip().lower()
+    if detected != 'ar' and declared in language_indexes:
+        return declared
+    return detected if detected in language_indexes else 'tr'
+
+
+def merge_language_results(results: Sequence[Tuple[Sequence[int], Sequence[float]]], top_k: int) -> Tuple[List[int], List[float]]:
+    """Dil indekslerinin sonuçlarını hadis başına en yüksek kosinüs skoruyla birleştirir (aynı model, skorlar karşılaştırılabilir)."""
+    best: Dict[int, float] = {}
+    for ids, scores in results:
+        for hadith_id, score in zip(ids, scores):
+            hadith_id = int(hadith_id)
+            if score > best.get(hadith_id, float('-inf')):
+                best[hadith_id] = float(score)
+    merged = sorted(best.items(), key=lambda x: x[1], reverse=True)[:top_k]
+    return [i for i, _ in merged], [sc for _, sc in merged]
+
+
+async def vector_candidates(
+    query: str, top_k: int, allowed_ids=None, language: Optional[str] = None, language_mode: Optional[str] = None,
+) -> Tuple[List[int], List[float]]:
+    """Embedding indeksinden (ids, kosinüs skorları); embedding yoksa boş döner.
+
+    Sorgu diline göre o dilin metin embedding'leri aranır; dil indeksi henüz boşsa Türkçe indekse düşülür.
+    language_mode='all' ise tüm dil indeksleri eşzamanlı aranıp birleştirilir.
+    """
+    with search_latency.timed('embedding'):
+        query_emb = await generate_embedding(query)
+    if query_emb is None:
+        return [], []
+    if (language_mode or HADITH_VECTOR_LANGUAGE_MODE) == 'all':
+        indexes = list(language_indexes.values())
+    else:
+        indexes = [language_indexes.get(route_query_language(query, language), hadith_index)]
+    # Bellekteki indeksler ilk aramada (startup'ta yüklenmediyse) bir kez kurulur
+    await asyncio.gather(*(index.ensure_loaded() for index in indexes))
+    indexes = [index for index in indexes if len(index)]
+    if not indexes:
+        await hadith_index.ensure_loaded()
+        indexes = [hadith_index] if len(hadith_index) else []
+    if not indexes:
+        return [], []
+    with search_latency.timed('vector'):
+        if len(indexes) == 1:
+            ids, scores = indexes[0].search(query_emb, top_k, allowed_ids=allowed_ids)
+            return ids.tolist(), scores.tolist()
+        # Matris çarpımları GIL'i bırakır; diller thread'lerde paralel taranır
+        results = await asyncio.gather(*(
+            asyncio.to_thread(index.search, query_emb, top_k, allowed_ids=allowed_ids) for index in indexes
+        ))
+    return merge_language_results(results, top_k)
+
+
+async def lexical_candidates(query: str, top_k: int, filters=None, allowed_ids=None) -> Tuple[List[int], List[float]]:
+    """Ayarlı metin motorundan (ids, skorlar). ILIKE motorunda skor sıraya göre türetilir.
+
+    BM25 filtreyi allowed_ids ile, veritabanı motorları aynı filtrenin SQL karşılığıyla uygular.
+    """
+    with search_latency.timed('lexical'):
+        if HADITH_LEXICAL_ENGINE == 'bm25':
+            await hadith_bm25.ensure_loaded()
+            if len(hadith_bm25):
+                ids, scores = hadith_bm25.search(query, top_k, allowed_ids=allowed_ids)
+                return ids.tolist(), scores.tolist()
+        async with AsyncSessionLocal() as session:
+            # PostgreSQL tam metin araması: GIN indeksli, worker başına bellek gerektirmez
+            if HADITH_LEXICAL_ENGINE == 'postgres':
                 try:
-                    emb = [float(x) for x in h.embedding.split(",") if x.strip()]
-                    sim = cosine_similarity(query_emb, emb)
-                    scored.append((sim, h))
-                except Exception:
-                    continue
-            if scored:
-                scored.sort(reverse=True, key=lambda x: x[0])
-                return [h for _, h in scored[:top_k]]
-
-        # Aksi halde basit metin eşleşmesi veya token tabanlı eşleşme ile geri dönüş
-        like = f"%{query}%"
-        
-        # 1) Tercih edilen sütunlar: turkish_text, english_text, arabic_text
-        # 2) Minimal şema: text
-        # Tüm denemeleri try/except ile sarmalayarak, sütun eksikliği gibi hatalarda
-        # bir sonraki stratejiye düşüyoruz.
-        def try_query(columns):
-            conditions = [getattr(Hadith, c).ilike(like) for c in columns if hasattr(Hadith, c)]
-            # Her zaman mevcut olduğunu bildiğimiz destekleyici alanlar
-            conditions.extend([Hadith.source.ilike(like), Hadith.reference.ilike(like)])
-            q = select(Hadith).where(or_(*conditions)).limit(top_k)
-            return q
-
-        # Token tabanlı arama: birden fazla anlamlı kelime varsa OR ile tarayıp skore et
-        if tokens:
-            try:
-                token_likes = [f"%{t}%" for t in tokens]
-                cols = ["turkish_text", "english_text", "arabic_text", "text", "source", "reference", "kitap", "bab"]
-                conditions = []
-                for t_like in token_likes:
-                    for c in cols:
-                        if hasattr(Hadith, c):
-                            conditions.append(getattr(Hadith, c).ilike(t_like))
-                q = select(Hadith).where(or_(*conditions)).limit(50)
-                result = await session.execute(q)
-                rows = result.scalars().all()
-                if rows:
-                    def score(h: Hadith) -> int:
-                        text_block = (
-                            (getattr(h, 'turkish_text', None) or '') + ' ' +
-                            (getattr(h, 'english_text', None) or '') + ' ' +
-                            (getattr(h, 'arabic_text', None) or '') + ' ' +
-                            (getattr(h, 'text', None) or '')
-                        ).lower()
-                        meta_block = (
-                            (str(getattr(h, 'source', '') or '') + ' ' +
-                            str(getattr(h, 'reference', '') or '') + ' ' +
-                            str(getattr(h, 'kitap', '') or '') + ' ' +
-                            str(getattr(h, 'bab', '') or ''))
-                        ).lower()
-                        s = 0
-                        for t in tokens:
-                            if t in text_block:
-                                s += 3
-                            if t in meta_block:
-                                s += 1
-                        return s
-                    rows.sort(key=score, reverse=True)
-                    return rows[:top_k]
-            except Exception:
-                # Token araması başarısızsa klasik tek-parça fallback’e dön
-                pass
-
-        # Deneme sırası: zengin metin alanları → minimal text → sadece source/reference
-        for cols in (["turkish_text", "english_text", "arabic_text"], ["text"]):
-            try:
-                result = await session.execute(try_query(cols))
-                rows = result.scalars().all()
-                if rows:
-                    return rows
-            except Exception:
-                # Bu strateji başarısızsa bir sonrakine geç
-                pass
-
-        # Son çare: sadece source/reference üzerinde arama
-        try:
-            result = await session.execute(
-                select(Hadith).where(
-                    or_(Hadith.source.ilike(like), Hadith.reference.ilike(like))
-                ).limit(top_k)
+                    return await fts_search(session, query, top_k, filters)
+                except Exception as e:
+                    # search_vector sütunu henüz yoksa (migration bekliyor) eski yönteme dön
+                    print(f"[FTS] Tam metin araması başarısız, ILIKE'a dönülüyor: {e}")
+                    await session.rollback()
+            rows = await _ilike_search(session, query, top_k, filters)
+            ids = [h.id for h in rows]
+            return ids, [1.0 / rank for rank in range(1, len(ids) + 1)]
+
+
+async def search_hadiths(
+    query: str,
+    top_k: int = 3,
+    mode: Optional[str] = None,
+    filters: Optional[Dict[str, List[str]]] = None,
+    language: Optional[str] = None,
+    language_mode: Optional[str] = None,
+) -> List[Tuple[Hadith, Optional[float]]]:
+    """Hadisleri arar ve (hadis, skor) çiftleri döner.
+
+    Skor vektör aramasında kosinüs benzerliği, hibrit modda birleştirilmiş (fused) skordur;
+    yalnızca metin eşleşmesiyle bulunan sonuçlarda None olur.
+    filters: hadith_filters.parse_filters çıktısı (kaynak, kategori, dil, sahihlik).
+    language: sorgunun (bildirilen) dili; vektör aramasında hangi dil indeksinin kullanılacağını belirler.
+    language_mode: 'route' | 'all' (verilmezse HADITH_VECTOR_LANGUAGE_MODE).
+    """
+    mode = mode or HADITH_SEARCH_MODE
+    allowed_ids = None
+    if filters:
+        await hadith_filters.ensure_loaded()
+        with search_latency.timed('filter'):
+            allowed_ids = hadith_filters.allowed_ids(filters)
+        if not allowed_ids.shape[0]:
+            return []
+    with search_latency.timed(f'total_{mode}'):
+        if mode == 'hybrid':
+            depth = max(top_k * HADITH_HYBRID_DEPTH, top_k)
+            # Motorlar eşzamanlı çalışır; toplam süre en yavaş motor kadardır
+            (v_ids, v_scores), (l_ids, l_scores) = await asyncio.gather(
+                vector_candidates(query, depth, allowed_ids, language, language_mode),
+                lexical_candidates(query, depth, filters, allowed_ids),
             )
+            weights = {'vector': HADITH_HYBRID_VECTOR_WEIGHT, 'lexical': 1.0 - HADITH_HYBRID_VECTOR_WEIGHT}
+            with search_latency.timed('fusion'):
+                if HADITH_FUSION_METHOD == 'weighted':
+                    fused = weighted_score_fusion({'vector': (v_ids, v_scores), 'lexical': (l_ids, l_scores)}, weights)
+                else:
+                    # RRF'de eşit ağırlık 1.0 kabul edilir; ağırlıklar 2 ile ölçeklenir
+                    fused = reciprocal_rank_fusion(
+                        {'vector': v_ids, 'lexical': l_ids},
+                        weights={k: 2 * w for k, w in weights.items()},
+                    )
+            fused = fused[:top_k]
+            ids = [i for i, _ in fused]
+            score_by_id = {i: s for i, s in fused}
+        else:
+            ids, score_by_id = [], {}
+            if mode != 'lexical':
+                v_ids, v_scores = await vector_candidates(query, top_k, allowed_ids, language, language_mode)
+                ids, score_by_id = v_ids, dict(zip(v_ids, v_scores))
+            if not ids:
+                # Vektör sonucu yoksa metin araması; skor kosinüs olmadığından None
+                ids, _scores = await lexical_candidates(query, top_k, filters, allowed_ids)
+        async with AsyncSessionLocal() as session:
+            with search_latency.timed('load_rows'):
+                rows = await load_display_hadiths(session, ids)
+        if not rows and mode == 'vector' and score_by_id:
+            # İndeks DB'den eskiyse (silinmiş satırlar) metin aramasına düş
+            ids, _scores = await lexical_candidates(query, top_k, filters, allowed_ids)
+            score_by_id = {}
+            async with AsyncSessionLocal() as session:
+                rows = await load_display_hadiths(session, ids)
+        return [(h, score_by_id.get(h.id)) for h in rows]
+
+
+async def _ilike_search(session: AsyncSession, query: str, top_k: int, filters=None) -> List[Hadith]:
+    """Eski ILIKE zinciri: token tabanlı OR araması, ardından tek parça LIKE denemeleri."""
+    tokens = preprocess(query)
+    where_filters = filter_clauses(filters)
+    like = f"%{query}%"
+    
+    # 1) Tercih edilen sütunlar: turkish_text, english_text, arabic_text
+    # 2) Minimal şema: text
+    # Tüm denemeleri try/except ile sarmalayarak, sütun eksikliği gibi hatalarda
+    # bir sonraki stratejiye düşüyoruz.
+    def try_query(columns):
+        conditions = [getattr(Hadith, c).ilike(like) for c in columns if hasattr(Hadith, c)]
+        # Her zaman mevcut olduğunu bildiğimiz destekleyici alanlar
+        conditions.extend([Hadith.source.ilike(like), Hadith.reference.ilike(like)])
+        q = select(Hadith).where(or_(*conditions), *where_filters).limit(top_k)
+        return q
+
+    # Token tabanlı arama: birden fazla anlamlı kelime varsa OR ile tarayıp skore et
+    if tokens:
+        try:
+            token_likes = [f"%{t}%" for t in tokens]
+            cols = ["turkish_text", "english_text", "arabic_text", "text", "source", "reference", "kitap", "bab"]
+            conditions = []
+            for t_like in token_likes:
+                for c in cols:
+                    if hasattr(Hadith, c):
+                        conditions.append(getattr(Hadith, c).ilike(t_like))
+            q = select(Hadith).where(or_(*conditions), *where_filters).limit(50)
+            result = await session.execute(q)
             rows = result.scalars().all()
-            return rows
+            if rows:
+                def score(h: Hadith) -> int:
+                    text_block = (
+                        (getattr(h, 'turkish_text', None) or '') + ' ' +
+                        (getattr(h, 'english_text', None) or '') + ' ' +
+                        (getattr(h, 'arabic_text', None) or '') + ' ' +
+                        (getattr(h, 'text', None) or '')
+                    ).lower()
+                    meta_block = (
+                        (str(getattr(h, 'source', '') or '') + ' ' +
+                        str(getattr(h, 'reference', '') or '') + ' ' +
+                        str(getattr(h, 'kitap', '') or '') + ' ' +
+                        str(getattr(h, 'bab', '') or ''))
+                    ).lower()
+                    s = 0
+                    for t in tokens:
+                        if t in text_block:
+                            s += 3
+                        if t in meta_block:
+                            s += 1
+                    return s
+                rows.sort(key=score, reverse=True)
+                return rows[:top_k]
         except Exception:
-            # Hiçbiri çalışmazsa boş döndür
-            return []
+            # Token araması başarısızsa klasik tek-parça fallback’e dön
+            pass
+
+    # Deneme sırası: zengin metin alanları → minimal text → sadece source/reference
+    for cols in (["turkish_text", "english_text", "arabic_text"], ["text"]):
+        try:
+            result = await session.execute(try_query(cols))
+            rows = result.scalars().all()
+            if rows:
+                return rows
+        except Exception:
+            # Bu strateji başarısızsa bir sonrakine geç
+            pass
+
+    # Son çare: sadece source/reference üzerinde arama
+    try:
+        result = await session.execute(
+            select(Hadith).where(
+                or_(Hadith.source.ilike(like), Hadith.reference.ilike(like)), *where_filters
+            ).limit(top_k)
+        )
+        rows = result.scalars().all()
+        return rows
+    except Exception:
+        # Hiçbiri çalışmazsa boş döndür
+        return []
 
 if __name__ == "__main__":
     import sys
@@ -160,5 +350,5 @@ if __name__ == "__main__":
         exit(1)
     query = sys.argv[1]
     results = asyncio.run(search_hadiths(query))
-    for h in results:
-        print(f"Hadis: {h.text}\nKaynak: {h.source}\n---")
+    for h, score in results:
+        print(f"Hadis: {h.turkish_text or h.english_text or h.arabic_text}\nKaynak: {h.source}\nSkor: {score}\n---")